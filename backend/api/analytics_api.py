@@ -17,6 +17,7 @@ from models.conversation_model import Conversation
 from models.message_model import Message
 from models.document_model import Document
 from services.analytics_service import analytics_service
+from services.rag_service import rag_service
 from api.auth_api import get_current_user
 
 router = APIRouter(prefix="/api", tags=["analytics"])
@@ -165,6 +166,39 @@ async def prometheus_metrics():
     # Cache hits
     metrics_lines.append(f"chatcore_cache_hits_total {_metrics['cache_hits_total']}")
     
+    # Query embedding cache
+    query_cache = rag_service.get_stats().get("query_cache")
+    if query_cache:
+        metrics_lines.append(f"chatcore_query_embedding_cache_hits_total {query_cache['hits']}")
+        metrics_lines.append(f"chatcore_query_embedding_cache_misses_total {query_cache['misses']}")
+        metrics_lines.append(f"chatcore_query_embedding_cache_size {query_cache['size']}")
+    
+    # Cross-encoder score cache
+    rerank_cache = rag_service.get_stats().get("rerank_cache")
+    if rerank_cache:
+        metrics_lines.append(f"chatcore_rerank_cache_hits_total {rerank_cache['hits']}")
+        metrics_lines.append(f"chatcore_rerank_cache_misses_total {rerank_cache['misses']}")
+        metrics_lines.append(f"chatcore_rerank_cache_size {rerank_cache['size']}")
+    
+    # Retrieval executor queue depth and per-stage time
+    executor = rag_service.get_stats()["executor"]
+    metrics_lines.append(f"chatcore_retrieval_executor_waiting {executor['waiting']}")
+    metrics_lines.append(f"chatcore_retrieval_executor_queued {executor['queued']}")
+    metrics_lines.append(f"chatcore_retrieval_executor_active {executor['active']}")
+    for stage, values in executor["stages"].items():
+        metrics_lines.append(f'chatcore_retrieval_stage_calls_total{{stage="{stage}"}} {values["calls"]}')
+        metrics_lines.append(f'chatcore_retrieval_stage_seconds_total{{stage="{stage}"}} {values["run_seconds"]}')
+        metrics_lines.append(f'chatcore_retrieval_stage_wait_seconds_total{{stage="{stage}"}} {values["wait_seconds"]}')
+    
+    # Index version applied by this worker (compare across workers for staleness)
+    metrics_lines.append(f"chatcore_index_version {rag_service.index_version}")
+    metrics_lines.append(f"chatcore_index_generation {rag_service.get_stats()['generation']}")
+    
+    # Micro-batching of concurrent query embeddings and searches
+    for stage, values in rag_service.get_stats()["batching"].items():
+        metrics_lines.append(f'chatcore_retrieval_batches_total{{stage="{stage}"}} {values["batches"]}')
+        metrics_lines.append(f'chatcore_retrieval_batched_items_total{{stage="{stage}"}} {values["items"]}')
+    
     return Response(
         content="\n".join(metrics_lines) + "\n",
         media_type="text/plain"
@@ -43,7 +43,8 @@ async def chat(
             "conversation_id": "...",
             "used_documents": [...],
             "token_count": 123,
-            "latency_ms": 456.7
+            "latency_ms": 456.7,
+            "stage_latency_ms": {"conversation": 3.1, "history": 2.4, "retrieval": 41.0, ...}
         }
     """
     prompt = chat_data.get("prompt", "").strip()
@@ -68,6 +69,15 @@ async def chat(
     prompt = SecurityValidator.sanitize_input(prompt, str(user.id), ip_address)
     
     start_time = time.time()
+    # Per-stage wall time, for capacity planning (see scripts/load_test.py)
+    stage_ms = {}
+    stage_start = time.perf_counter()
+    
+    def end_stage(name: str):
+        nonlocal stage_start
+        now = time.perf_counter()
+        stage_ms[name] = round((now - stage_start) * 1000, 2)
+        stage_start = now
     
     try:
         # Get or create conversation
@@ -76,6 +86,7 @@ async def chat(
             conversation_id,
             session=session
         )
+        end_stage("conversation")
         
         # Get conversation history
         history = await session_service.get_conversation_history(
@@ -84,6 +95,7 @@ async def chat(
             limit=10,
             session=session
         )
+        end_stage("history")
         
         # RAG retrieval
         rag_docs, used_documents = await rag_service.retrieve(
@@ -93,9 +105,11 @@ async def chat(
             use_hybrid=True,
             use_rerank=True
         )
+        end_stage("retrieval")
         
         # Format context
         context = rag_service.format_context(rag_docs, max_tokens=2000)
+        end_stage("context")
         
         # Generate AI response
         async with AIService() as ai:
@@ -105,6 +119,7 @@ async def chat(
                 context=context,
                 user_id=str(user.id)
             )
+        end_stage("generation")
         
         latency_ms = (time.time() - start_time) * 1000
         
@@ -127,6 +142,7 @@ async def chat(
             token_count=ai_metadata.get("token_count"),
             session=session
         )
+        end_stage("persist")
         
         # Log chat query
         APILogger.log_chat_query(
@@ -142,7 +158,8 @@ async def chat(
             "conversation_id": conversation.conversation_id,
             "used_documents": used_documents,
             "token_count": ai_metadata.get("token_count"),
-            "latency_ms": round(latency_ms, 2)
+            "latency_ms": round(latency_ms, 2),
+            "stage_latency_ms": stage_ms
         }
     
     except Exception as e:
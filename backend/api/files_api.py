@@ -5,7 +5,7 @@ Description: Async endpoints for document upload, parsing, and FAISS indexing.
 """
 import os
 from pathlib import Path
-from typing import Optional, List
+from typing import Dict, List, Optional, Tuple
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Request
 from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -23,6 +23,45 @@ from services.rag_service import rag_service
 router = APIRouter(prefix="/api/v2", tags=["files"])
 
 
+def _stored_chunks(document: Document) -> list:
+    """LangChain chunks of a file from its stored chunk texts"""
+    from langchain_core.documents import Document as LangChainDocument
+    return [
+        LangChainDocument(page_content=chunk, metadata={"document_id": document.id})
+        for chunk in document.body.get("chunks", [])
+    ]
+
+
+async def _index_chunks(document: Document, chunks: list) -> Tuple[bool, Dict]:
+    """
+    Index a file's chunks in place of any it already has in the index
+    
+    Chunks that nearly duplicate an indexed chunk with the same visibility
+    are skipped; the documents holding those chunks are recorded in the
+    body, so deleting one of them re-indexes this file.
+    
+    Returns:
+        (indexed, deduplication report)
+    """
+    await rag_service.remove_document(document.id)
+    chunks_to_index, dedupe_report = await rag_service.filter_near_duplicates(
+        chunks,
+        department=document.department,
+        uploaded_by=document.uploaded_by
+    )
+    indexed = True
+    if chunks_to_index:
+        indexed = await rag_service.add_documents(
+            chunks_to_index,
+            document_id=document.id,
+            department=document.department,
+            uploaded_by=document.uploaded_by
+        )
+    duplicate_of = {match.get("document_id") for match in dedupe_report["duplicates"]} - {None, document.id}
+    document.body = {**document.body, "duplicate_of_documents": sorted(duplicate_of)}
+    return indexed, dedupe_report
+
+
 @router.post("/files/upload")
 async def upload_file(
     request: Request,
@@ -128,9 +167,11 @@ async def upload_file(
         session.add(document)
         await session.flush()
         
-        # Index chunks in FAISS (async, non-blocking)
+        # Index chunks in FAISS (async, non-blocking); near-duplicates of indexed chunks are skipped
+        dedupe_report = None
+        indexed = False
         try:
-            await rag_service.add_documents(chunks, document_id=document.id, department=department)
+            indexed, dedupe_report = await _index_chunks(document, chunks)
         except Exception as e:
             APILogger.log_error(
                 "/api/v2/files/upload",
@@ -152,16 +193,18 @@ async def upload_file(
             200,
             file_name=file.filename,
             file_size=file_size,
-            chunks=chunk_count
+            chunks=chunk_count,
+            near_duplicates=dedupe_report["skipped"] if dedupe_report else None
         )
         
         return {
             "document_id": document.id,
             "file_name": file.filename,
             "file_size": file_size,
-            "chunks_indexed": chunk_count,
-            "status": "indexed",
-            "department": department
+            "chunks_indexed": dedupe_report["indexed"] if indexed else 0,
+            "status": "indexed" if indexed else "not_indexed",
+            "department": department,
+            "deduplication": dedupe_report
         }
     
     except HTTPException:
@@ -275,6 +318,26 @@ async def delete_file(
             document_id=document_id
         )
     
+    # Files whose skipped near-duplicates fall back on this one get their chunks back
+    dependents = await session.execute(
+        select(Document).where(
+            Document.doc_type == "file",
+            Document.id != document_id,
+            Document.body.contains({"duplicate_of_documents": [document_id]})
+        )
+    )
+    for dependent in dependents.scalars().all():
+        try:
+            await _index_chunks(dependent, _stored_chunks(dependent))
+        except Exception as e:
+            APILogger.log_error(
+                "/api/v2/files/delete",
+                e,
+                str(user.id),
+                ErrorCategory.AI_ERROR,
+                document_id=dependent.id
+            )
+    
     # Delete from database
     await session.delete(document)
     await session.commit()
@@ -306,27 +369,25 @@ async def reindex_file(
     
     try:
         # Get chunks from document body
-        chunks_text = document.body.get("chunks", [])
+        chunks = _stored_chunks(document)
         
-        if not chunks_text:
+        if not chunks:
             raise HTTPException(status_code=400, detail="No chunks found in document")
         
-        # Create LangChain documents
-        from langchain_core.documents import Document as LangChainDocument
-        chunks = [
-            LangChainDocument(page_content=chunk, metadata={"document_id": document_id})
-            for chunk in chunks_text
-        ]
-        
-        # Re-index
-        await rag_service.add_documents(
-            chunks,
-            document_id=document_id,
-            department=document.department
-        )
+        # Re-index: the document's old chunks are replaced, not compared against
+        indexed, dedupe_report = await _index_chunks(document, chunks)
+        session.add(document)
+        await session.commit()
         
-        return {"success": True, "message": "Document re-indexed", "chunks": len(chunks)}
+        return {
+            "success": indexed,
+            "message": "Document re-indexed",
+            "chunks": len(chunks),
+            "deduplication": dedupe_report
+        }
     
+    except HTTPException:
+        raise
     except Exception as e:
         APILogger.log_error(
             "/api/v2/files/reindex",
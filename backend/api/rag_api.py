@@ -3,6 +3,8 @@
 Module: RAG API
 Description: RAG search endpoints for debugging retrieval and testing.
 """
+from typing import Optional
+
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -22,12 +24,16 @@ async def rag_search(
     top_k: int = 5,
     use_hybrid: bool = True,
     use_rerank: bool = True,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
     user: User = Depends(get_current_user),
     session: AsyncSession = Depends(get_async_session)
 ):
     """
     RAG search endpoint for debugging retrieval
     
+    nprobe / ef_search tune IVF / HNSW indexes per query (recall vs latency).
+    
     Returns:
         {
             "query": "...",
@@ -54,7 +60,9 @@ async def rag_search(
             k=k,
             top_k=top_k,
             use_hybrid=use_hybrid,
-            use_rerank=use_rerank
+            use_rerank=use_rerank,
+            nprobe=nprobe,
+            ef_search=ef_search
         )
         
         # Format response
@@ -85,3 +93,36 @@ async def rag_search(
         )
         raise HTTPException(status_code=500, detail=f"RAG search error: {str(e)}")
 
+
+
+@router.get("/rag/index/version")
+async def rag_index_version(user: User = Depends(get_current_user)):
+    """
+    Index version of the worker serving this request
+    
+    Every worker applies index changes made by other workers and Celery
+    within max_staleness_seconds. lag is how many mutations this worker is
+    behind the newest version announced in Redis (null without Redis).
+    
+    Returns:
+        {
+            "worker": "host:pid",
+            "index_version": 42,
+            "cluster_version": 42,
+            "lag": 0,
+            "generation": 7,
+            "snapshot": "v000003",
+            ...
+        }
+    """
+    stats = rag_service.get_stats()
+    cluster_version = await rag_service.index_sync.fetch_cluster_version()
+    return {
+        **rag_service.index_sync.stats(),
+        "index_version": rag_service.index_version,
+        "cluster_version": cluster_version,
+        "lag": max(0, cluster_version - rag_service.index_version) if cluster_version is not None else None,
+        "generation": stats["generation"],
+        "snapshot": stats["snapshot"],
+        "wal": stats["wal"]
+    }
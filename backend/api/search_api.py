@@ -16,6 +16,7 @@ from models.document_model import Document
 from models.message_model import Message
 from models.conversation_model import Conversation
 from services.rag_service import rag_service
+from services.metadata_store import MetadataFilter
 from services.memory_service import memory_service
 
 router = APIRouter(prefix="/api/v2", tags=["search"])
@@ -52,25 +53,29 @@ async def search(
         
         # Semantic search (FAISS)
         if search_type in ["semantic", "hybrid"]:
+            # Filters are applied inside the index before scoring. Semantic hits
+            # are resolved to uploaded files below, so default to doc_type "file".
+            # Chunks indexed without an uploader still pass the ACL here and are
+            # checked against the database record.
+            metadata_filter = MetadataFilter(
+                doc_types={doc_type or "file"},
+                departments={department} if department else None,
+                uploaded_by=None if user.is_admin else {user.id},
+                include_unowned=True
+            )
             docs, used_docs = await rag_service.retrieve(
                 query,
                 k=limit * 2,
                 top_k=limit,
                 use_hybrid=True,
-                use_rerank=True
+                use_rerank=True,
+                metadata_filter=metadata_filter
             )
             
-            # Filter by doc_type and department if provided
             filtered_docs = []
             for doc, used_doc in zip(docs, used_docs):
                 metadata = doc.metadata
                 
-                # Apply filters
-                if doc_type and metadata.get("doc_type") != doc_type:
-                    continue
-                if department and metadata.get("department") != department:
-                    continue
-                
                 # Get document from database if document_id exists
                 if metadata.get("document_id"):
                     doc_result = await session.execute(
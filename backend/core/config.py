@@ -20,7 +20,7 @@ class Settings(BaseSettings):
     )
     
     # AI Provider
-    AI_PROVIDER: Literal["GEMINI", "OPENAI", "AZURE", "OLLAMA", "HUGGINGFACE"] = Field(
+    AI_PROVIDER: Literal["GEMINI", "OPENAI", "AZURE", "OLLAMA", "HUGGINGFACE", "MOCK"] = Field(
         default="GEMINI", description="AI provider"
     )
     
@@ -43,6 +43,19 @@ class Settings(BaseSettings):
     HUGGINGFACE_API_KEY: Optional[str] = Field(default=None, description="Hugging Face API key")
     HUGGINGFACE_MODEL: str = Field(default="distilgpt2", description="Hugging Face model")
     
+    # Mock provider (local stand-in LLM for load testing, no network calls)
+    MOCK_LLM_LATENCY_DISTRIBUTION: Literal["constant", "uniform", "exponential", "lognormal"] = Field(
+        default="lognormal", description="Distribution of mock time to first token"
+    )
+    MOCK_LLM_FIRST_TOKEN_MS: float = Field(default=400.0, description="Median mock time to first token (ms)")
+    MOCK_LLM_LATENCY_SPREAD: float = Field(
+        default=0.5, description="Lognormal sigma, or relative half-width for uniform"
+    )
+    MOCK_LLM_TOKENS_PER_SECOND: float = Field(default=50.0, description="Mock output rate (0 = instant)")
+    MOCK_LLM_OUTPUT_TOKENS: int = Field(default=150, description="Mean mock response length (tokens)")
+    MOCK_LLM_ERROR_RATE: float = Field(default=0.0, description="Fraction of mock calls that fail")
+    MOCK_LLM_ERROR_STATUS: int = Field(default=503, description="HTTP status reported by injected mock errors")
+    
     # Security
     SECRET_KEY: str = Field(default="supersecret", description="JWT secret key")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = Field(default=1440, description="Access token expiry (minutes)")
@@ -85,6 +98,71 @@ class Settings(BaseSettings):
         description="Path to FAISS index directory"
     )
     
+    # FAISS index type: exact "flat", or approximate "ivf" / "hnsw" for large corpora
+    FAISS_INDEX_TYPE: Literal["flat", "ivf", "hnsw"] = Field(default="flat", description="FAISS index type")
+    FAISS_IVF_NLIST: int = Field(default=0, description="IVF list count (0 = auto, ~4*sqrt(n))")
+    FAISS_IVF_NPROBE: int = Field(default=8, description="IVF lists probed per query (default)")
+    FAISS_HNSW_M: int = Field(default=32, description="HNSW graph degree")
+    FAISS_HNSW_EF_CONSTRUCTION: int = Field(default=200, description="HNSW build-time candidate list size")
+    FAISS_HNSW_EF_SEARCH: int = Field(default=64, description="HNSW query-time candidate list size (default)")
+    FAISS_ANN_MIN_RECALL: float = Field(default=0.95, description="Min recall@10 vs exact search to promote an ANN index")
+    FAISS_COMPRESSION: Literal["none", "sq8", "pq"] = Field(default="none", description="Vector encoding of the main index")
+    FAISS_PQ_M: int = Field(default=8, description="PQ sub-quantizers (must divide the indexed dimension)")
+    FAISS_PCA_DIM: int = Field(default=0, description="Reduce vectors to this dimension with PCA before indexing (0 = off)")
+    FAISS_RESCORE_FACTOR: int = Field(default=4, description="Compressed index: candidates per result re-scored with full vectors (0 = off)")
+    
+    # Versioned index snapshots (written aside, promoted atomically)
+    INDEX_SNAPSHOT_KEEP: int = Field(default=3, ge=1, description="Snapshot versions kept on disk")
+    INDEX_SNAPSHOT_VERIFY: bool = Field(default=True, description="Check snapshot checksums on load (falls back to an older valid snapshot)")
+    INDEX_SNAPSHOT_INTERVAL_SECONDS: float = Field(default=30.0, description="Snapshot logged index mutations this long after the first one")
+    INDEX_SNAPSHOT_MAX_MUTATIONS: int = Field(default=50, ge=1, description="Snapshot right away once this many mutations are logged")
+    INDEX_WAL_FSYNC: bool = Field(default=True, description="fsync the index write-ahead log after every mutation")
+    
+    # Index changes across workers (Redis pub/sub, with polling as the fallback)
+    INDEX_SYNC_ENABLED: bool = Field(default=True, description="Apply index changes made by other processes while running")
+    INDEX_SYNC_MAX_STALENESS_SECONDS: float = Field(default=2.0, gt=0, description="Check for index changes at least this often, even without notifications")
+    INDEX_SYNC_CHANNEL: str = Field(default="index:changes", description="Redis pub/sub channel for index change notifications")
+    
+    # Per-department indexes (lazy-loaded, LRU-evicted)
+    DEPARTMENT_INDEX_MAX_LOADED: int = Field(default=8, description="Max department indexes kept in memory")
+    DEPARTMENT_INDEX_IDLE_SECONDS: int = Field(default=1800, description="Unload department indexes idle this long")
+    
+    # Chunk and query embedding caches
+    EMBEDDING_CACHE_MAX_ENTRIES: int = Field(default=500000, ge=0, description="Chunk embeddings kept on disk per model; the oldest are evicted by compaction (0 = unlimited)")
+    QUERY_EMBEDDING_CACHE_SIZE: int = Field(default=2048, description="Max cached query embeddings per worker")
+    QUERY_EMBEDDING_REDIS_SPILL: bool = Field(default=False, description="Share query embeddings via Redis")
+    QUERY_EMBEDDING_REDIS_TTL: int = Field(default=86400, description="Redis TTL for query embeddings (seconds)")
+    
+    # Retrieval executor (CPU-bound stages run off the event loop)
+    RETRIEVAL_EXECUTOR_WORKERS: int = Field(default=4, description="Threads for embedding, FAISS, BM25 and re-ranking")
+    RETRIEVAL_MAX_CONCURRENCY: int = Field(default=16, description="Max retrieval stages queued or running per worker")
+    RETRIEVAL_BATCH_WINDOW_MS: float = Field(default=2.0, description="Window for micro-batching concurrent query embeddings/searches (0 = off)")
+    RETRIEVAL_MAX_BATCH_SIZE: int = Field(default=32, description="Max queries per micro-batch")
+    RETRIEVAL_LANGCHAIN_PATH: bool = Field(default=False, description="Run unfiltered dense search through LangChain's FAISS wrapper (comparison only)")
+    
+    # Hybrid retrieval fusion (dense FAISS + sparse BM25)
+    HYBRID_FUSION: Literal["rrf", "weighted"] = Field(default="weighted", description="rrf = reciprocal rank fusion, weighted = min-max normalized score sum")
+    HYBRID_DENSE_WEIGHT: float = Field(default=0.7, ge=0.0, le=1.0, description="Dense weight (sparse gets 1 - weight)")
+    HYBRID_RRF_K: int = Field(default=60, description="Reciprocal rank fusion constant")
+    
+    # Text analysis for BM25 and lexical re-ranking
+    BM25_ANALYZER: Literal["turkish", "whitespace"] = Field(default="turkish", description="turkish = Turkish casefolding, punctuation and stopword removal; whitespace = lowercase + split")
+    BM25_STEMMING: bool = Field(default=False, description="Strip common Turkish inflectional suffixes (turkish analyzer only)")
+    
+    # Near-duplicate chunks at ingestion (MinHash over word bigrams)
+    NEAR_DUPLICATE_MODE: Literal["off", "skip"] = Field(default="skip", description="skip = do not index chunks that nearly duplicate an earlier chunk of the upload or an indexed chunk with the same visibility (doc type, department, uploader)")
+    NEAR_DUPLICATE_THRESHOLD: float = Field(default=0.8, gt=0.0, le=1.0, description="Min estimated Jaccard similarity of word bigrams for two chunks to count as near-duplicates (LSH finds pairs above ~0.7 reliably)")
+    
+    # Self-RAG retry
+    SELF_RAG_DEADLINE_MS: float = Field(default=0.0, description="Skip the Self-RAG retry after this much time (0 = no deadline)")
+    
+    # Cross-encoder re-ranking (bounded per request)
+    RERANK_MODEL: str = Field(default="cross-encoder/ms-marco-MiniLM-L-6-v2", description="Cross-encoder model name")
+    RERANK_MAX_CANDIDATES: int = Field(default=30, description="Best first-stage candidates scored by the cross-encoder")
+    RERANK_BATCH_SIZE: int = Field(default=32, description="Cross-encoder inference batch size")
+    RERANK_MAX_LENGTH: int = Field(default=256, description="Max tokens per (query, chunk) pair")
+    RERANK_CACHE_SIZE: int = Field(default=20000, description="Max cached (query, chunk) scores per worker")
+    
     # Celery (optional)
     CELERY_BROKER_URL: Optional[str] = Field(default=None, description="Celery broker URL")
     CELERY_RESULT_BACKEND: Optional[str] = Field(default=None, description="Celery result backend")
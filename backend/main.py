@@ -17,6 +17,7 @@ from core.redis_client import init_redis
 from core.logger import APILogger, ErrorCategory
 from core.security import add_security_headers, default_rate_limiter
 from services.rag_service import rag_service
+from services.retrieval_executor import retrieval_executor
 from api import auth_api, chat_api, rag_api, analytics_api, files_api, search_api, user_api
 
 settings = get_settings()
@@ -53,6 +54,9 @@ async def lifespan(app: FastAPI):
     try:
         await rag_service.initialize(force_rebuild=False)
         APILogger.log_request("/startup", "INIT", None, None, None, log_message="RAG service initialized")
+        # Apply uploads handled by other workers and Celery (notified via Redis, polled as a fallback)
+        if settings.INDEX_SYNC_ENABLED:
+            rag_service.index_sync.start()
     except Exception as e:
         APILogger.log_error("/startup", e, None, ErrorCategory.AI_ERROR)
     
@@ -60,6 +64,13 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     APILogger.log_request("/shutdown", "INIT", None, None, None, log_message="Application shutting down")
+    try:
+        await rag_service.index_sync.stop()
+        # Snapshot index mutations still only in the write-ahead log
+        await rag_service.flush()
+    except Exception as e:
+        APILogger.log_error("/shutdown", e, None, ErrorCategory.AI_ERROR)
+    retrieval_executor.shutdown()
 
 
 app = FastAPI(
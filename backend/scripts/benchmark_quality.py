@@ -0,0 +1,429 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Retrieval Quality Benchmark
+Description: Recall@k, MRR, latency percentiles and memory of RAGService retrieval configurations over the bundled company data plus a synthetic scale-up corpus
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from services.chunk_store import ChunkStore
+from services.rag_service import DATA_DIR, IndexState, RAGService, settings
+from services.text_analyzer import Analyzer, create_analyzer, term_id
+from services.token_cache import TokenCache
+
+# Retrieval configurations: retrieve() arguments, or None for retrieve_with_self_rag()
+CONFIGURATIONS: Dict[str, Optional[Dict[str, bool]]] = {
+    "dense": {"use_hybrid": False, "use_rerank": False},
+    "hybrid": {"use_hybrid": True, "use_rerank": False},
+    "rerank": {"use_hybrid": True, "use_rerank": True},
+    "self_rag": None
+}
+RECALL_AT = (1, 5, 10)
+# Queries re-run with allocation tracing for the memory figures (tracing slows every call down)
+MEMORY_QUERIES = 50
+
+# A relevant chunk is named by (doc_type, doc_id) from its metadata
+DocKey = Tuple[str, Any]
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic offline embeddings: signed feature hashing of analyzed terms and their character trigrams
+
+    Unlike a random fake embedding, texts that share (parts of) words get
+    similar vectors, so dense retrieval quality is measurable without a
+    model download.
+    """
+
+    def __init__(self, size: int = 256, analyzer: Optional[Analyzer] = None):
+        self.size = size
+        self.analyzer = analyzer or create_analyzer("turkish")
+        self.model_name = f"hashing-{size}-{self.analyzer.signature}"
+
+    def _embed(self, text: str) -> List[float]:
+        terms = self.analyzer.analyze(text)
+        features = terms + [f"#{term[i:i + 3]}" for term in terms if len(term) > 3 for i in range(len(term) - 2)]
+        vector = np.zeros(self.size, dtype=np.float32)
+        if features:
+            hashes = np.fromiter((term_id(feature) for feature in features), dtype=np.uint64, count=len(features))
+            signs = np.where(hashes >> np.uint64(63), -1.0, 1.0).astype(np.float32)
+            np.add.at(vector, (hashes % np.uint64(self.size)).astype(np.int64), signs)
+            vector /= max(float(np.linalg.norm(vector)), 1e-9)
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+@dataclass
+class LabeledQuery:
+    """A query and the chunks that answer it"""
+    text: str
+    relevant: Set[DocKey]
+    source: str
+
+
+@dataclass
+class ConfigResult:
+    """Quality and cost of one retrieval configuration"""
+    name: str
+    queries: int
+    recall: Dict[int, float]
+    mrr: float
+    latency_ms: Dict[str, float]
+    # Resident memory gained while the configuration ran (caches, index pages touched)
+    rss_delta_mb: Optional[float]
+    # Largest memory allocated while answering one query (Python and numpy; FAISS buffers are not traced)
+    peak_query_alloc_mb: float
+
+
+@dataclass
+class BenchmarkReport:
+    corpus: Dict[str, Any]
+    results: List[ConfigResult] = field(default_factory=list)
+
+    def result(self, name: str) -> Optional[ConfigResult]:
+        return next((result for result in self.results if result.name == name), None)
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def _description_slice(text: str, words: int = 6) -> str:
+    """A run of words from the middle of a description (a paraphrase-like query, not the chunk's opening)"""
+    tokens = text.split()
+    start = min(1, max(0, len(tokens) - words))
+    return " ".join(tokens[start:start + words])
+
+
+def company_queries(data_dir: Path = DATA_DIR) -> List[LabeledQuery]:
+    """Labeled queries generated from the bundled JSON records"""
+    records = {}
+    for name in ("employees", "departments", "projects", "procedures"):
+        path = Path(data_dir) / f"{name}.json"
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                records[name] = json.load(f)
+
+    queries: List[LabeledQuery] = []
+    employees = records.get("employees", [])
+    by_position: Dict[str, Set[DocKey]] = {}
+    for item in employees:
+        by_position.setdefault(item.get("position", ""), set()).add(("employees", item["id"]))
+    for item in employees:
+        key = {("employees", item["id"])}
+        queries.append(LabeledQuery(f"{item['name']} hangi departmanda çalışıyor?", key, "employees"))
+        if item.get("position"):
+            queries.append(LabeledQuery(
+                f"{item['position']} olarak kim çalışıyor?", by_position[item["position"]], "employees"
+            ))
+
+    for item in records.get("departments", []):
+        key = {("departments", item["id"])}
+        queries.append(LabeledQuery(f"{item['name']} departmanının görevi nedir?", key, "departments"))
+        if item.get("description"):
+            queries.append(LabeledQuery(_description_slice(item["description"]), key, "departments"))
+
+    for item in records.get("projects", []):
+        key = {("projects", item["id"])}
+        queries.append(LabeledQuery(f"{item['name']} projesinin durumu nedir?", key, "projects"))
+        if item.get("description"):
+            queries.append(LabeledQuery(_description_slice(item["description"]), key, "projects"))
+
+    for item in records.get("procedures", []):
+        key = {("procedures", item["id"])}
+        queries.append(LabeledQuery(f"{item['title']} nedir?", key, "procedures"))
+        if item.get("description"):
+            queries.append(LabeledQuery(_description_slice(item["description"]), key, "procedures"))
+
+    return queries
+
+
+def synthetic_corpus(
+    base: Sequence[Document],
+    size: int,
+    query_count: int,
+    seed: int = 0
+) -> Tuple[List[Document], List[LabeledQuery]]:
+    """
+    Scale-up chunks drawn from the company vocabulary, plus labeled queries over them
+
+    Words follow a Zipf distribution over the vocabulary of the real
+    chunks, so synthetic chunks compete with the real ones for the same
+    terms. A synthetic query is the rarest few words of one chunk.
+    """
+    if size <= 0:
+        return [], []
+
+    rng = np.random.default_rng(seed)
+    counts = Counter(word for doc in base for word in re.findall(r"\w{3,}", doc.page_content.lower()))
+    vocabulary = np.asarray([word for word, _ in counts.most_common()])
+    weights = 1.0 / np.arange(1, vocabulary.size + 1)
+    weights /= weights.sum()
+    rank = {word: position for position, word in enumerate(vocabulary.tolist())}
+
+    documents = []
+    for i in range(size):
+        words = rng.choice(vocabulary, size=int(rng.integers(30, 80)), p=weights).tolist()
+        documents.append(Document(
+            page_content=f"Kayıt SYN-{i:06d}: " + " ".join(words),
+            metadata={"doc_type": "synthetic", "doc_id": f"SYN-{i:06d}", "source": "synthetic"}
+        ))
+
+    queries = []
+    for i in rng.choice(size, size=min(query_count, size), replace=False).tolist():
+        words = sorted(set(documents[i].page_content.split()[2:]), key=lambda word: -rank.get(word, 0))[:4]
+        random.Random(i).shuffle(words)
+        queries.append(LabeledQuery(" ".join(words), {("synthetic", f"SYN-{i:06d}")}, "synthetic"))
+    return documents, queries
+
+
+def build_service(documents: List[Document], embeddings: Embeddings, token_cache_dir: Path) -> RAGService:
+    """In-memory RAG service over the given chunks (configured index type; no snapshot is written)"""
+    service = RAGService()
+    service.embeddings = embeddings
+    # Keep the benchmark's token streams out of the shared cache
+    service.token_cache = TokenCache(token_cache_dir, service.analyzer.signature)
+
+    ids = list(range(len(documents)))
+    vectors = np.asarray(embeddings.embed_documents([doc.page_content for doc in documents]), dtype=np.float32)
+    vector_store, index_report = service._build_main_vector_store(ids, vectors, documents)
+    chunk_store = ChunkStore()
+    chunk_store.put(ids, documents)
+    vector_store.docstore = chunk_store
+
+    metadata_store, document_chunks = service._chunk_maps(ids, [doc.metadata for doc in documents])
+    service._publish(IndexState(
+        vector_store=vector_store,
+        chunk_store=chunk_store,
+        bm25_index=service._bm25_from(chunk_store),
+        metadata_store=metadata_store,
+        document_chunks=document_chunks,
+        next_chunk_id=len(ids),
+        index_mmapped=False,
+        index_report=index_report
+    ))
+    service._initialized = True
+    return service
+
+
+def _rss_mb() -> Optional[float]:
+    """Current resident memory of this process (None where it cannot be read)"""
+    if PSUTIL_AVAILABLE:
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def _difference(after: Optional[float], before: Optional[float]) -> Optional[float]:
+    return round(after - before, 1) if after is not None and before is not None else None
+
+
+async def run_configuration(
+    service: RAGService,
+    name: str,
+    queries: List[LabeledQuery],
+    k: int = 50,
+    top_k: int = 10
+) -> ConfigResult:
+    """Run every query through one configuration; recall@k and MRR are computed over the top_k results"""
+    arguments = CONFIGURATIONS[name]
+
+    async def retrieve(query: str) -> List[Document]:
+        if arguments is None:
+            docs, _, _ = await service.retrieve_with_self_rag(query, k=k, top_k=top_k)
+        else:
+            docs, _ = await service.retrieve(query, k=k, top_k=top_k, **arguments)
+        return docs
+
+    # Every configuration starts with a cold query embedding cache
+    service.query_cache = None
+    await retrieve(queries[0].text)
+    service.query_cache = None
+
+    latencies = []
+    recalls = {cutoff: [] for cutoff in RECALL_AT}
+    reciprocal_ranks = []
+    rss_before = _rss_mb()
+    for query in queries:
+        start = time.perf_counter()
+        docs = await retrieve(query.text)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        keys = [(doc.metadata.get("doc_type"), doc.metadata.get("doc_id")) for doc in docs]
+        for cutoff in RECALL_AT:
+            recalls[cutoff].append(len(query.relevant & set(keys[:cutoff])) / len(query.relevant))
+        rank = next((position for position, key in enumerate(keys, 1) if key in query.relevant), None)
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+    rss_after = _rss_mb()
+
+    # Per-query allocations in a separate pass, so tracing does not skew the latencies
+    peak_alloc = 0
+    tracemalloc.start()
+    try:
+        for query in queries[:MEMORY_QUERIES]:
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            await retrieve(query.text)
+            peak_alloc = max(peak_alloc, tracemalloc.get_traced_memory()[1] - current)
+    finally:
+        tracemalloc.stop()
+
+    return ConfigResult(
+        name=name,
+        queries=len(queries),
+        recall={cutoff: round(float(np.mean(values)), 4) for cutoff, values in recalls.items()},
+        mrr=round(float(np.mean(reciprocal_ranks)), 4),
+        latency_ms={
+            "mean": round(float(np.mean(latencies)), 3),
+            "p50": round(float(np.percentile(latencies, 50)), 3),
+            "p95": round(float(np.percentile(latencies, 95)), 3),
+            "p99": round(float(np.percentile(latencies, 99)), 3)
+        },
+        rss_delta_mb=_difference(rss_after, rss_before),
+        peak_query_alloc_mb=round(peak_alloc / (1024 * 1024), 2)
+    )
+
+
+async def run_benchmark(
+    configurations: Sequence[str] = tuple(CONFIGURATIONS),
+    synthetic: int = 0,
+    synthetic_queries: int = 100,
+    dimension: int = 256,
+    k: int = 50,
+    top_k: int = 10,
+    cross_encoder: bool = False,
+    seed: int = 0,
+    data_dir: Path = DATA_DIR
+) -> BenchmarkReport:
+    """Build the benchmark corpus and index, then measure each configuration"""
+    unknown = set(configurations) - set(CONFIGURATIONS)
+    if unknown:
+        raise ValueError(f"Unknown configurations: {', '.join(sorted(unknown))}")
+
+    # Sequential timing: no micro-batching window (restored for whatever runs next in this process)
+    batch_window_ms = settings.RETRIEVAL_BATCH_WINDOW_MS
+    settings.RETRIEVAL_BATCH_WINDOW_MS = 0
+    service = RAGService()
+    try:
+        documents = service._load_data_documents(Path(data_dir))
+        queries = company_queries(data_dir)
+        extra_documents, extra_queries = synthetic_corpus(documents, synthetic, synthetic_queries, seed)
+        documents += extra_documents
+        queries += extra_queries
+
+        rss_before = _rss_mb()
+        started = time.perf_counter()
+        with tempfile.TemporaryDirectory() as token_cache_dir:
+            service = build_service(documents, HashingEmbeddings(dimension, service.analyzer), Path(token_cache_dir))
+            build_seconds = time.perf_counter() - started
+            if cross_encoder:
+                service._init_cross_encoder()
+
+            report = BenchmarkReport(corpus={
+                "chunks": len(documents),
+                "synthetic_chunks": len(extra_documents),
+                "queries": len(queries),
+                "queries_by_source": dict(Counter(query.source for query in queries)),
+                "embedding": service.embeddings.model_name,
+                "index": service.index_report,
+                "analyzer": service.analyzer.signature,
+                "cross_encoder": service.cross_encoder is not None,
+                "build_seconds": round(build_seconds, 3),
+                "build_rss_delta_mb": _difference(_rss_mb(), rss_before)
+            })
+            for name in configurations:
+                report.results.append(await run_configuration(service, name, queries, k, top_k))
+        return report
+    finally:
+        settings.RETRIEVAL_BATCH_WINDOW_MS = batch_window_ms
+        # The retrieval thread pool is started again on next use
+        service.executor.shutdown()
+
+
+def format_report(report: BenchmarkReport) -> str:
+    """Human-readable table of a benchmark report"""
+    corpus = report.corpus
+    index = corpus.get("index") or {}
+    lines = [
+        f"Corpus: {corpus['chunks']} chunks ({corpus['synthetic_chunks']} synthetic), "
+        f"{corpus['queries']} labeled queries {corpus['queries_by_source']}",
+        f"Index: {index.get('index_type')} / {index.get('compression')}, "
+        f"{(index.get('memory_bytes') or 0) / 1e6:.1f} MB vectors, built in {corpus['build_seconds']} s; "
+        f"embedding {corpus['embedding']}; cross-encoder {'on' if corpus['cross_encoder'] else 'off'}",
+        "",
+        f"{'config':<10}" + "".join(f"{f'R@{cutoff}':>8}" for cutoff in RECALL_AT)
+        + f"{'MRR':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'+RSS MB':>9}{'query MB':>10}"
+    ]
+    for result in report.results:
+        rss = f"{result.rss_delta_mb:+.1f}" if result.rss_delta_mb is not None else "-"
+        lines.append(
+            f"{result.name:<10}" + "".join(f"{result.recall[cutoff]:>8.3f}" for cutoff in RECALL_AT)
+            + f"{result.mrr:>8.3f}{result.latency_ms['p50']:>10.2f}{result.latency_ms['p95']:>10.2f}"
+            + f"{result.latency_ms['p99']:>10.2f}{rss:>9}{result.peak_query_alloc_mb:>10.2f}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Retrieval quality and latency benchmark over the bundled company data")
+    parser.add_argument("--configs", default=",".join(CONFIGURATIONS), help="Comma-separated: " + ", ".join(CONFIGURATIONS))
+    parser.add_argument("--synthetic", type=int, default=0, help="Synthetic scale-up chunks added to the corpus")
+    parser.add_argument("--synthetic-queries", type=int, default=100, help="Labeled queries over the synthetic chunks")
+    parser.add_argument("--dim", type=int, default=256, help="Hashing embedding dimension")
+    parser.add_argument("--k", type=int, default=50, help="First-stage candidates")
+    parser.add_argument("--top-k", type=int, default=10, help="Results per query (recall@k is measured up to this)")
+    parser.add_argument("--cross-encoder", action="store_true", help="Load the cross-encoder for the rerank configurations")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=Path, help="Also write the report as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_benchmark(
+        configurations=[name.strip() for name in args.configs.split(",") if name.strip()],
+        synthetic=args.synthetic,
+        synthetic_queries=args.synthetic_queries,
+        dimension=args.dim,
+        k=args.k,
+        top_k=args.top_k,
+        cross_encoder=args.cross_encoder,
+        seed=args.seed
+    ))
+    print(format_report(report))
+    if args.json:
+        args.json.write_text(json.dumps(report.to_dict(), ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
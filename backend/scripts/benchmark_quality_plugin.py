@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Retrieval Quality Benchmark Plugin
+Description: pytest plugin running the retrieval quality benchmark with a test session
+
+Usage (from backend/):
+    python -m pytest -p scripts.benchmark_quality_plugin --retrieval-benchmark
+    python -m pytest -p scripts.benchmark_quality_plugin --retrieval-benchmark \
+        --benchmark-synthetic 5000 --benchmark-min-recall 0.8 --benchmark-json report.json
+
+Tests can also use the session-scoped ``retrieval_benchmark`` fixture to
+assert on the report (BenchmarkReport) directly.
+"""
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+
+_REPORT_KEY = pytest.StashKey()
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("retrieval-benchmark", "Retrieval quality and latency benchmark")
+    group.addoption("--retrieval-benchmark", action="store_true", help="Run the retrieval benchmark after the tests")
+    group.addoption("--benchmark-synthetic", type=int, default=0, help="Synthetic scale-up chunks")
+    group.addoption("--benchmark-configs", default="dense,hybrid,rerank,self_rag", help="Comma-separated configurations")
+    group.addoption("--benchmark-min-recall", type=float, default=None,
+                    help="Fail the session if recall@5 of any configuration is below this")
+    group.addoption("--benchmark-json", type=Path, default=None, help="Write the report as JSON")
+
+
+def _report(config):
+    """Run the benchmark once per session"""
+    report = config.stash.get(_REPORT_KEY, None)
+    if report is None:
+        # Heavy imports only when the benchmark actually runs
+        from scripts.benchmark_quality import run_benchmark
+
+        configurations = [name.strip() for name in config.getoption("benchmark_configs").split(",") if name.strip()]
+        report = asyncio.run(run_benchmark(
+            configurations=configurations,
+            synthetic=config.getoption("benchmark_synthetic")
+        ))
+        config.stash[_REPORT_KEY] = report
+    return report
+
+
+@pytest.fixture(scope="session")
+def retrieval_benchmark(request):
+    """BenchmarkReport of the bundled data (and synthetic corpus, if configured)"""
+    return _report(request.config)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    config = session.config
+    if not config.getoption("retrieval_benchmark"):
+        return
+
+    report = _report(config)
+    if config.getoption("benchmark_json"):
+        config.getoption("benchmark_json").write_text(
+            json.dumps(report.to_dict(), ensure_ascii=False, indent=2), encoding="utf-8"
+        )
+
+    # Running only the benchmark (no tests collected) is a success
+    if exitstatus == pytest.ExitCode.NO_TESTS_COLLECTED:
+        session.exitstatus = pytest.ExitCode.OK
+
+    min_recall = config.getoption("benchmark_min_recall")
+    if min_recall is not None and any(result.recall[5] < min_recall for result in report.results):
+        session.exitstatus = pytest.ExitCode.TESTS_FAILED
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    report = config.stash.get(_REPORT_KEY, None)
+    if report is None:
+        return
+
+    from scripts.benchmark_quality import format_report
+
+    terminalreporter.section("retrieval benchmark")
+    terminalreporter.write_line(format_report(report))
+    min_recall = config.getoption("benchmark_min_recall")
+    if min_recall is not None:
+        for result in report.results:
+            if result.recall[5] < min_recall:
+                terminalreporter.write_line(
+                    f"{result.name}: recall@5 {result.recall[5]:.3f} below {min_recall}", red=True
+                )
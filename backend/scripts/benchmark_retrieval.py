@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Retrieval Path Benchmark
+Description: Per-query overhead of the LangChain FAISS wrapper vs the direct chunk-id retrieval path
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from services.chunk_store import ChunkStore
+from services.rag_service import IndexState, RAGService, settings
+
+WORDS = (
+    "izin prosedür yıllık bütçe proje rapor onay süreç çalışan departman "
+    "maaş eğitim güvenlik veri koruma tedarik sözleşme fatura müşteri hedef"
+).split()
+
+
+def build_service(chunks: int, dimension: int, seed: int = 0) -> RAGService:
+    """In-memory RAG service over a synthetic corpus (nothing is written to disk)"""
+    rng = np.random.default_rng(seed)
+    documents = [
+        Document(
+            page_content=" ".join(rng.choice(WORDS, size=24).tolist()) + f" #{i}",
+            metadata={"doc_type": "file", "title": f"Chunk {i}"}
+        )
+        for i in range(chunks)
+    ]
+    ids = list(range(chunks))
+
+    service = RAGService()
+    service.embeddings = DeterministicFakeEmbedding(size=dimension)
+    vectors = np.asarray(service.embeddings.embed_documents([doc.page_content for doc in documents]), dtype=np.float32)
+
+    store = service._create_vector_store(dimension)
+    chunk_store = ChunkStore()
+    store.docstore = chunk_store
+    service._add_vectors(store, ids, vectors, documents)
+    metadata_store, document_chunks = service._chunk_maps(ids, [doc.metadata for doc in documents])
+    service._publish(IndexState(
+        vector_store=store,
+        chunk_store=chunk_store,
+        bm25_index=service._bm25_from(chunk_store),
+        metadata_store=metadata_store,
+        document_chunks=document_chunks,
+        next_chunk_id=chunks,
+        index_mmapped=False,
+        index_report=None
+    ))
+    service._initialized = True
+    return service
+
+
+def summarize(name: str, seconds: list) -> float:
+    """Print mean/p50/p95 in microseconds; returns the mean"""
+    micros = sorted(s * 1e6 for s in seconds)
+    mean = statistics.fmean(micros)
+    p95 = micros[min(len(micros) - 1, int(len(micros) * 0.95))]
+    print(f"  {name:<12} mean {mean:9.1f} us   p50 {statistics.median(micros):9.1f} us   p95 {p95:9.1f} us")
+    return mean
+
+
+def bench_dense(service: RAGService, query_vectors: np.ndarray, k: int, top_k: int):
+    """Dense stage only: same FAISS search, different result handling"""
+    store = service.vector_store
+    langchain, lean = [], []
+    for vector in query_vectors:
+        start = time.perf_counter()
+        hits = store.similarity_search_with_score_by_vector(vector.tolist(), k)
+        [{"title": doc.metadata.get("title"), "score": float(score)} for doc, score in hits]
+        langchain.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        chunk_ids, scores = service._dense_search(store, vector, k)
+        service._ranked_documents(store, chunk_ids[:top_k], scores[:top_k])
+        lean.append(time.perf_counter() - start)
+
+    print(f"Dense search, k={k} (LangChain wraps all k hits; lean materializes top_k={top_k}):")
+    before = summarize("langchain", langchain)
+    after = summarize("lean", lean)
+    print(f"  overhead removed: {before - after:.1f} us/query ({(1 - after / before) * 100:.0f}%)")
+
+
+async def bench_retrieve(service: RAGService, queries: list, k: int, top_k: int):
+    """End-to-end retrieve (hybrid + re-rank) with the dense stage on either path"""
+    timings = {}
+    for name, langchain_path in (("langchain", True), ("lean", False)):
+        settings.RETRIEVAL_LANGCHAIN_PATH = langchain_path
+        service.query_cache = None
+        await service.retrieve(queries[0], k=k, top_k=top_k)
+        timings[name] = []
+        for query in queries:
+            start = time.perf_counter()
+            await service.retrieve(query, k=k, top_k=top_k)
+            timings[name].append(time.perf_counter() - start)
+
+    print(f"retrieve(), hybrid + re-rank, k={k}, top_k={top_k}:")
+    before = summarize("langchain", timings["langchain"])
+    after = summarize("lean", timings["lean"])
+    print(f"  overhead removed: {before - after:.1f} us/query ({(1 - after / before) * 100:.0f}%)")
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Compare LangChain and direct FAISS retrieval paths")
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    # Sequential timing: no micro-batching window
+    settings.RETRIEVAL_BATCH_WINDOW_MS = 0
+
+    print(f"Building synthetic corpus: {args.chunks} chunks, dim {args.dim}")
+    service = build_service(args.chunks, args.dim)
+    rng = np.random.default_rng(1)
+    queries = [" ".join(rng.choice(WORDS, size=4).tolist()) for _ in range(args.queries)]
+    query_vectors = np.asarray(service.embeddings.embed_documents(queries), dtype=np.float32)
+
+    bench_dense(service, query_vectors, args.k, args.top_k)
+    asyncio.run(bench_retrieve(service, queries, args.k, args.top_k))
+    service.executor.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
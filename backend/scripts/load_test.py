@@ -0,0 +1,444 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Load Test
+Description: Open-loop async load generator for /api/chat, /api/conversations and uploads, reporting throughput, per-stage latency percentiles and the saturation point per uvicorn worker count
+
+Usage (from backend/, with PostgreSQL and Redis up and users seeded):
+    # Against a running server
+    python scripts/load_test.py --base-url http://127.0.0.1:8000 --rps 2,5,10,20
+    # Spawn uvicorn with the MOCK provider for each worker count
+    MOCK_LLM_FIRST_TOKEN_MS=600 python scripts/load_test.py --workers 1,2,4 --rps 5,10,20,40,80
+
+Requests are sent on a fixed schedule (Poisson or constant arrivals)
+whether or not earlier ones finished, and latency is measured from the
+scheduled send time, so a saturated server shows up as growing latency
+instead of a silently lower request rate. Uploads are indexed for real,
+so point upload-heavy runs at a scratch database and index.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import httpx
+import numpy as np
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+ENDPOINTS = ("chat", "conversations", "upload")
+# Order of the stages reported by /api/chat (stage_latency_ms)
+CHAT_STAGES = ("conversation", "history", "retrieval", "context", "generation", "persist")
+
+
+@dataclass
+class Sample:
+    """One request: status 0 means a transport error (timeout, connection refused)"""
+    endpoint: str
+    latency_ms: float
+    status: int
+    finished: float
+    stages: Optional[Dict[str, float]] = None
+
+
+@dataclass
+class StepResult:
+    """Outcome of one offered request rate"""
+    offered_rps: float
+    duration_s: float
+    requests: int
+    throughput_rps: float
+    error_rate: float
+    status_counts: Dict[str, int]
+    latency_ms: Dict[str, Dict[str, float]]
+    chat_stage_ms: Dict[str, Dict[str, float]]
+    saturated: bool = False
+    reasons: List[str] = field(default_factory=list)
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    return {
+        "mean": round(float(np.mean(values)), 2),
+        "p50": round(float(np.percentile(values, 50)), 2),
+        "p95": round(float(np.percentile(values, 95)), 2),
+        "p99": round(float(np.percentile(values, 99)), 2),
+        "max": round(float(np.max(values)), 2)
+    }
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """'chat=8,conversations=2,upload=1' -> endpoint weights"""
+    mix = {}
+    for part in text.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint in mix: {name} (expected one of {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise ValueError("Request mix is empty")
+    return mix
+
+
+def company_prompts(data_dir: Path = DATA_DIR) -> List[str]:
+    """Chat prompts about the bundled company data"""
+    prompts = []
+    for name, template in (
+        ("employees", "{name} hangi departmanda çalışıyor?"),
+        ("projects", "{name} projesinin durumu nedir?"),
+        ("procedures", "{title} prosedürü nasıl işliyor?"),
+        ("departments", "{name} departmanının görevi nedir?")
+    ):
+        path = data_dir / f"{name}.json"
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                for item in json.load(f):
+                    try:
+                        prompts.append(template.format(**item))
+                    except KeyError:
+                        continue
+    return prompts or ["Şirketin izin prosedürü nedir?"]
+
+
+class LoadGenerator:
+    """Sends a weighted mix of requests at a target rate and records every outcome"""
+
+    def __init__(
+        self,
+        base_url: str,
+        token: str,
+        mix: Dict[str, float],
+        prompts: List[str],
+        unique_prompts: bool = True,
+        upload_words: int = 300,
+        timeout: float = 120.0,
+        max_in_flight: int = 1000
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.endpoints = list(mix)
+        self.weights = [mix[name] for name in self.endpoints]
+        self.prompts = prompts
+        self.unique_prompts = unique_prompts
+        self.upload_words = upload_words
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+        self.vocabulary = sorted({word for prompt in prompts for word in prompt.split()})
+        self._counter = 0
+
+    def _next_id(self) -> int:
+        self._counter += 1
+        return self._counter
+
+    async def _chat(self, client: httpx.AsyncClient) -> Tuple[int, Optional[Dict[str, float]]]:
+        prompt = random.choice(self.prompts)
+        if self.unique_prompts:
+            # Distinct prompts, so the AI response cache does not answer for the provider
+            prompt = f"{prompt} (istek {self._next_id()})"
+        response = await client.post("/api/chat", json={"prompt": prompt})
+        stages = None
+        if response.status_code == 200:
+            stages = response.json().get("stage_latency_ms")
+        return response.status_code, stages
+
+    async def _conversations(self, client: httpx.AsyncClient) -> Tuple[int, None]:
+        response = await client.get("/api/conversations")
+        return response.status_code, None
+
+    async def _upload(self, client: httpx.AsyncClient) -> Tuple[int, None]:
+        # Random text from the prompt vocabulary: every upload is new content (not deduplicated away)
+        request_id = self._next_id()
+        words = random.choices(self.vocabulary or ["belge"], k=self.upload_words)
+        content = f"Yük testi belgesi {request_id}\n\n" + " ".join(words)
+        response = await client.post(
+            "/api/v2/files/upload",
+            files={"file": (f"load-test-{request_id}.txt", content.encode("utf-8"), "text/plain")},
+            data={"title": f"Load test {request_id}"}
+        )
+        return response.status_code, None
+
+    async def _send(
+        self,
+        client: httpx.AsyncClient,
+        semaphore: asyncio.Semaphore,
+        endpoint: str,
+        scheduled: float
+    ) -> Sample:
+        async with semaphore:
+            try:
+                status, stages = await getattr(self, f"_{endpoint}")(client)
+            except httpx.HTTPError:
+                status, stages = 0, None
+        # From the scheduled send time: waiting for a free slot counts as latency
+        finished = time.perf_counter()
+        return Sample(endpoint, (finished - scheduled) * 1000, status, finished, stages)
+
+    async def run(self, rps: float, duration: float, arrivals: str = "poisson") -> Tuple[List[Sample], float]:
+        """Offer rps requests per second for duration seconds; returns the samples and the start time"""
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        limits = httpx.Limits(max_connections=self.max_in_flight, max_keepalive_connections=self.max_in_flight)
+        async with httpx.AsyncClient(
+            base_url=self.base_url, headers=self.headers, timeout=self.timeout, limits=limits
+        ) as client:
+            tasks = []
+            start = time.perf_counter()
+            scheduled = start
+            while scheduled - start < duration:
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                endpoint = random.choices(self.endpoints, self.weights)[0]
+                tasks.append(asyncio.create_task(self._send(client, semaphore, endpoint, scheduled)))
+                scheduled += random.expovariate(rps) if arrivals == "poisson" else 1.0 / rps
+            samples = await asyncio.gather(*tasks)
+            return list(samples), start
+
+
+def summarize(
+    samples: List[Sample],
+    offered_rps: float,
+    start: float,
+    duration: float,
+    slo_ms: float,
+    max_error_rate: float,
+    min_throughput: float = 0.9
+) -> StepResult:
+    """
+    Aggregate one step and decide whether the server kept up
+
+    Throughput is the rate of successful completions between the first
+    completion and the end of the send window (steady state, not the
+    ramp-up or the drain). A step is saturated when it falls below
+    min_throughput of the offered rate, the p95 latency exceeds the SLO,
+    or too many requests fail.
+    """
+    ok = [sample for sample in samples if 200 <= sample.status < 300]
+    elapsed = max((sample.finished for sample in samples), default=start) - start
+    throughput = len(ok) / elapsed if elapsed else 0.0
+    if ok:
+        first = min(sample.finished for sample in ok)
+        if start + duration - first >= duration / 2:
+            in_window = sum(1 for sample in ok if sample.finished <= start + duration)
+            throughput = in_window / (start + duration - first)
+    status_counts: Dict[str, int] = {}
+    for sample in samples:
+        key = str(sample.status) if sample.status else "transport_error"
+        status_counts[key] = status_counts.get(key, 0) + 1
+
+    latency = {"all": percentiles([sample.latency_ms for sample in ok])}
+    for endpoint in ENDPOINTS:
+        values = [sample.latency_ms for sample in ok if sample.endpoint == endpoint]
+        if values:
+            latency[endpoint] = percentiles(values)
+
+    chat_stages = {}
+    for stage in CHAT_STAGES:
+        values = [sample.stages[stage] for sample in ok if sample.stages and stage in sample.stages]
+        if values:
+            chat_stages[stage] = percentiles(values)
+
+    result = StepResult(
+        offered_rps=offered_rps,
+        duration_s=round(elapsed, 2),
+        requests=len(samples),
+        throughput_rps=round(throughput, 2),
+        error_rate=round(1 - len(ok) / len(samples), 4) if samples else 0.0,
+        status_counts=status_counts,
+        latency_ms=latency,
+        chat_stage_ms=chat_stages
+    )
+    if result.throughput_rps < offered_rps * min_throughput:
+        result.reasons.append(f"throughput {result.throughput_rps} < {min_throughput:.0%} of offered")
+    if latency["all"] and latency["all"]["p95"] > slo_ms:
+        result.reasons.append(f"p95 {latency['all']['p95']} ms > SLO {slo_ms} ms")
+    if result.error_rate > max_error_rate:
+        result.reasons.append(f"error rate {result.error_rate:.2%} > {max_error_rate:.2%}")
+    result.saturated = bool(result.reasons)
+    return result
+
+
+async def login(base_url: str, username: str, password: str) -> str:
+    async with httpx.AsyncClient(base_url=base_url, timeout=30.0) as client:
+        response = await client.post("/api/login", json={"username": username, "password": password})
+        if response.status_code != 200:
+            raise RuntimeError(f"Login failed ({response.status_code}): {response.text[:200]}")
+        return response.json()["access_token"]
+
+
+async def wait_until_ready(base_url: str, timeout: float, process: Optional[subprocess.Popen] = None):
+    """Poll /api/status until the server answers (start-up builds the RAG index)"""
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url, timeout=5.0) as client:
+        while time.monotonic() < deadline:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"Server exited during start-up (code {process.returncode})")
+            try:
+                if (await client.get("/api/status")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"Server at {base_url} not ready after {timeout:.0f} s")
+
+
+@contextmanager
+def uvicorn_server(workers: int, port: int, provider: str, log_path: Optional[Path]) -> Iterator[subprocess.Popen]:
+    """uvicorn main:app with the given worker count; the MOCK provider and a rate limit the load cannot reach by default"""
+    env = dict(os.environ)
+    env["AI_PROVIDER"] = provider
+    # All simulated users come from one address and account, which the limiter would otherwise throttle
+    env.setdefault("RATE_LIMIT_REQUESTS", "1000000000")
+    log = open(log_path, "ab") if log_path else subprocess.DEVNULL
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--no-access-log"
+        ],
+        cwd=str(Path(__file__).parent.parent),
+        env=env,
+        stdout=log,
+        stderr=subprocess.STDOUT
+    )
+    try:
+        yield process
+    finally:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        if log_path:
+            log.close()
+
+
+def format_step(workers: Optional[int], result: StepResult) -> str:
+    latency = result.latency_ms["all"] or {}
+    generation = result.chat_stage_ms.get("generation", {})
+    retrieval = result.chat_stage_ms.get("retrieval", {})
+    return (
+        f"{workers or '-':>7} {result.offered_rps:>8.1f} {result.throughput_rps:>8.2f} {result.error_rate:>7.2%}"
+        f" {latency.get('p50', 0):>9.1f} {latency.get('p95', 0):>9.1f} {latency.get('p99', 0):>9.1f}"
+        f" {retrieval.get('p95', 0):>11.1f} {generation.get('p95', 0):>11.1f}"
+        f"  {'SATURATED: ' + '; '.join(result.reasons) if result.saturated else ''}"
+    )
+
+
+HEADER = (
+    f"{'workers':>7} {'offered':>8} {'ok/s':>8} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    f" {'retr p95':>11} {'gen p95':>11}"
+)
+
+
+async def run_ramp(
+    generator: LoadGenerator,
+    workers: Optional[int],
+    rates: List[float],
+    args: argparse.Namespace
+) -> Dict:
+    """Step through the offered rates until the server saturates"""
+    if args.warmup:
+        await generator.run(rps=max(args.warmup / 2, 1.0), duration=2.0, arrivals="constant")
+
+    steps = []
+    sustained = None
+    for rate in rates:
+        samples, start = await generator.run(rate, args.duration, args.arrivals)
+        result = summarize(samples, rate, start, args.duration, args.slo_ms, args.max_error_rate)
+        steps.append(result)
+        print(format_step(workers, result), flush=True)
+        if result.saturated:
+            break
+        sustained = rate
+
+    return {
+        "workers": workers,
+        "saturation_rps": sustained,
+        "steps": [asdict(step) for step in steps]
+    }
+
+
+async def run(args: argparse.Namespace) -> List[Dict]:
+    rates = [float(rate) for rate in args.rps.split(",") if rate.strip()]
+    mix = parse_mix(args.mix)
+    prompts = company_prompts()
+    worker_counts = [int(count) for count in args.workers.split(",")] if args.workers else [None]
+
+    async def test(base_url: str, workers: Optional[int]) -> Dict:
+        token = args.token or await login(base_url, args.username, args.password)
+        generator = LoadGenerator(
+            base_url, token, mix, prompts, not args.allow_cache, args.upload_words, args.timeout, args.max_in_flight
+        )
+        return await run_ramp(generator, workers, rates, args)
+
+    print(HEADER, flush=True)
+    reports = []
+    for workers in worker_counts:
+        if workers is None:
+            reports.append(await test(args.base_url, None))
+            continue
+        base_url = f"http://127.0.0.1:{args.port}"
+        with uvicorn_server(workers, args.port, args.provider, args.server_log) as process:
+            await wait_until_ready(base_url, args.startup_timeout, process)
+            reports.append(await test(base_url, workers))
+
+    print()
+    for report in reports:
+        label = f"{report['workers']} worker(s)" if report["workers"] else args.base_url
+        sustained = report["saturation_rps"]
+        print(f"{label}: sustained {sustained if sustained is not None else '< ' + str(rates[0])} req/s")
+    return reports
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Load test /api/chat, /api/conversations and uploads")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="Server to test (ignored with --workers)")
+    parser.add_argument("--workers", help="Spawn uvicorn for each comma-separated worker count instead")
+    parser.add_argument("--port", type=int, default=8765, help="Port of spawned servers")
+    parser.add_argument("--provider", default="MOCK", help="AI_PROVIDER of spawned servers")
+    parser.add_argument("--server-log", type=Path, help="Append spawned server output to this file")
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="1234")
+    parser.add_argument("--token", help="Access token (skips login)")
+    parser.add_argument("--rps", default="1,2,5,10,20", help="Comma-separated offered request rates, in ramp order")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per rate")
+    parser.add_argument("--arrivals", choices=["poisson", "constant"], default="poisson")
+    parser.add_argument("--mix", default="chat=8,conversations=2,upload=0", help="Endpoint weights")
+    parser.add_argument("--upload-words", type=int, default=300, help="Words per uploaded text file")
+    parser.add_argument("--allow-cache", action="store_true", help="Repeat prompts verbatim (AI response cache hits)")
+    parser.add_argument("--slo-ms", type=float, default=5000.0, help="p95 latency above which a rate counts as saturated")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--warmup", type=int, default=5, help="Warm-up requests before the ramp (0 = none)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout (s)")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="Client-side concurrency cap")
+    parser.add_argument("--json", type=Path, help="Also write the full report as JSON")
+    args = parser.parse_args()
+
+    try:
+        reports = asyncio.run(run(args))
+    except (RuntimeError, ValueError, httpx.HTTPError) as e:
+        print(f"❌ {e}")
+        return 1
+
+    if args.json:
+        args.json.write_text(json.dumps(reports, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
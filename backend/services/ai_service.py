@@ -3,7 +3,11 @@
 Module: AI Service
 Description: Async multi-provider AI integration service using httpx.AsyncClient.
 """
+import asyncio
+import itertools
 import json
+import math
+import random
 import time
 from typing import Optional, List, Dict, Tuple
 from pathlib import Path
@@ -31,6 +35,20 @@ If a user's question is not related to {company_name}'s internal information, po
 SYSTEM_PROMPT = SYSTEM_PROMPT_TEMPLATE.format(company_name=settings.COMPANY_NAME)
 
 
+def _mock_first_token_ms() -> float:
+    """Sample the mock provider's time to first token (MOCK_LLM_LATENCY_DISTRIBUTION around MOCK_LLM_FIRST_TOKEN_MS)"""
+    median = max(settings.MOCK_LLM_FIRST_TOKEN_MS, 0.0)
+    spread = max(settings.MOCK_LLM_LATENCY_SPREAD, 0.0)
+    distribution = settings.MOCK_LLM_LATENCY_DISTRIBUTION
+    if median == 0 or distribution == "constant":
+        return median
+    if distribution == "uniform":
+        return max(0.0, random.uniform(median * (1 - spread), median * (1 + spread)))
+    if distribution == "exponential":
+        return random.expovariate(math.log(2) / median)
+    return random.lognormvariate(math.log(median), spread)
+
+
 class AIService:
     """Async AI service with multi-provider support"""
     
@@ -91,6 +109,8 @@ class AIService:
                 response, metadata = await self._generate_azure(prompt, conversation_history, context)
             elif provider == "OLLAMA":
                 response, metadata = await self._generate_ollama(prompt, conversation_history, context)
+            elif provider == "MOCK":
+                response, metadata = await self._generate_mock(prompt, conversation_history, context)
             else:
                 raise ValueError(f"Unsupported provider: {provider}")
             
@@ -354,6 +374,48 @@ class AIService:
             raise ValueError("Ollama returned empty response")
         
         return text, {"model": settings.OLLAMA_MODEL}
+    
+    async def _generate_mock(
+        self,
+        prompt: str,
+        conversation_history: Optional[List[Dict]] = None,
+        context: Optional[str] = None
+    ) -> Tuple[str, Dict]:
+        """
+        Generate a canned response with simulated latency (load testing)
+        
+        Waits a sampled time to first token, then MOCK_LLM_OUTPUT_TOKENS
+        (on average) at MOCK_LLM_TOKENS_PER_SECOND, so capacity tests see
+        realistic provider time without calling Gemini or OpenAI. A
+        MOCK_LLM_ERROR_RATE fraction of calls fails like an upstream error.
+        """
+        first_token_ms = _mock_first_token_ms()
+        await asyncio.sleep(first_token_ms / 1000)
+        
+        if random.random() < settings.MOCK_LLM_ERROR_RATE:
+            raise ValueError(f"Mock API error: {settings.MOCK_LLM_ERROR_STATUS}")
+        
+        mean_tokens = max(settings.MOCK_LLM_OUTPUT_TOKENS, 1)
+        output_tokens = max(1, round(random.gauss(mean_tokens, mean_tokens * 0.25)))
+        generation_ms = 0.0
+        if settings.MOCK_LLM_TOKENS_PER_SECOND > 0:
+            generation_ms = output_tokens / settings.MOCK_LLM_TOKENS_PER_SECOND * 1000
+            await asyncio.sleep(generation_ms / 1000)
+        
+        # Echo words of the context (or prompt), one word per output token
+        words = (context or prompt).split() or ["yanıt"]
+        text = " ".join(itertools.islice(itertools.cycle(words), output_tokens))
+        
+        # Rough prompt size (about 4 characters per token), like a provider's usage report
+        history_chars = sum(len(m.get('content', '')) for m in (conversation_history or [])[-5:] if isinstance(m, dict))
+        prompt_tokens = (len(SYSTEM_PROMPT) + len(context or "") + len(prompt) + history_chars) // 4
+        
+        return text, {
+            "model": "mock",
+            "token_count": prompt_tokens + output_tokens,
+            "first_token_ms": round(first_token_ms, 2),
+            "generation_ms": round(generation_ms, 2)
+        }
 
 
 # Global instance (use async context manager in routes)
@@ -0,0 +1,495 @@
+# -*- coding: utf-8 -*-
+"""
+Module: BM25 Index
+Description: Vectorized, incrementally updatable BM25 sparse retrieval over CSR posting segments.
+"""
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+
+def _save_array(path: Path, array: np.ndarray):
+    """np.save through a temporary file renamed into place (memory-mapped readers keep the old file)"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+class _Segment:
+    """Immutable postings of one batch of documents plus a tombstone mask"""
+
+    def __init__(self, postings: sparse.csr_matrix, doc_ids: np.ndarray, doc_lengths: np.ndarray):
+        self.postings = postings  # shape (terms known at build time, documents)
+        self.doc_ids = doc_ids  # strictly increasing
+        self.doc_lengths = doc_lengths
+        self.live = np.ones(doc_ids.size, dtype=bool)
+
+    @property
+    def live_count(self) -> int:
+        return int(self.live.sum())
+
+    def copy(self) -> "_Segment":
+        """Same postings with a private tombstone mask"""
+        segment = _Segment(self.postings, self.doc_ids, self.doc_lengths)
+        segment.live = self.live.copy()
+        return segment
+
+    def rows_of(self, doc_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Map document ids to row positions; returns (rows, found_mask)"""
+        if self.doc_ids.size == 0:
+            return np.zeros(doc_ids.size, dtype=np.int64), np.zeros(doc_ids.size, dtype=bool)
+        rows = np.minimum(np.searchsorted(self.doc_ids, doc_ids), self.doc_ids.size - 1)
+        return rows, self.doc_ids[rows] == doc_ids
+
+    def gather(self, term_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Concatenate the posting lists of several terms without a Python loop
+
+        Returns:
+            (doc_rows, term_frequencies, posting_lengths_per_term)
+        """
+        indptr = self.postings.indptr
+        n_terms = self.postings.shape[0]
+        # Terms added to the vocabulary after this segment have no postings here
+        known = term_ids < n_terms
+        safe_ids = np.where(known, term_ids, 0)
+        starts = indptr[safe_ids]
+        lengths = np.where(known, indptr[safe_ids + 1] - starts, 0)
+        total = int(lengths.sum())
+        if total == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32), lengths
+
+        offsets = np.cumsum(lengths) - lengths
+        positions = np.repeat(starts - offsets, lengths) + np.arange(total)
+        return self.postings.indices[positions], self.postings.data[positions], lengths
+
+
+class BM25Index:
+    """
+    Okapi BM25 index backed by CSR matrices of shape (terms, documents).
+
+    Each row holds the posting list of one term (document rows + term
+    frequencies), so a query only touches the postings of its own terms
+    instead of looping over the whole corpus. Documents are addressed by
+    external, strictly increasing integer ids, which are returned from
+    ``search``.
+
+    Updates are incremental: ``add`` appends a new segment for the batch
+    and ``remove`` tombstones rows. Document frequencies, live document
+    count and total length are maintained on every update, so IDF and
+    average length never require a corpus scan. ``compact`` merges all
+    segments and drops tombstoned rows; it is safe to run in a background
+    thread while queries are served.
+
+    Terms are whatever the analyzer produces: strings, or integer term ids
+    (uint64 arrays) from a cached token stream. ``analyzer`` records the
+    analyzer signature the postings were built with, so an index built by
+    a different pipeline can be detected and rebuilt.
+    """
+
+    # Compaction triggers
+    MAX_SEGMENTS = 8
+    MAX_DEAD_RATIO = 0.2
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, analyzer: Optional[str] = None):
+        self.k1 = k1
+        self.b = b
+        self.analyzer = analyzer
+        self.vocabulary: Dict[Hashable, int] = {}
+        self._segments: List[_Segment] = []
+        self._doc_freqs = np.zeros(0, dtype=np.float32)
+        self._n_live = 0
+        self._total_length = 0.0
+        self._n_dead = 0
+        self._lock = threading.Lock()
+        self._compacting = False
+
+    @classmethod
+    def from_corpus(
+        cls,
+        corpus: Sequence[Sequence[Hashable]],
+        ids: Optional[Sequence[int]] = None,
+        k1: float = 1.5,
+        b: float = 0.75,
+        analyzer: Optional[str] = None
+    ) -> "BM25Index":
+        """Build an index from tokenized documents (ids default to row positions)"""
+        index = cls(k1=k1, b=b, analyzer=analyzer)
+        index.add(corpus, ids if ids is not None else range(len(corpus)))
+        return index
+
+    def __len__(self) -> int:
+        return self._n_live
+
+    @property
+    def segment_count(self) -> int:
+        return len(self._segments)
+
+    def copy(self) -> "BM25Index":
+        """
+        Independent index for copy-on-write updates
+
+        Posting arrays are shared (segments never change them); vocabulary,
+        statistics and tombstone masks are copied.
+        """
+        with self._lock:
+            index = BM25Index(k1=self.k1, b=self.b, analyzer=self.analyzer)
+            index.vocabulary = dict(self.vocabulary)
+            index._segments = [segment.copy() for segment in self._segments]
+            index._doc_freqs = self._doc_freqs.copy()
+            index._n_live = self._n_live
+            index._total_length = self._total_length
+            index._n_dead = self._n_dead
+        return index
+
+    def _build_segment(self, corpus: Sequence[Sequence[Hashable]], ids: Sequence[int]) -> _Segment:
+        """Encode a batch of documents, growing the shared vocabulary"""
+        vocabulary = self.vocabulary
+        doc_lengths = np.fromiter((len(tokens) for tokens in corpus), dtype=np.int64, count=len(corpus))
+        doc_cols = np.repeat(np.arange(len(corpus)), doc_lengths)
+
+        term_rows = np.zeros(0, dtype=np.int64)
+        if doc_cols.size:
+            if all(isinstance(tokens, np.ndarray) for tokens in corpus):
+                terms = np.concatenate(corpus)
+            else:
+                terms = np.asarray([token for tokens in corpus for token in tokens])
+            # Only the batch's distinct terms go through the vocabulary dict
+            unique_terms, inverse = np.unique(terms, return_inverse=True)
+            unique_rows = np.fromiter(
+                (vocabulary.setdefault(term, len(vocabulary)) for term in unique_terms.tolist()),
+                dtype=np.int64,
+                count=unique_terms.size
+            )
+            term_rows = unique_rows[inverse.ravel()]
+
+        # Duplicate (term, doc) entries are summed into term frequencies
+        postings = sparse.coo_matrix(
+            (np.ones(term_rows.size, dtype=np.float32), (term_rows, doc_cols)),
+            shape=(len(vocabulary), len(corpus))
+        ).tocsr()
+        postings.sum_duplicates()
+
+        return _Segment(postings, np.asarray(ids, dtype=np.int64), doc_lengths.astype(np.float32))
+
+    def add(self, corpus: Sequence[Sequence[Hashable]], ids: Sequence[int]):
+        """Append tokenized documents (term lists or term id arrays); ids must be greater than any existing id"""
+        if not len(corpus):
+            return
+
+        with self._lock:
+            segment = self._build_segment(corpus, ids)
+
+            # Incremental statistics: document frequency = posting list length
+            segment_dfs = np.diff(segment.postings.indptr).astype(np.float32)
+            if self._doc_freqs.size < segment_dfs.size:
+                self._doc_freqs = np.concatenate([
+                    self._doc_freqs,
+                    np.zeros(segment_dfs.size - self._doc_freqs.size, dtype=np.float32)
+                ])
+            self._doc_freqs[:segment_dfs.size] += segment_dfs
+            self._n_live += len(corpus)
+            self._total_length += float(segment.doc_lengths.sum())
+
+            self._segments = self._segments + [segment]
+
+    def remove(self, ids: Sequence[int]) -> int:
+        """Tombstone documents by id; returns the number of documents removed"""
+        ids = np.asarray(ids, dtype=np.int64)
+        removed = 0
+        if ids.size == 0:
+            return removed
+
+        with self._lock:
+            for segment in self._segments:
+                rows, found = segment.rows_of(ids)
+                rows = np.unique(rows[found])
+                rows = rows[segment.live[rows]]
+                if rows.size == 0:
+                    continue
+
+                segment.live[rows] = False
+                # Column slice gives the terms of the removed documents
+                removed_terms = segment.postings[:, rows]
+                term_dfs = removed_terms.getnnz(axis=1).astype(np.float32)
+                self._doc_freqs[:term_dfs.size] -= term_dfs
+                self._n_live -= int(rows.size)
+                self._n_dead += int(rows.size)
+                self._total_length -= float(segment.doc_lengths[rows].sum())
+                removed += int(rows.size)
+
+        return removed
+
+    def needs_compaction(self) -> bool:
+        """Whether segments or tombstones have accumulated enough to compact"""
+        if self._compacting:
+            return False
+        total = self._n_live + self._n_dead
+        dead_ratio = self._n_dead / total if total else 0.0
+        return len(self._segments) > self.MAX_SEGMENTS or dead_ratio > self.MAX_DEAD_RATIO
+
+    def compact(self):
+        """Merge all segments into one and drop tombstoned documents"""
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+            snapshot = list(self._segments)
+            snapshot_live = [segment.live.copy() for segment in snapshot]
+            n_terms = len(self.vocabulary)
+
+        try:
+            # Heavy lifting happens outside the lock; queries keep using the old segments
+            blocks = []
+            doc_ids = []
+            doc_lengths = []
+            for segment, live in zip(snapshot, snapshot_live):
+                rows = np.flatnonzero(live)
+                postings = segment.postings[:, rows].tocsr()
+                postings.resize((n_terms, rows.size))
+                blocks.append(postings)
+                doc_ids.append(segment.doc_ids[rows])
+                doc_lengths.append(segment.doc_lengths[rows])
+
+            if blocks:
+                merged = _Segment(
+                    sparse.hstack(blocks, format="csr", dtype=np.float32),
+                    np.concatenate(doc_ids),
+                    np.concatenate(doc_lengths)
+                )
+            else:
+                merged = None
+
+            with self._lock:
+                # Re-apply tombstones that happened while merging
+                dead_since = [
+                    segment.doc_ids[before & ~segment.live]
+                    for segment, before in zip(snapshot, snapshot_live)
+                ]
+                dead_since = np.concatenate(dead_since) if dead_since else np.zeros(0, dtype=np.int64)
+
+                segments = self._segments[len(snapshot):]
+                if merged is not None and merged.doc_ids.size:
+                    if dead_since.size:
+                        rows, found = merged.rows_of(dead_since)
+                        merged.live[rows[found]] = False
+                    segments = [merged] + segments
+
+                self._segments = segments
+                self._n_dead = sum(int((~segment.live).sum()) for segment in segments)
+        finally:
+            self._compacting = False
+
+    def save(self, directory: Path):
+        """
+        Persist vocabulary, statistics and the posting segments
+
+        Every array is its own .npy file so ``load`` can memory-map the
+        postings; ``state.json`` is written last and names the segments.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        with self._lock:
+            segments = list(self._segments)
+            lives = [segment.live.copy() for segment in segments]
+            doc_freqs = self._doc_freqs.copy()
+            vocabulary = sorted(self.vocabulary, key=self.vocabulary.get)
+            state = {
+                "k1": self.k1,
+                "b": self.b,
+                "analyzer": self.analyzer,
+                "n_live": self._n_live,
+                "n_dead": self._n_dead,
+                "total_length": self._total_length,
+                "segments": [list(segment.postings.shape) for segment in segments]
+            }
+
+        for i, (segment, live) in enumerate(zip(segments, lives)):
+            _save_array(directory / f"seg{i}.indptr.npy", segment.postings.indptr)
+            _save_array(directory / f"seg{i}.indices.npy", segment.postings.indices)
+            _save_array(directory / f"seg{i}.data.npy", segment.postings.data)
+            _save_array(directory / f"seg{i}.doc_ids.npy", segment.doc_ids)
+            _save_array(directory / f"seg{i}.doc_lengths.npy", segment.doc_lengths)
+            _save_array(directory / f"seg{i}.live.npy", live)
+        _save_array(directory / "doc_freqs.npy", doc_freqs)
+
+        # Integer term ids are stored as a uint64 array, string terms as JSON
+        if vocabulary and all(isinstance(term, int) for term in vocabulary):
+            _save_array(directory / "vocabulary.npy", np.asarray(vocabulary, dtype=np.uint64))
+            (directory / "vocabulary.json").unlink(missing_ok=True)
+        else:
+            tmp_path = directory / "vocabulary.json.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(vocabulary, f, ensure_ascii=False)
+            os.replace(tmp_path, directory / "vocabulary.json")
+            (directory / "vocabulary.npy").unlink(missing_ok=True)
+
+        tmp_path = directory / "state.json.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, directory / "state.json")
+
+    @staticmethod
+    def exists(directory: Path) -> bool:
+        return (Path(directory) / "state.json").exists()
+
+    @classmethod
+    def load(cls, directory: Path) -> "BM25Index":
+        """Open a saved index; postings are memory-mapped, tombstone masks are loaded into RAM"""
+        directory = Path(directory)
+        with open(directory / "state.json", "r", encoding="utf-8") as f:
+            state = json.load(f)
+        if (directory / "vocabulary.npy").exists():
+            vocabulary = np.load(directory / "vocabulary.npy").tolist()
+        else:
+            with open(directory / "vocabulary.json", "r", encoding="utf-8") as f:
+                vocabulary = json.load(f)
+
+        index = cls(k1=state["k1"], b=state["b"], analyzer=state.get("analyzer"))
+        index.vocabulary = {term: term_id for term_id, term in enumerate(vocabulary)}
+        index._doc_freqs = np.load(directory / "doc_freqs.npy")
+        index._n_live = int(state["n_live"])
+        index._n_dead = int(state["n_dead"])
+        index._total_length = float(state["total_length"])
+
+        for i, shape in enumerate(state["segments"]):
+            postings = sparse.csr_matrix(
+                (
+                    np.load(directory / f"seg{i}.data.npy", mmap_mode="r"),
+                    np.load(directory / f"seg{i}.indices.npy", mmap_mode="r"),
+                    np.load(directory / f"seg{i}.indptr.npy", mmap_mode="r")
+                ),
+                shape=tuple(shape)
+            )
+            segment = _Segment(
+                postings,
+                np.load(directory / f"seg{i}.doc_ids.npy", mmap_mode="r"),
+                np.load(directory / f"seg{i}.doc_lengths.npy", mmap_mode="r")
+            )
+            segment.live = np.load(directory / f"seg{i}.live.npy")
+            index._segments.append(segment)
+
+        return index
+
+    def _term_ids(self, tokens: Sequence[Hashable]) -> Tuple[np.ndarray, np.ndarray]:
+        """Map query tokens to known term ids (unique) and their query counts"""
+        counts: Dict[int, int] = {}
+        for token in tokens:
+            term_id = self.vocabulary.get(token)
+            if term_id is not None:
+                counts[term_id] = counts.get(term_id, 0) + 1
+        term_ids = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        weights = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        return term_ids, weights
+
+    def search(
+        self,
+        query_tokens: Sequence[Hashable],
+        k: int,
+        allowed: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score only live documents that contain at least one query term
+
+        Args:
+            query_tokens: Analyzed query (same kind of terms as the indexed documents)
+            k: Number of results
+            allowed: Optional boolean mask indexed by document id; documents
+                outside the mask are dropped before scoring
+
+        Returns:
+            (doc_ids, scores) of the top k documents, best first
+        """
+        term_ids, weights = self._term_ids(query_tokens)
+        if k <= 0 or term_ids.size == 0 or self._n_live == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        # IDF and average length come from the incrementally maintained stats
+        n_docs = float(self._n_live)
+        doc_freqs = self._doc_freqs[term_ids]
+        idf = np.log1p((n_docs - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32) * weights
+        avgdl = max(self._total_length / n_docs, 1e-9)
+
+        candidate_ids = []
+        candidate_scores = []
+        for segment in self._segments:
+            doc_rows, tf, lengths = segment.gather(term_ids)
+            if doc_rows.size == 0:
+                continue
+
+            posting_idf = np.repeat(idf, lengths)
+            live = segment.live[doc_rows]
+            if allowed is not None:
+                posting_ids = segment.doc_ids[doc_rows]
+                in_range = posting_ids < allowed.size
+                live &= in_range
+                live[in_range] &= allowed[posting_ids[in_range]]
+            doc_rows, tf, posting_idf = doc_rows[live], tf[live], posting_idf[live]
+            if doc_rows.size == 0:
+                continue
+
+            norm = self.k1 * (1.0 - self.b + self.b * segment.doc_lengths[doc_rows] / avgdl)
+            contributions = posting_idf * tf * (self.k1 + 1.0) / (tf + norm)
+
+            # Accumulate per candidate document (candidates only, not the corpus)
+            candidates, inverse = np.unique(doc_rows, return_inverse=True)
+            candidate_ids.append(segment.doc_ids[candidates])
+            candidate_scores.append(np.bincount(inverse, weights=contributions))
+
+        if not candidate_ids:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        ids = np.concatenate(candidate_ids)
+        scores = np.concatenate(candidate_scores).astype(np.float32)
+
+        if ids.size > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(ids.size)
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        return ids[top], scores[top]
+
+    def term_overlap(self, query_tokens: Sequence[Hashable], doc_ids: Sequence[int]) -> np.ndarray:
+        """
+        Count distinct query terms contained in each given document
+
+        Documents that are not in the index get -1 so callers can fall back.
+        """
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        overlap = np.full(doc_ids.size, -1, dtype=np.int64)
+        if doc_ids.size == 0:
+            return overlap
+
+        term_ids, _ = self._term_ids(query_tokens)
+
+        for segment in self._segments:
+            rows, found = segment.rows_of(doc_ids)
+            found &= segment.live[rows]
+            if not found.any():
+                continue
+            overlap[found] = 0
+            if term_ids.size == 0:
+                continue
+
+            doc_rows, _, _ = segment.gather(term_ids)
+            # Each term appears at most once per posting list, so counting
+            # posting hits per requested row gives the distinct-term overlap
+            wanted = rows[found]
+            order = np.argsort(wanted, kind="stable")
+            sorted_rows = wanted[order]
+            hit = np.minimum(np.searchsorted(sorted_rows, doc_rows), sorted_rows.size - 1)
+            matched = sorted_rows[hit] == doc_rows
+            counts = np.bincount(hit[matched], minlength=sorted_rows.size)
+
+            # Spread counts back to every requested position (ids may repeat)
+            overlap[found] = counts[np.searchsorted(sorted_rows, wanted)]
+
+        return overlap
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Chunk Store
+Description: Binary chunk store (offset table + UTF-8 blob + columnar metadata) opened with mmap.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+from langchain_core.documents import Document
+
+
+def _content_hash(text: str) -> int:
+    """64-bit content hash (stored as uint64)"""
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _replace_file(path: Path, write):
+    """Write a file through a temporary sibling and rename it into place"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+class ChunkStore:
+    """
+    Chunk text and metadata addressed by chunk id, used as the FAISS docstore.
+
+    On disk a store is a directory of:
+        ids.npy        int64 chunk ids, ascending
+        offsets.npy    int64 byte offsets into text.bin (len(ids) + 1)
+        text.bin       concatenated UTF-8 chunk text
+        hashes.npy     uint64 content hashes (chunk lookup by text)
+        metadata.json  {"count": n, "next_id": m, "columns": {key: [value per chunk]}}
+
+    The text blob and offset table are memory-mapped, so opening a store
+    costs no parsing of chunk text and ``Document`` objects are only
+    materialized for the chunks a query actually returns. Chunks added
+    after opening live in memory until the next ``save``; deletions are a
+    tombstone mask. Files are replaced by rename, so readers that still
+    map the previous files are unaffected by a save.
+
+    Implements the docstore interface LangChain's FAISS wrapper uses
+    (``search``, ``add``, ``delete``) with ``str(chunk_id)`` keys.
+    """
+
+    def __init__(self, directory: Optional[Path] = None):
+        self.directory = Path(directory) if directory else None
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._blob = np.zeros(0, dtype=np.uint8)
+        self._hashes = np.zeros(0, dtype=np.uint64)
+        self._hash_order = np.zeros(0, dtype=np.int64)
+        self._columns: Dict[str, list] = {}
+        self._live = np.zeros(0, dtype=bool)
+        self._next_id = 0
+        # Chunks added since the store was opened
+        self._added: Dict[int, Document] = {}
+        self._added_by_content: Dict[str, int] = {}
+
+        if self.directory is not None and (self.directory / "metadata.json").exists():
+            self._open()
+
+    @staticmethod
+    def exists(directory: Path) -> bool:
+        return (Path(directory) / "metadata.json").exists()
+
+    def _open(self):
+        """Map a persisted store (metadata.json is written last and read first)"""
+        with open(self.directory / "metadata.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        count = int(meta["count"])
+
+        self._ids = np.load(self.directory / "ids.npy")[:count]
+        self._offsets = np.load(self.directory / "offsets.npy", mmap_mode="r")
+        self._hashes = np.load(self.directory / "hashes.npy")[:count]
+        self._hash_order = np.argsort(self._hashes, kind="stable")
+        self._columns = meta["columns"]
+        self._live = np.ones(count, dtype=bool)
+        self._next_id = int(meta.get("next_id", self._ids[-1] + 1 if count else 0))
+        if self._offsets[count] > 0:
+            self._blob = np.memmap(self.directory / "text.bin", dtype=np.uint8, mode="r")
+        else:
+            self._blob = np.zeros(0, dtype=np.uint8)
+        self._added = {}
+        self._added_by_content = {}
+
+    def __len__(self) -> int:
+        return int(self._live.sum()) + len(self._added)
+
+    def copy(self) -> "ChunkStore":
+        """
+        Independent store for copy-on-write updates
+
+        The persisted arrays and mapped text are shared (nothing writes
+        them); the tombstone mask and in-memory additions are copied.
+        """
+        store = ChunkStore()
+        store.directory = self.directory
+        store._ids = self._ids
+        store._offsets = self._offsets
+        store._blob = self._blob
+        store._hashes = self._hashes
+        store._hash_order = self._hash_order
+        store._columns = self._columns
+        store._live = self._live.copy()
+        store._next_id = self._next_id
+        store._added = dict(self._added)
+        store._added_by_content = dict(self._added_by_content)
+        return store
+
+    def _row(self, chunk_id: int) -> int:
+        """Row of a live persisted chunk, or -1"""
+        if self._ids.size == 0:
+            return -1
+        row = int(np.searchsorted(self._ids, chunk_id))
+        if row < self._ids.size and self._ids[row] == chunk_id and self._live[row]:
+            return row
+        return -1
+
+    def __contains__(self, chunk_id: int) -> bool:
+        return chunk_id in self._added or self._row(chunk_id) >= 0
+
+    def ids(self) -> List[int]:
+        """All live chunk ids, ascending"""
+        persisted = self._ids[self._live].tolist()
+        return sorted(persisted + list(self._added)) if self._added else persisted
+
+    def max_id(self) -> int:
+        """Largest chunk id ever stored here, including removed ones (-1 if empty)"""
+        return max([self._next_id - 1, *self._added])
+
+    def text(self, chunk_id: int) -> Optional[str]:
+        if chunk_id in self._added:
+            return self._added[chunk_id].page_content
+        row = self._row(chunk_id)
+        if row < 0:
+            return None
+        return bytes(self._blob[self._offsets[row]:self._offsets[row + 1]]).decode("utf-8")
+
+    def metadata(self, chunk_id: int) -> Optional[Dict]:
+        if chunk_id in self._added:
+            return self._added[chunk_id].metadata
+        row = self._row(chunk_id)
+        if row < 0:
+            return None
+        return {
+            key: values[row]
+            for key, values in self._columns.items()
+            if values[row] is not None
+        }
+
+    def document(self, chunk_id: int) -> Optional[Document]:
+        """Materialize a chunk as a Document (a fresh object per call, id = str(chunk_id))"""
+        if chunk_id in self._added:
+            doc = self._added[chunk_id]
+            return Document(page_content=doc.page_content, metadata=dict(doc.metadata), id=str(chunk_id))
+        row = self._row(chunk_id)
+        if row < 0:
+            return None
+        return Document(page_content=self.text(chunk_id), metadata=self.metadata(chunk_id), id=str(chunk_id))
+
+    def chunk_id_of(self, text: str) -> int:
+        """Chunk id of a live chunk with exactly this text, or -1"""
+        chunk_id = self._added_by_content.get(text)
+        if chunk_id is not None:
+            return chunk_id
+
+        digest = np.uint64(_content_hash(text))
+        start = np.searchsorted(self._hashes, digest, side="left", sorter=self._hash_order)
+        end = np.searchsorted(self._hashes, digest, side="right", sorter=self._hash_order)
+        for row in self._hash_order[start:end].tolist():
+            if self._live[row]:
+                chunk_id = int(self._ids[row])
+                if self.text(chunk_id) == text:
+                    return chunk_id
+        return -1
+
+    def put(self, ids: Iterable[int], documents: Iterable[Document]):
+        """Add chunks (kept in memory until the next save)"""
+        for chunk_id, doc in zip(ids, documents):
+            self._added[int(chunk_id)] = doc
+            self._added_by_content[doc.page_content] = int(chunk_id)
+
+    def remove(self, ids: Iterable[int]) -> int:
+        """Tombstone chunks; returns the number removed"""
+        removed = 0
+        for chunk_id in ids:
+            doc = self._added.pop(chunk_id, None)
+            if doc is not None:
+                if self._added_by_content.get(doc.page_content) == chunk_id:
+                    del self._added_by_content[doc.page_content]
+                removed += 1
+                continue
+            row = self._row(chunk_id)
+            if row >= 0:
+                self._live[row] = False
+                removed += 1
+        return removed
+
+    # Docstore interface (keys are str(chunk_id))
+
+    def search(self, search: str) -> Union[str, Document]:
+        doc = self.document(int(search))
+        return doc if doc is not None else f"ID {search} not found."
+
+    def add(self, texts: Dict[str, Document]):
+        self.put([int(key) for key in texts], texts.values())
+
+    def delete(self, ids: List):
+        self.remove([int(key) for key in ids])
+
+    def open(self, directory: Path):
+        """Map the store persisted in a directory (drops in-memory additions and tombstones)"""
+        self.directory = Path(directory)
+        self._open()
+
+    def save(self, directory: Optional[Path] = None, reopen: bool = True):
+        """Write all live chunks and (by default) re-open the store on the written files"""
+        directory = Path(directory) if directory else self.directory
+        directory.mkdir(parents=True, exist_ok=True)
+
+        ids = self.ids()
+        next_id = self.max_id() + 1
+        texts = [self.text(chunk_id).encode("utf-8") for chunk_id in ids]
+        metadatas = [self.metadata(chunk_id) for chunk_id in ids]
+
+        offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum([len(text) for text in texts], out=offsets[1:])
+        hashes = np.fromiter(
+            (_content_hash(text.decode("utf-8")) for text in texts),
+            dtype=np.uint64,
+            count=len(texts)
+        )
+        keys = sorted({key for metadata in metadatas for key in metadata})
+        columns = {key: [metadata.get(key) for metadata in metadatas] for key in keys}
+
+        def write_blob(path: Path):
+            with open(path, "wb") as f:
+                for text in texts:
+                    f.write(text)
+
+        def write_array(array: np.ndarray):
+            def write(path: Path):
+                with open(path, "wb") as f:
+                    np.save(f, array)
+            return write
+
+        _replace_file(directory / "text.bin", write_blob)
+        _replace_file(directory / "offsets.npy", write_array(offsets))
+        _replace_file(directory / "ids.npy", write_array(np.asarray(ids, dtype=np.int64)))
+        _replace_file(directory / "hashes.npy", write_array(hashes))
+
+        def write_meta(path: Path):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"count": len(ids), "next_id": next_id, "columns": columns}, f, ensure_ascii=False)
+
+        _replace_file(directory / "metadata.json", write_meta)
+
+        if reopen:
+            self.open(directory)
@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Embedding Cache
+Description: Persistent content-addressed embedding cache (memory-mapped float32 matrix) and query embedding LRU.
+"""
+import base64
+import hashlib
+import inspect
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from core.redis_client import get_redis
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+# A size-limited cache is compacted once it holds this much more than its limit (amortizes the rewrite)
+COMPACT_AT = 1.25
+# Records copied per write while compacting
+COMPACT_CHUNK = 65536
+
+
+def _replace_file(path: Path, write):
+    """Write a file through a temporary sibling and rename it into place"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache keyed by (embedding model, SHA-256 of text).
+
+    Each model gets its own directory with a ``meta.json`` (model name,
+    dimension) and an append-only ``embeddings.bin`` of fixed-size records
+    (32-byte digest + float32 vector). The file is opened with ``np.memmap``
+    so the vectors are a float32 matrix that is paged in on demand, and the
+    digest column forms the key index. Records are appended in a single
+    write per batch under an exclusive ``flock`` on ``embeddings.lock``, so
+    a crash can at most leave a partial trailing record, which readers
+    ignore and the next writer drops; several processes (API workers,
+    Celery) can share the cache and pick up each other's appends. Without
+    fcntl (Windows) only threads of this process are excluded.
+
+    With ``max_entries``, a writer that grows the file past COMPACT_AT
+    times the limit rewrites it with the most recently added
+    ``max_entries`` keys (evicted texts are embedded again on their next
+    use). ``meta.json`` and compacted files are written to a temporary file
+    and renamed into place, so a crash never leaves them truncated; readers
+    notice the new file and re-map it.
+    """
+
+    def __init__(self, cache_dir: Path, model_name: str, max_entries: int = 0):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name).strip("_") or "default"
+        self.directory = Path(cache_dir) / slug
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.data_path = self.directory / "embeddings.bin"
+        self.meta_path = self.directory / "meta.json"
+        self.lock_path = self.directory / "embeddings.lock"
+
+        self.dimension: Optional[int] = None
+        self._dtype: Optional[np.dtype] = None
+        self._matrix: Optional[np.memmap] = None
+        self._rows: Dict[bytes, int] = {}
+        self._count = 0
+        self._inode: Optional[int] = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.compactions = 0
+
+        self._refresh()
+
+    @staticmethod
+    def key(text: str) -> bytes:
+        """Content address of a text"""
+        return hashlib.sha256(text.encode("utf-8")).digest()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _set_dimension(self, dimension: int):
+        self.dimension = dimension
+        self._dtype = np.dtype([("key", "S32"), ("vector", "<f4", (dimension,))])
+
+    def _read_meta(self):
+        """Take the dimension from meta.json, if a writer created it"""
+        if self.dimension is not None or not self.meta_path.exists():
+            return
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                self._set_dimension(int(json.load(f)["dimension"]))
+        except (ValueError, KeyError):
+            # Unreadable (written in place by an older version): the next writer replaces it
+            pass
+
+    def _write_meta(self):
+        """Create meta.json (renamed into place: readers never see it half-written)"""
+        def write(path: Path):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"model": self.model_name, "dimension": self.dimension}, f)
+
+        _replace_file(self.meta_path, write)
+
+    def _refresh(self):
+        """Map records appended since the last refresh (also by other processes)"""
+        self._read_meta()
+        if self._dtype is None:
+            return
+        try:
+            stat = os.stat(self.data_path)
+        except FileNotFoundError:
+            return
+
+        if stat.st_ino != self._inode:
+            # A new file (first open, or compacted by a writer): rows have moved
+            self._inode = stat.st_ino
+            self._rows = {}
+            self._count = 0
+            self._matrix = None
+        count = stat.st_size // self._dtype.itemsize
+        if count == self._count:
+            return
+
+        self._matrix = np.memmap(self.data_path, dtype=self._dtype, mode="r", shape=(count,))
+        keys = self._matrix["key"]
+        for row in range(self._count, count):
+            self._rows[bytes(keys[row])] = row
+        self._count = count
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Look up cached vectors; None for texts that are not cached"""
+        with self._lock:
+            keys = [self.key(text) for text in texts]
+            if any(key not in self._rows for key in keys):
+                self._refresh()
+
+            vectors: List[Optional[np.ndarray]] = []
+            for key in keys:
+                row = self._rows.get(key)
+                vectors.append(None if row is None else np.array(self._matrix["vector"][row]))
+            return vectors
+
+    def put_many(self, texts: Sequence[str], vectors: np.ndarray):
+        """Append vectors for texts"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.size == 0:
+            return
+
+        with self._lock, open(self.lock_path, "a") as lock:
+            if FCNTL_AVAILABLE:
+                # Other processes append to (or compact) the same file: one writer at a time
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+
+            self._read_meta()
+            if self.dimension is None:
+                self._set_dimension(int(vectors.shape[1]))
+                self._write_meta()
+            elif vectors.shape[1] != self.dimension:
+                raise ValueError(
+                    f"Embedding dimension {vectors.shape[1]} does not match cache dimension {self.dimension}"
+                )
+
+            records = np.zeros(len(texts), dtype=self._dtype)
+            records["key"] = [self.key(text) for text in texts]
+            records["vector"] = vectors
+
+            with open(self.data_path, "ab") as f:
+                # With the lock held no writer is mid-append, so a partial trailing record was left by a crash
+                size = os.fstat(f.fileno()).st_size
+                if size % self._dtype.itemsize:
+                    size -= size % self._dtype.itemsize
+                    f.truncate(size)
+                f.write(records.tobytes())
+                f.flush()
+
+            count = size // self._dtype.itemsize + len(records)
+            if self.max_entries and count > self.max_entries * COMPACT_AT:
+                self._compact(count)
+            self._refresh()
+
+    def _compact(self, count: int):
+        """Rewrite the file with the newest record of the max_entries most recently added keys (callers hold the flock)"""
+        records = np.memmap(self.data_path, dtype=self._dtype, mode="r", shape=(count,))
+        # Several processes may have appended the same text: keep its last record
+        _, newest = np.unique(records["key"][::-1], return_index=True)
+        rows = np.sort(count - 1 - newest)[-self.max_entries:]
+
+        def write(path: Path):
+            with open(path, "wb") as f:
+                for start in range(0, len(rows), COMPACT_CHUNK):
+                    f.write(records[rows[start:start + COMPACT_CHUNK]].tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+        _replace_file(self.data_path, write)
+        self.compactions += 1
+
+    def embed(
+        self,
+        texts: Sequence[str],
+        embed_fn: Callable[[List[str]], List[List[float]]]
+    ) -> np.ndarray:
+        """
+        Return embeddings for texts, computing only the ones not cached yet
+
+        Args:
+            texts: Texts to embed
+            embed_fn: Batch embedding function (e.g. Embeddings.embed_documents)
+        """
+        if not texts:
+            return np.zeros((0, self.dimension or 0), dtype=np.float32)
+
+        cached = self.get_many(texts)
+        missing = {}
+        for i, (text, vector) in enumerate(zip(texts, cached)):
+            if vector is None:
+                missing.setdefault(text, []).append(i)
+
+        self.hits += len(texts) - sum(len(rows) for rows in missing.values())
+        self.misses += len(missing)
+
+        if missing:
+            missing_texts = list(missing)
+            new_vectors = np.asarray(embed_fn(missing_texts), dtype=np.float32)
+            self.put_many(missing_texts, new_vectors)
+            for text, vector in zip(missing_texts, new_vectors):
+                for i in missing[text]:
+                    cached[i] = vector
+
+        return np.vstack(cached).astype(np.float32, copy=False)
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded in-process LRU cache of query embeddings (normalized text -> vector).
+
+    With ``redis_spill`` enabled, vectors are also written to Redis so other
+    workers (and this worker after an eviction) can reuse them; Redis errors
+    only degrade to a local miss.
+    """
+
+    def __init__(self, model_name: str, max_size: int = 2048, redis_spill: bool = False, redis_ttl: int = 86400):
+        self.model_name = model_name
+        self.max_size = max_size
+        self.redis_spill = redis_spill
+        self.redis_ttl = redis_ttl
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.redis_hits = 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Normalize query text so trivially different spellings share an entry"""
+        return " ".join(query.lower().split())
+
+    def _redis_key(self, normalized: str) -> str:
+        digest = hashlib.sha256(f"{self.model_name}|{normalized}".encode("utf-8")).hexdigest()
+        return f"query_embedding:{digest}"
+
+    def get(self, query: str) -> Optional[np.ndarray]:
+        """Get a cached vector from the local LRU (counts hit/miss)"""
+        normalized = self.normalize(query)
+        vector = self._entries.get(normalized)
+        if vector is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(normalized)
+        self.hits += 1
+        return vector
+
+    def put(self, query: str, vector: np.ndarray):
+        """Store a vector, evicting the least recently used entry when full"""
+        normalized = self.normalize(query)
+        self._entries[normalized] = np.asarray(vector, dtype=np.float32)
+        self._entries.move_to_end(normalized)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def get_or_embed(self, query: str, embed_fn: Callable[[str], List[float]]) -> np.ndarray:
+        """Return the query vector from the LRU, Redis, or by embedding it (embed_fn may be async)"""
+        vector = self.get(query)
+        if vector is not None:
+            return vector
+
+        normalized = self.normalize(query)
+        if self.redis_spill:
+            try:
+                redis = await get_redis()
+                cached = await redis.get(self._redis_key(normalized))
+                if cached:
+                    vector = np.frombuffer(base64.b64decode(cached), dtype=np.float32)
+                    self.redis_hits += 1
+                    self.put(query, vector)
+                    return vector
+            except Exception:
+                pass
+
+        vector = embed_fn(query)
+        if inspect.isawaitable(vector):
+            vector = await vector
+        vector = np.asarray(vector, dtype=np.float32)
+        self.put(query, vector)
+
+        if self.redis_spill:
+            try:
+                redis = await get_redis()
+                await redis.setex(
+                    self._redis_key(normalized),
+                    self.redis_ttl,
+                    base64.b64encode(vector.tobytes()).decode("ascii")
+                )
+            except Exception:
+                pass
+
+        return vector
+
+    def stats(self) -> Dict[str, float]:
+        """Cache counters"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "redis_hits": self.redis_hits,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
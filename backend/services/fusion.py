@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Fusion
+Description: Hybrid rank fusion strategies (reciprocal rank, min-max weighted scores) over chunk id rankings.
+"""
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+# A ranking: chunk ids ordered best first, with their scores (higher = better)
+Ranking = Tuple[np.ndarray, np.ndarray]
+
+
+def _ranked(scores: Dict[int, float]) -> Ranking:
+    """Fused scores as a ranking (ties keep first-seen order)"""
+    ids = np.fromiter(scores.keys(), dtype=np.int64, count=len(scores))
+    values = np.fromiter(scores.values(), dtype=np.float64, count=len(scores))
+    order = np.argsort(-values, kind="stable")
+    return ids[order], values[order]
+
+
+class FusionStrategy(ABC):
+    """
+    Combines dense and sparse rankings into one candidate ranking.
+
+    Rankings are merged in a dict keyed by chunk id, so a chunk found by
+    both retrievers is combined in O(1) instead of rescanning the list.
+    """
+
+    name = ""
+
+    def __init__(self, weights: Optional[Sequence[float]] = None):
+        self.weights = weights
+
+    def _weight(self, position: int) -> float:
+        """Weight of the ranking at a position; weights repeat, e.g. per (dense, sparse) pair of several queries"""
+        return 1.0 if self.weights is None else float(self.weights[position % len(self.weights)])
+
+    @abstractmethod
+    def fuse(self, rankings: Sequence[Ranking]) -> Ranking:
+        """Merge rankings (in weight order) into one ranking, best first"""
+
+
+class ReciprocalRankFusion(FusionStrategy):
+    """score(chunk) = sum of weight / (k + rank); uses ranks only, so score scales do not matter"""
+
+    name = "rrf"
+
+    def __init__(self, k: int = 60, weights: Optional[Sequence[float]] = None):
+        super().__init__(weights)
+        self.k = k
+
+    def fuse(self, rankings: Sequence[Ranking]) -> Ranking:
+        fused: Dict[int, float] = {}
+        for position, (ids, _) in enumerate(rankings):
+            weight = self._weight(position)
+            for rank, chunk_id in enumerate(ids.tolist(), start=1):
+                fused[chunk_id] = fused.get(chunk_id, 0.0) + weight / (self.k + rank)
+        return _ranked(fused)
+
+
+class WeightedScoreFusion(FusionStrategy):
+    """score(chunk) = sum of weight * min-max normalized score (0 where a retriever missed it)"""
+
+    name = "weighted"
+
+    def fuse(self, rankings: Sequence[Ranking]) -> Ranking:
+        fused: Dict[int, float] = {}
+        for position, (ids, scores) in enumerate(rankings):
+            if len(ids) == 0:
+                continue
+            weight = self._weight(position)
+            scores = np.asarray(scores, dtype=np.float64)
+            low, high = scores.min(), scores.max()
+            normalized = (scores - low) / (high - low) if high > low else np.ones_like(scores)
+            for chunk_id, score in zip(ids.tolist(), normalized.tolist()):
+                fused[chunk_id] = fused.get(chunk_id, 0.0) + weight * score
+        return _ranked(fused)
+
+
+def create_fusion(name: str, dense_weight: float = 0.7, rrf_k: int = 60) -> FusionStrategy:
+    """Fusion strategy for (dense, sparse) rankings by name"""
+    weights = (dense_weight, 1.0 - dense_weight)
+    if name == ReciprocalRankFusion.name:
+        return ReciprocalRankFusion(k=rrf_k, weights=weights)
+    if name == WeightedScoreFusion.name:
+        return WeightedScoreFusion(weights=weights)
+    raise ValueError(f"Unknown fusion strategy: {name}")
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Index Snapshots
+Description: Versioned, checksummed index snapshot directories published atomically through a CURRENT pointer.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+MANIFEST_NAME = "manifest.json"
+POINTER_NAME = "CURRENT"
+LOCK_NAME = "index.lock"
+STAGING_PREFIX = ".staging-"
+# Staging directories left behind by a crashed writer are removed after this long
+STALE_STAGING_SECONDS = 3600
+
+
+def _file_checksum(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class SnapshotStore:
+    """
+    Versioned snapshots of the main index under one directory.
+
+    Layout:
+        snapshots/v000001/   index.faiss, chunks/, bm25/, manifest.json
+        snapshots/v000002/   ...
+        CURRENT              name of the live snapshot
+        wal/v000002.log      mutations applied on top of a snapshot
+        index.lock           held by whichever process writes snapshots or logs
+
+    A snapshot is written into a staging directory, checksummed into its
+    manifest, renamed to its version directory, and only then published
+    by atomically replacing CURRENT. A crash at any point leaves the
+    previous snapshot live, and no reader ever opens a partially written
+    one. Versions beyond ``keep`` are pruned; on POSIX, processes that
+    still map their files keep reading them until they swap.
+    """
+
+    def __init__(self, root: Path, keep: int = 3):
+        self.root = Path(root)
+        self.snapshot_dir = self.root / "snapshots"
+        self.keep = max(1, keep)
+        self._thread_lock = threading.RLock()
+        self._lock_file = None
+        self._lock_depth = 0
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        """
+        Exclusive lock over snapshots and logs, shared by every process using this directory
+
+        Re-entrant within a thread. Without fcntl (Windows) only threads of
+        this process are excluded.
+        """
+        with self._thread_lock:
+            if self._lock_depth == 0 and FCNTL_AVAILABLE:
+                self.root.mkdir(parents=True, exist_ok=True)
+                self._lock_file = open(self.root / LOCK_NAME, "a+b")
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0 and self._lock_file is not None:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+                    self._lock_file.close()
+                    self._lock_file = None
+
+    def path(self, version: str) -> Path:
+        return self.snapshot_dir / version
+
+    def wal_path(self, version: str) -> Path:
+        """Write-ahead log of the mutations made on top of a snapshot"""
+        return self.root / "wal" / f"{version}.log"
+
+    def versions(self) -> List[str]:
+        """Promoted snapshot versions, oldest first"""
+        if not self.snapshot_dir.exists():
+            return []
+        return sorted(
+            entry.name for entry in self.snapshot_dir.iterdir()
+            if entry.is_dir() and entry.name.startswith("v") and entry.name[1:].isdigit()
+        )
+
+    def current_version(self) -> Optional[str]:
+        """Version named by CURRENT, if it exists"""
+        try:
+            version = (self.root / POINTER_NAME).read_text(encoding="utf-8").strip()
+        except FileNotFoundError:
+            return None
+        return version if (self.path(version) / MANIFEST_NAME).exists() else None
+
+    def manifest(self, version: str) -> Dict:
+        with open(self.path(version) / MANIFEST_NAME, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def verify(self, version: str) -> bool:
+        """Whether every file of a snapshot matches its manifest checksum"""
+        try:
+            files = self.manifest(version)["files"]
+            return all(
+                _file_checksum(self.path(version) / relative) == checksum
+                for relative, checksum in files.items()
+            )
+        except (OSError, ValueError, KeyError):
+            return False
+
+    def latest_valid(self, verify: bool = True) -> Optional[str]:
+        """CURRENT, or the newest other snapshot if CURRENT is missing or fails verification"""
+        current = self.current_version()
+        candidates = ([current] if current else []) + [v for v in reversed(self.versions()) if v != current]
+        for version in candidates:
+            if not (self.path(version) / MANIFEST_NAME).exists():
+                continue
+            if not verify or self.verify(version):
+                return version
+        return None
+
+    def stage(self) -> Path:
+        """Create an empty staging directory for the next snapshot"""
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        staging = self.snapshot_dir / f"{STAGING_PREFIX}{os.getpid()}-{time.time_ns()}"
+        staging.mkdir()
+        return staging
+
+    def commit(self, staging: Path, info: Dict) -> str:
+        """Checksum, version and publish a staged snapshot; returns its version"""
+        files = {
+            entry.relative_to(staging).as_posix(): _file_checksum(entry)
+            for entry in sorted(staging.rglob("*"))
+            if entry.is_file()
+        }
+        with self.lock():
+            return self._promote(staging, info, files)
+
+    def _promote(self, staging: Path, info: Dict, files: Dict[str, str]) -> str:
+        """Rename a staged snapshot to the next version and point CURRENT at it"""
+        versions = self.versions()
+        number = int(versions[-1][1:]) + 1 if versions else 1
+
+        while True:
+            version = f"v{number:06d}"
+            manifest = {"version": version, "created_at": time.time(), **info, "files": files}
+            with open(staging / MANIFEST_NAME, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+            try:
+                # Fails if another writer took this version number first
+                os.rename(staging, self.path(version))
+                break
+            except OSError:
+                if not self.path(version).exists():
+                    raise
+                number += 1
+
+        # A log can only belong to this version once it exists; anything there is left from a deleted history
+        self.wal_path(version).unlink(missing_ok=True)
+
+        pointer = self.root / POINTER_NAME
+        tmp_pointer = pointer.with_name(POINTER_NAME + ".tmp")
+        tmp_pointer.write_text(version, encoding="utf-8")
+        os.replace(tmp_pointer, pointer)
+
+        self.prune()
+        return version
+
+    def discard(self, staging: Path):
+        """Remove a staging directory after a failed write"""
+        shutil.rmtree(staging, ignore_errors=True)
+
+    def prune(self):
+        """Delete all but the newest ``keep`` versions (never CURRENT), their logs and stale staging directories"""
+        current = self.current_version()
+        for version in self.versions()[:-self.keep]:
+            if version != current:
+                shutil.rmtree(self.path(version), ignore_errors=True)
+                self.wal_path(version).unlink(missing_ok=True)
+
+        now = time.time()
+        for entry in self.snapshot_dir.glob(f"{STAGING_PREFIX}*"):
+            try:
+                if now - entry.stat().st_mtime > STALE_STAGING_SECONDS:
+                    shutil.rmtree(entry, ignore_errors=True)
+            except OSError:
+                pass
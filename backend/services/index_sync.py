@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Index Sync
+Description: Cross-process index change propagation (Redis version counter and pub/sub, bounded-staleness polling).
+"""
+import asyncio
+import json
+import os
+import socket
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from core.logger import APILogger, ErrorCategory
+from core.redis_client import get_redis
+
+VERSION_KEY = "index:version"
+
+# Advance the counter to a version only if it is newer (notifications may arrive out of order)
+_ADVANCE_VERSION = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local version = tonumber(ARGV[1])
+if version > current then
+    redis.call('SET', KEYS[1], ARGV[1])
+    return version
+end
+return current
+"""
+
+
+class IndexSync:
+    """
+    Keeps one process's copy of the main index in step with the others.
+
+    Every API worker and Celery worker holds its own index, and all of
+    them share one on-disk snapshot directory and write-ahead log. After
+    a local mutation, ``notify`` advances the cluster-wide version counter
+    in Redis and publishes the new version; the other workers' listeners
+    then call ``on_change``, which replays the new log records (or
+    hot-reloads a newer snapshot). Notifications only make changes visible
+    sooner: ``on_change`` also runs every ``max_staleness`` seconds, so a
+    worker is never further behind than that, even if Redis is down or a
+    message is lost.
+    """
+
+    def __init__(
+        self,
+        on_change: Callable[[], Awaitable[bool]],
+        local_version: Callable[[], int],
+        channel: str = "index:changes",
+        max_staleness: float = 2.0
+    ):
+        self.on_change = on_change
+        self.local_version = local_version
+        self.channel = channel
+        self.max_staleness = max_staleness
+        self.origin = f"{socket.gethostname()}:{os.getpid()}"
+        self.cluster_version: Optional[int] = None
+        self.subscribed = False
+        self.notifications = 0
+        self.syncs = 0
+        self.last_checked: Optional[float] = None
+        self._changed: Optional[asyncio.Event] = None
+        self._tasks = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self):
+        """Start listening for notifications and polling (on the running event loop)"""
+        if self._tasks:
+            return
+        self._changed = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._listen()), loop.create_task(self._sync_loop())]
+
+    async def stop(self):
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.subscribed = False
+
+    async def notify(self, version: int):
+        """Advance the cluster version to a local mutation's version and tell the other workers"""
+        try:
+            redis = await get_redis()
+            self.cluster_version = int(await redis.eval(_ADVANCE_VERSION, 1, VERSION_KEY, version))
+            await redis.publish(self.channel, json.dumps({"version": version, "origin": self.origin}))
+        except Exception:
+            # Other workers still pick the change up within max_staleness
+            pass
+
+    async def fetch_cluster_version(self) -> Optional[int]:
+        """Latest version announced by any process (None if Redis is unavailable)"""
+        try:
+            redis = await get_redis()
+            value = await redis.get(VERSION_KEY)
+            self.cluster_version = int(value) if value is not None else 0
+        except Exception:
+            pass
+        return self.cluster_version
+
+    async def _listen(self):
+        """Wake the sync loop for every newer version published by another process"""
+        delay = 1.0
+        while True:
+            pubsub = None
+            try:
+                redis = await get_redis()
+                pubsub = redis.pubsub()
+                await pubsub.subscribe(self.channel)
+                self.subscribed = True
+                delay = 1.0
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    try:
+                        change = json.loads(message["data"])
+                    except (TypeError, ValueError):
+                        continue
+                    version = int(change.get("version") or 0)
+                    self.cluster_version = max(self.cluster_version or 0, version)
+                    # A process's own mutations are already applied, so their versions are never newer
+                    if version > self.local_version():
+                        self.notifications += 1
+                        self._changed.set()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Polling keeps staleness bounded until Redis is back
+                pass
+            finally:
+                self.subscribed = False
+                if pubsub is not None:
+                    try:
+                        await pubsub.close()
+                    except Exception:
+                        pass
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+    async def _sync_loop(self):
+        """Apply changes on notification, and at least every max_staleness seconds"""
+        while True:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=self.max_staleness)
+            except asyncio.TimeoutError:
+                pass
+            self._changed.clear()
+            try:
+                if await self.on_change():
+                    self.syncs += 1
+                self.last_checked = time.time()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                APILogger.log_error("/rag/sync", e, None, ErrorCategory.AI_ERROR)
+
+    def stats(self) -> Dict:
+        """Sync state of this process"""
+        return {
+            "worker": self.origin,
+            "running": self.running,
+            "subscribed": self.subscribed,
+            "cluster_version": self.cluster_version,
+            "notifications": self.notifications,
+            "syncs": self.syncs,
+            "max_staleness_seconds": self.max_staleness,
+            "seconds_since_check": time.time() - self.last_checked if self.last_checked else None
+        }
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Index WAL
+Description: Append-only write-ahead log of main-index mutations (added chunks with vectors, removed chunk ids).
+"""
+import json
+import os
+import struct
+import zlib
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+# Record header: magic, payload length, CRC32 of the payload
+_HEADER = struct.Struct("<4sII")
+_MAGIC = b"CWAL"
+# Payload prefix: length of the JSON part; float32 vectors (row-major) follow it
+_JSON_LENGTH = struct.Struct("<I")
+
+
+class IndexWAL:
+    """
+    Write-ahead log of the mutations applied since a snapshot.
+
+    Each record is one ``add`` (chunk ids, their float32 vectors, text and
+    metadata) or ``remove`` (chunk ids) written with a single append, so
+    an upload costs I/O proportional to its own chunks, not to the corpus.
+    Several processes may append to one log (under the snapshot store's
+    lock); replay continues after the last record read or written, so it
+    picks up exactly the records of the other processes. A torn or corrupt
+    tail (crash mid-append) ends replay and is cut off before the next
+    append.
+    """
+
+    def __init__(self, path: Path, fsync: bool = True):
+        self.path = Path(path)
+        self.fsync = fsync
+        self.records = 0
+        # End of the last complete record read or written
+        self.offset = 0
+        self._file = None
+
+    def __len__(self) -> int:
+        return self.records
+
+    @property
+    def size_bytes(self) -> int:
+        return self.path.stat().st_size if self.path.exists() else 0
+
+    def pending(self) -> bool:
+        """Whether the file holds bytes past the last record read or written (e.g. another process appended)"""
+        return self.size_bytes > self.offset
+
+    def replay(self) -> Iterator[Dict]:
+        """Yield the mutations logged after the last record read or written, stopping at the first incomplete one"""
+        if not self.path.exists():
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read()
+
+        offset = 0
+        while offset + _HEADER.size <= len(data):
+            magic, length, checksum = _HEADER.unpack_from(data, offset)
+            start = offset + _HEADER.size
+            payload = data[start:start + length]
+            if magic != _MAGIC or len(payload) != length or zlib.crc32(payload) != checksum:
+                break
+            offset = start + length
+            self.offset += _HEADER.size + length
+            self.records += 1
+            yield self._decode(payload)
+
+    def append_add(self, ids: Sequence[int], vectors, documents: List[Document], version: Optional[int] = None):
+        """Log chunks added to the index (version: number of this mutation across processes)"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self._append({
+            "op": "add",
+            "version": version,
+            "ids": [int(chunk_id) for chunk_id in ids],
+            "dimension": int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+            "documents": [{"text": doc.page_content, "metadata": doc.metadata} for doc in documents]
+        }, vectors.tobytes())
+
+    def append_remove(self, ids: Sequence[int], document_id: Optional[int] = None, version: Optional[int] = None):
+        """Log chunks removed from the index"""
+        self._append({
+            "op": "remove",
+            "version": version,
+            "ids": [int(chunk_id) for chunk_id in ids],
+            "document_id": document_id
+        })
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def delete(self):
+        """Close and remove the log (its mutations are in a snapshot now)"""
+        self.close()
+        self.path.unlink(missing_ok=True)
+        self.records = 0
+        self.offset = 0
+
+    def _append(self, header: Dict, blob: bytes = b""):
+        """Append one record; callers have replayed the log up to its end first"""
+        encoded = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        payload = _JSON_LENGTH.pack(len(encoded)) + encoded + blob
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "ab")
+        if os.fstat(self._file.fileno()).st_size > self.offset:
+            # Drop a torn tail so this record follows the last complete one
+            os.ftruncate(self._file.fileno(), self.offset)
+        record = _HEADER.pack(_MAGIC, len(payload), zlib.crc32(payload)) + payload
+        self._file.write(record)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.offset += len(record)
+        self.records += 1
+
+    @staticmethod
+    def _decode(payload: bytes) -> Dict:
+        (length,) = _JSON_LENGTH.unpack_from(payload)
+        record = json.loads(payload[_JSON_LENGTH.size:_JSON_LENGTH.size + length].decode("utf-8"))
+        if record["op"] == "add":
+            vectors = np.frombuffer(payload, dtype=np.float32, offset=_JSON_LENGTH.size + length)
+            record["vectors"] = vectors.reshape(len(record["ids"]), record["dimension"])
+            record["documents"] = [
+                Document(page_content=doc["text"], metadata=doc["metadata"]) for doc in record["documents"]
+            ]
+        return record
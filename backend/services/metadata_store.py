@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Metadata Store
+Description: Columnar chunk metadata (doc_type, department, uploader) for pre-filtered retrieval.
+"""
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+
+@dataclass
+class MetadataFilter:
+    """
+    Structured retrieval filter, evaluated before scoring
+
+    Attributes:
+        doc_types: Allowed doc_type values (None = any)
+        departments: Allowed department values (None = any)
+        uploaded_by: Allowed uploader user ids (None = no ACL)
+        include_unowned: With an ACL, also allow chunks without an uploader (system data)
+    """
+    doc_types: Optional[Set[str]] = None
+    departments: Optional[Set[str]] = None
+    uploaded_by: Optional[Set[int]] = None
+    include_unowned: bool = True
+
+    @property
+    def is_empty(self) -> bool:
+        return self.doc_types is None and self.departments is None and self.uploaded_by is None
+
+
+class _CodedColumn:
+    """Dictionary-encoded column: value -> small integer code (0 = missing)"""
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values = np.zeros(0, dtype=np.int32)
+
+    def copy(self) -> "_CodedColumn":
+        column = _CodedColumn()
+        column.codes = dict(self.codes)
+        column.values = self.values.copy()
+        return column
+
+    def encode(self, value) -> int:
+        if value is None or value == "":
+            return 0
+        return self.codes.setdefault(str(value), len(self.codes) + 1)
+
+    def code(self, value) -> int:
+        """Code of a value without adding it (0 = missing, -1 = never seen)"""
+        if value is None or value == "":
+            return 0
+        return self.codes.get(str(value), -1)
+
+    def mask(self, allowed: Iterable) -> np.ndarray:
+        wanted = [self.codes[str(v)] for v in allowed if str(v) in self.codes]
+        return np.isin(self.values, np.asarray(wanted, dtype=np.int32))
+
+
+class MetadataStore:
+    """
+    Columnar metadata indexed directly by chunk id.
+
+    Chunk ids are dense and monotonically increasing, so each column is a
+    NumPy array where position = chunk id; filters become vectorized masks
+    that FAISS (ID selector bitmap) and BM25 (masked scoring) consume.
+    """
+
+    def __init__(self):
+        self.live = np.zeros(0, dtype=bool)
+        self.doc_type = _CodedColumn()
+        self.department = _CodedColumn()
+        self.uploaded_by = np.zeros(0, dtype=np.int64)  # -1 = no uploader
+
+    def __len__(self) -> int:
+        return int(self.live.sum())
+
+    def copy(self) -> "MetadataStore":
+        """Independent copy (for copy-on-write updates)"""
+        store = MetadataStore()
+        store.live = self.live.copy()
+        store.doc_type = self.doc_type.copy()
+        store.department = self.department.copy()
+        store.uploaded_by = self.uploaded_by.copy()
+        return store
+
+    def _grow(self, size: int):
+        """Grow all columns to hold chunk ids < size"""
+        current = self.live.size
+        if size <= current:
+            return
+        capacity = max(size, current * 2, 1024)
+        extra = capacity - current
+        self.live = np.concatenate([self.live, np.zeros(extra, dtype=bool)])
+        self.doc_type.values = np.concatenate([self.doc_type.values, np.zeros(extra, dtype=np.int32)])
+        self.department.values = np.concatenate([self.department.values, np.zeros(extra, dtype=np.int32)])
+        self.uploaded_by = np.concatenate([self.uploaded_by, np.full(extra, -1, dtype=np.int64)])
+
+    def add(self, ids: List[int], metadatas: List[Dict]):
+        """Record metadata of new chunks"""
+        if not ids:
+            return
+        self._grow(max(ids) + 1)
+        for chunk_id, metadata in zip(ids, metadatas):
+            self.live[chunk_id] = True
+            self.doc_type.values[chunk_id] = self.doc_type.encode(metadata.get("doc_type"))
+            self.department.values[chunk_id] = self.department.encode(metadata.get("department"))
+            uploader = metadata.get("uploaded_by")
+            self.uploaded_by[chunk_id] = -1 if uploader is None else int(uploader)
+
+    def remove(self, ids: List[int]):
+        """Mark chunks as deleted"""
+        ids = [chunk_id for chunk_id in ids if chunk_id < self.live.size]
+        self.live[ids] = False
+
+    def same_scope(self, chunk_id: int, metadata: Dict) -> bool:
+        """Whether a chunk is live with this doc_type, department and uploader (visible to exactly the same users)"""
+        if chunk_id >= self.live.size or not self.live[chunk_id]:
+            return False
+        uploader = metadata.get("uploaded_by")
+        return (
+            self.doc_type.values[chunk_id] == self.doc_type.code(metadata.get("doc_type"))
+            and self.department.values[chunk_id] == self.department.code(metadata.get("department"))
+            and self.uploaded_by[chunk_id] == (-1 if uploader is None else int(uploader))
+        )
+
+    def mask(self, metadata_filter: MetadataFilter) -> np.ndarray:
+        """Boolean mask over chunk ids of live chunks matching the filter"""
+        mask = self.live.copy()
+        if metadata_filter.doc_types is not None:
+            mask &= self.doc_type.mask(metadata_filter.doc_types)
+        if metadata_filter.departments is not None:
+            mask &= self.department.mask(metadata_filter.departments)
+        if metadata_filter.uploaded_by is not None:
+            acl = np.isin(self.uploaded_by, np.asarray(list(metadata_filter.uploaded_by), dtype=np.int64))
+            if metadata_filter.include_unowned:
+                acl |= self.uploaded_by == -1
+            mask &= acl
+        return mask
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Near Duplicates
+Description: Compact b-bit MinHash signatures of chunks and vectorized Jaccard estimation and banded LSH candidate lookup for near-duplicate detection.
+"""
+import threading
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+# Hash functions per signature; each keeps the low 8 bits of its minimum (one byte)
+NUM_HASHES = 64
+# LSH bands of ROWS bytes each: pairs at similarity 0.8 share a band with probability > 0.99
+BANDS = 16
+ROWS = NUM_HASHES // BANDS
+# Chunks with fewer word bigrams than this get no signature (too few shingles to estimate overlap)
+MIN_SHINGLES = 8
+
+_SEEDS = np.random.default_rng(0x5EED).integers(0, 2 ** 63, size=NUM_HASHES, dtype=np.uint64)
+# Probability that two unrelated minima agree in their low 8 bits
+_COLLISION = 1.0 / 256
+
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer: spreads every input bit over all 64 output bits"""
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def minhash(term_ids: np.ndarray) -> Optional[str]:
+    """
+    b-bit MinHash signature of a chunk's word bigrams, hex encoded (None if too short)
+
+    Two signatures agree in a position with probability close to the
+    Jaccard similarity of the chunks' bigram sets, so revised passages
+    (a few words changed) stay close while unrelated chunks do not.
+    """
+    term_ids = np.asarray(term_ids, dtype=np.uint64)
+    if term_ids.size <= MIN_SHINGLES:
+        return None
+
+    with np.errstate(over="ignore"):
+        shingles = np.unique(_mix(_mix(term_ids[:-1]) ^ term_ids[1:]))
+        minima = _mix(shingles[:, None] ^ _SEEDS).min(axis=0)
+    return (minima & np.uint64(0xFF)).astype(np.uint8).tobytes().hex()
+
+
+def decode(signatures: List[str]) -> np.ndarray:
+    """Hex signatures as a (n, NUM_HASHES) uint8 matrix"""
+    if not signatures:
+        return np.zeros((0, NUM_HASHES), dtype=np.uint8)
+    return np.frombuffer(bytes.fromhex("".join(signatures)), dtype=np.uint8).reshape(-1, NUM_HASHES)
+
+
+def similarities(signatures: np.ndarray, signature: np.ndarray) -> np.ndarray:
+    """Estimated Jaccard similarity between one signature and each row of a signature matrix"""
+    agreement = (signatures == signature).mean(axis=1)
+    return np.clip((agreement - _COLLISION) / (1.0 - _COLLISION), 0.0, 1.0)
+
+
+def most_similar(signatures: np.ndarray, signature: np.ndarray, threshold: float) -> Optional[Tuple[int, float]]:
+    """Row and estimated similarity of the most similar signature at or above threshold, if any"""
+    if signatures.shape[0] == 0:
+        return None
+    estimates = similarities(signatures, signature)
+    row = int(np.argmax(estimates))
+    if estimates[row] < threshold:
+        return None
+    return row, round(float(estimates[row]), 3)
+
+
+class MinHashLSH:
+    """
+    Banded LSH over signatures: a signature is only compared with keys
+    that agree with it in every byte of at least one band.
+
+    New rows go to a tail that is scanned directly; once it grows they are
+    merged into per-band sorted arrays that are binary searched, so a
+    lookup never scans the whole index and a key costs ~200 bytes.
+    Entries are never removed (a key added twice is reported once);
+    callers reject candidates that were deleted since.
+    """
+
+    def __init__(self):
+        self._keys = np.zeros(0, dtype=np.int64)
+        self._signatures = np.zeros((0, NUM_HASHES), dtype=np.uint8)
+        self._size = 0
+        # Rows [0, _sorted) are in the per-band sorted arrays, the rest is the tail
+        self._sorted = 0
+        self._order = np.zeros((BANDS, 0), dtype=np.int32)
+        self._values = np.zeros((BANDS, 0), dtype=np.uint32)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def keys(self) -> np.ndarray:
+        """Keys added so far"""
+        with self._lock:
+            return self._keys[:self._size].copy()
+
+    def add(self, keys: List[int], signatures: List[str]):
+        """Index hex signatures under integer keys (chunk ids, upload positions)"""
+        if not keys:
+            return
+        rows = decode(signatures)
+        with self._lock:
+            end = self._size + len(keys)
+            if end > self._keys.size:
+                capacity = max(end, 2 * self._keys.size, 1024)
+                keys_buffer = np.zeros(capacity, dtype=np.int64)
+                keys_buffer[:self._size] = self._keys[:self._size]
+                signatures_buffer = np.zeros((capacity, NUM_HASHES), dtype=np.uint8)
+                signatures_buffer[:self._size] = self._signatures[:self._size]
+                self._keys, self._signatures = keys_buffer, signatures_buffer
+            self._keys[self._size:end] = keys
+            self._signatures[self._size:end] = rows
+            self._size = end
+            if self._size - self._sorted > max(1024, self._sorted // 8):
+                self._sort()
+
+    def _sort(self):
+        """Merge the tail into the per-band sorted arrays (callers hold the lock)"""
+        bands = self._signatures[:self._size].view(np.uint32)
+        order = np.argsort(bands, axis=0, kind="stable")
+        self._values = np.take_along_axis(bands, order, axis=0).T.copy()
+        self._order = order.T.astype(np.int32)
+        self._sorted = self._size
+
+    def _candidate_rows(self, signature: np.ndarray) -> np.ndarray:
+        """Rows sharing at least one band with a decoded signature (callers hold the lock)"""
+        query = signature.view(np.uint32)
+        rows = []
+        for band in range(BANDS):
+            low = np.searchsorted(self._values[band], query[band], side="left")
+            high = np.searchsorted(self._values[band], query[band], side="right")
+            rows.append(self._order[band, low:high].astype(np.int64))
+        tail = self._signatures[self._sorted:self._size].view(np.uint32)
+        rows.append(np.flatnonzero((tail == query).any(axis=1)) + self._sorted)
+        return np.unique(np.concatenate(rows))
+
+    def most_similar(
+        self,
+        signature: str,
+        threshold: float,
+        accept: Optional[Callable[[int], bool]] = None
+    ) -> Optional[Tuple[int, float]]:
+        """Key and estimated similarity of the most similar accepted candidate at or above threshold, if any"""
+        decoded = decode([signature])[0]
+        with self._lock:
+            rows = self._candidate_rows(decoded)
+            keys, first = np.unique(self._keys[rows], return_index=True)
+            rows = rows[first]
+            signatures = self._signatures[rows]
+        if accept is not None:
+            accepted = np.asarray([accept(int(key)) for key in keys], dtype=bool)
+            keys, signatures = keys[accepted], signatures[accepted]
+        match = most_similar(signatures, decoded, threshold)
+        if match is None:
+            return None
+        return int(keys[match[0]]), match[1]
@@ -3,62 +3,253 @@
 Module: RAG Service
 Description: Persistent FAISS index with hybrid retrieval, Self-RAG, and per-department indexes.
 """
+import asyncio
 import json
+import os
 import re
-from typing import List, Dict, Optional, Tuple, Set
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from typing import List, Dict, Optional, Sequence, Tuple, Set
 from pathlib import Path
 import tiktoken
 
 # LangChain imports
 LANGCHAIN_AVAILABLE = False
 try:
+    import faiss
     from langchain_community.vectorstores import FAISS
+    from langchain_community.docstore.in_memory import InMemoryDocstore
     from langchain_core.documents import Document
     from langchain_openai import OpenAIEmbeddings
     from langchain_community.embeddings import SentenceTransformerEmbeddings
+    from services.vector_index import (
+        compression_of, create_index, exact_subset_search, index_type_of, is_compressed,
+        is_id_addressable, measure_recall, memory_bytes, rescore, search_parameters,
+        supports_removal
+    )
+    from services.chunk_store import ChunkStore
     LANGCHAIN_AVAILABLE = True
 except ImportError:
     pass
 
-# BM25 imports
+# BM25 imports (vectorized sparse index, requires numpy/scipy)
 try:
-    from rank_bm25 import BM25Okapi
+    import numpy as np
+    from services.bm25_index import BM25Index
+    from services.near_duplicates import MinHashLSH, minhash
+    from services.token_cache import TokenCache
     BM25_AVAILABLE = True
 except ImportError:
     BM25_AVAILABLE = False
 
+# Persistent embedding cache and query embedding LRU (requires numpy)
+try:
+    from services.embedding_cache import EmbeddingCache, QueryEmbeddingCache
+    EMBEDDING_CACHE_AVAILABLE = True
+except ImportError:
+    EMBEDDING_CACHE_AVAILABLE = False
+
 # Cross-encoder re-ranking (optional)
 try:
     from sentence_transformers import CrossEncoder
+    from services.reranker import CrossEncoderReranker
     CROSS_ENCODER_AVAILABLE = True
 except ImportError:
     CROSS_ENCODER_AVAILABLE = False
 
 from core.config import get_settings
-from core.logger import APILogger
+from core.logger import APILogger, ErrorCategory
+from services.fusion import create_fusion
+from services.index_snapshot import MANIFEST_NAME, SnapshotStore
+from services.index_sync import IndexSync
+from services.index_wal import IndexWAL
+from services.metadata_store import MetadataFilter, MetadataStore
+from services.retrieval_executor import MicroBatcher, retrieval_executor
+from services.text_analyzer import create_analyzer
 
 settings = get_settings()
 
+# Bundled company data (JSON) indexed by a full rebuild
+DATA_DIR = Path(__file__).parent.parent / "data"
+
 # FAISS storage path
-VECTORSTORE_DIR = Path(__file__).parent.parent / "data" / "vectorstore"
+VECTORSTORE_DIR = DATA_DIR / "vectorstore"
 VECTORSTORE_DIR.mkdir(parents=True, exist_ok=True)
 VECTORSTORE_PATH = VECTORSTORE_DIR / "faiss_index"
+EMBEDDING_CACHE_DIR = VECTORSTORE_DIR / "embedding_cache"
+TOKEN_CACHE_DIR = VECTORSTORE_DIR / "token_cache"
+DEPARTMENT_INDEX_DIR = VECTORSTORE_DIR / "departments"
+
+# Filtered ANN searches over at most this many allowed chunks are scanned exactly
+EXACT_FILTERED_SEARCH_MAX = 2048
+
+# Model whose tokenizer counts context tokens (counts are stored per chunk at index time)
+CONTEXT_TOKEN_MODEL = "gpt-3.5-turbo"
+# A tokenizer that failed to load is not retried at index time for this long
+TOKENIZER_RETRY_SECONDS = 300
+
+
+@dataclass(eq=False)
+class IndexState:
+    """
+    One generation of the main index: everything a search reads
+    
+    A generation is never mutated once published (BM25 compaction aside,
+    which leaves results unchanged). Writers change a copy
+    (see RAGService._next_generation) and publish it with one reference
+    swap, so a search that pinned a generation sees consistent vectors,
+    chunks, BM25 postings and metadata no matter what is written meanwhile.
+    
+    The FAISS index of the last snapshot is shared by all generations and
+    never changed: vectors added since go to a small delta index, removed
+    ones are only tombstoned, and both are folded in by the next snapshot.
+    """
+    vector_store: "FAISS"
+    chunk_store: "ChunkStore"
+    bm25_index: Optional["BM25Index"]
+    metadata_store: MetadataStore
+    document_chunks: Dict[int, List[int]]
+    next_chunk_id: int
+    index_mmapped: bool
+    index_report: Optional[Dict]
+    snapshot_version: Optional[str] = None
+    # Incremented on every publish
+    generation: int = 0
+    # Number of the last mutation included, shared by all processes using the index directory
+    index_version: int = 0
+    # Vectors added since the snapshot (flat, by chunk id) and snapshot vectors removed since
+    delta_index: Optional["faiss.Index"] = None
+    tombstones: Set[int] = field(default_factory=set)
+
+
+# Shared embedding model instance
+_embeddings = None
+
+# Tokenizers by model name (loading one parses its whole BPE table)
+_encodings: Dict[str, "tiktoken.Encoding"] = {}
+
+
+def get_encoding(model: str) -> "tiktoken.Encoding":
+    """Get the tokenizer of a model (constructed once per process, cl100k_base for unknown models)"""
+    encoding = _encodings.get(model)
+    if encoding is None:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        _encodings[model] = encoding
+    return encoding
+
+
+def token_count_key(encoding_name: str) -> str:
+    """Chunk metadata key holding a chunk's context token count under one tokenizer"""
+    return f"tokens_{encoding_name}"
+
+
+def get_embeddings():
+    """Get the shared embedding model (constructed once per process)"""
+    global _embeddings
+    if _embeddings is None:
+        if settings.OPENAI_API_KEY:
+            _embeddings = OpenAIEmbeddings(openai_api_key=settings.OPENAI_API_KEY)
+        else:
+            _embeddings = SentenceTransformerEmbeddings(
+                model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+            )
+    return _embeddings
 
 
 class RAGService:
     """Advanced RAG service with persistent FAISS and hybrid retrieval"""
     
     def __init__(self):
-        self.vector_store: Optional[FAISS] = None
+        # Live generation of the main index (vectors, chunk store, BM25, metadata)
+        self._state: Optional[IndexState] = None
         self.embeddings = None
-        self.bm25_index: Optional[BM25Okapi] = None
-        self.documents: List[Document] = []
+        self.embedding_cache: Optional[EmbeddingCache] = None
+        self.query_cache: Optional[QueryEmbeddingCache] = None
+        # BM25 and lexical re-ranking share one analyzer; token streams are cached on disk
+        self.analyzer = create_analyzer(settings.BM25_ANALYZER, settings.BM25_STEMMING)
+        self.token_cache: Optional[TokenCache] = None
+        self._tokenizer_failed_at: Optional[float] = None
+        # Near-duplicate chunks skipped at ingestion (totals of this process)
+        self.dedupe_stats = {"uploads": 0, "chunks": 0, "skipped": 0}
+        # LSH buckets of the indexed chunks' signatures (kept up to date as chunks are indexed)
+        self.signature_index: Optional[MinHashLSH] = MinHashLSH() if BM25_AVAILABLE else None
+        self._signature_snapshot: Optional[str] = None
+        self._signature_lock = threading.Lock()
+        # CPU-bound stages run on the retrieval executor; searches never
+        # lock, updates are serialized and publish a new generation
+        self.executor = retrieval_executor
+        self._write_lock = asyncio.Lock()
+        # Concurrent queries share one embedding forward pass / one index.search
+        self.query_batcher = MicroBatcher(
+            "embed_query", self._embed_query_batch, self.executor,
+            settings.RETRIEVAL_BATCH_WINDOW_MS, settings.RETRIEVAL_MAX_BATCH_SIZE
+        )
+        self.search_batcher = MicroBatcher(
+            "dense", self._dense_search_grouped, self.executor,
+            settings.RETRIEVAL_BATCH_WINDOW_MS, settings.RETRIEVAL_MAX_BATCH_SIZE
+        )
+        # Dense + BM25 rank fusion (rrf or min-max weighted)
+        self.fusion = create_fusion(settings.HYBRID_FUSION, settings.HYBRID_DENSE_WEIGHT, settings.HYBRID_RRF_K)
         self.cross_encoder = None
+        # Versioned on-disk snapshots of the main index
+        self.snapshots = SnapshotStore(VECTORSTORE_PATH, keep=settings.INDEX_SNAPSHOT_KEEP)
+        # Mutations since the live snapshot; a new snapshot is written on a timer or after enough of them
+        self.wal: Optional[IndexWAL] = None
+        self._snapshot_task: Optional[asyncio.Task] = None
+        # Picks up mutations made by other workers (Redis notifications, polling as the bound)
+        self.index_sync = IndexSync(
+            self.sync,
+            lambda: self.index_version,
+            channel=settings.INDEX_SYNC_CHANNEL,
+            max_staleness=settings.INDEX_SYNC_MAX_STALENESS_SECONDS
+        )
         self._initialized = False
         
-        # Per-department indexes
-        self.department_indexes: Dict[str, FAISS] = {}
+        # Per-department indexes (persisted, loaded lazily, LRU order = least recently used first)
+        self.department_indexes: "OrderedDict[str, FAISS]" = OrderedDict()
         self.department_documents: Dict[str, List[Document]] = {}
+        self._department_last_used: Dict[str, float] = {}
+        # Department stores are replaced, not changed; this guards the registry itself
+        self._department_lock = threading.RLock()
+    
+    @property
+    def vector_store(self) -> Optional[FAISS]:
+        return self._state.vector_store if self._state else None
+    
+    @property
+    def chunk_store(self) -> Optional[ChunkStore]:
+        """Chunk text/metadata by chunk id (memory-mapped; docstore of the main index)"""
+        return self._state.chunk_store if self._state else None
+    
+    @property
+    def bm25_index(self) -> Optional[BM25Index]:
+        return self._state.bm25_index if self._state else None
+    
+    @property
+    def metadata_store(self) -> Optional[MetadataStore]:
+        """Columnar chunk metadata for filtered retrieval"""
+        return self._state.metadata_store if self._state else None
+    
+    @property
+    def index_report(self) -> Optional[Dict]:
+        """ANN index type and recall check of the last build"""
+        return self._state.index_report if self._state else None
+    
+    @property
+    def snapshot_version(self) -> Optional[str]:
+        """On-disk snapshot the live generation was loaded from or saved as"""
+        return self._state.snapshot_version if self._state else None
+    
+    @property
+    def index_version(self) -> int:
+        """Number of the last index mutation this process has applied"""
+        return self._state.index_version if self._state else 0
     
     async def initialize(self, force_rebuild: bool = False) -> bool:
         """Initialize RAG service - load or build FAISS index"""
@@ -103,63 +294,426 @@ class RAGService:
             return False
     
     async def _load_faiss_index(self):
-        """Load FAISS index from disk"""
+        """Load the current index snapshot from disk and publish it"""
         if not LANGCHAIN_AVAILABLE:
             raise ImportError("LangChain not available")
         
-        # Load embeddings
-        if settings.OPENAI_API_KEY:
-            self.embeddings = OpenAIEmbeddings(openai_api_key=settings.OPENAI_API_KEY)
+        # Load embeddings (shared instance)
+        self.embeddings = get_embeddings()
+        
+        version = self.snapshots.latest_valid(verify=settings.INDEX_SNAPSHOT_VERIFY)
+        if version is None:
+            # Layouts from before versioned snapshots are converted into the first snapshot
+            state = await self.executor.run("snapshot_load", self._migrate_unversioned_index)
         else:
-            self.embeddings = SentenceTransformerEmbeddings(
-                model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+            state = await self.executor.run("snapshot_load", self._read_snapshot, self.snapshots.path(version))
+            state.snapshot_version = version
+            self._check_snapshot_model(version)
+        
+        async with self._write_lock:
+            await self.executor.run("snapshot_install", self._install, state)
+        
+        # Initialize cross-encoder (optional)
+        self._init_cross_encoder()
+    
+    async def sync(self) -> bool:
+        """
+        Apply index changes made by other processes
+        
+        Log records appended since the last sync are replayed onto a new
+        generation; if another process promoted a newer snapshot, that
+        snapshot is hot-reloaded instead. In-flight searches finish on the
+        previous generation and later ones see the new one.
+        
+        Replayed records are snapshotted here like local mutations (once
+        INDEX_SNAPSHOT_MAX_MUTATIONS are logged, or after the interval), so
+        writers that do not stay up for the timer (Celery tasks) need not
+        snapshot themselves.
+        
+        Returns:
+            True if a new generation was published
+        """
+        if not self._initialized or self.wal is None:
+            return False
+        if self.snapshots.current_version() == self.snapshot_version and not self.wal.pending():
+            # Nothing new on disk (a cheap check, no lock)
+            return False
+        async with self._write_lock:
+            changed = await self.executor.run("index_sync", self._sync_and_snapshot)
+        self._schedule_snapshot()
+        return changed
+    
+    def _sync_and_snapshot(self) -> bool:
+        """Catch up with other processes, then snapshot if enough mutations are logged (callers hold the write lock)"""
+        changed = self._sync_locked()
+        if len(self.wal) >= settings.INDEX_SNAPSHOT_MAX_MUTATIONS:
+            with self.snapshots.lock():
+                # Another process may have snapshotted meanwhile
+                self._sync_locked()
+                self._snapshot_if_due()
+        return changed
+    
+    def _sync_locked(self) -> bool:
+        """Catch up with snapshots and log records of other processes (callers hold the write lock)"""
+        current = self.snapshots.current_version()
+        if current is not None and current != self.snapshot_version:
+            version = self.snapshots.latest_valid(verify=settings.INDEX_SNAPSHOT_VERIFY)
+            if version is not None and version != self.snapshot_version:
+                state = self._read_snapshot(self.snapshots.path(version))
+                state.snapshot_version = version
+                self._check_snapshot_model(version)
+                # Department indexes may have changed along with it
+                self._drop_department_indexes()
+                self._install(state)
+                return True
+        
+        if not self.wal.pending():
+            return False
+        state = self._replay_wal(self._state)
+        if state is self._state:
+            return False
+        self._publish(state)
+        return True
+    
+    def _check_snapshot_model(self, version: str):
+        """Log if a snapshot was embedded by a different model than the current one"""
+        built_with = self.snapshots.manifest(version).get("embedding_model")
+        if built_with and built_with != self._embedding_model_name():
+            APILogger.log_request(
+                "/rag/init",
+                "GET",
+                None,
+                None,
+                200,
+                log_message=(
+                    f"Index snapshot {version} was embedded with {built_with}, "
+                    f"current model is {self._embedding_model_name()}; rebuild the index"
+                )
             )
+    
+    def _read_snapshot(self, directory: Path) -> IndexState:
+        """Open a snapshot directory (index.faiss, chunks/, bm25/) as an unpublished generation"""
+        # Index codes and chunk text are memory-mapped, nothing is parsed per chunk
+        index = faiss.read_index(
+            str(directory / "index.faiss"),
+            faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+        )
+        chunk_store = ChunkStore(directory / "chunks")
+        ids = chunk_store.ids()
+        vector_store = FAISS(
+            self.embeddings,
+            index,
+            chunk_store,
+            {chunk_id: str(chunk_id) for chunk_id in ids}
+        )
+        
+        # Chunk ids match vector ids; metadata comes from the columnar store only
+        metadata_store, document_chunks = self._chunk_maps(ids, [chunk_store.metadata(chunk_id) for chunk_id in ids])
+        
+        # BM25 postings are persisted beside the index; rebuilt only if missing or from another analyzer
+        bm25_index = None
+        if BM25_AVAILABLE and ids:
+            if BM25Index.exists(directory / "bm25"):
+                bm25_index = BM25Index.load(directory / "bm25")
+            if bm25_index is None or bm25_index.analyzer != self.analyzer.signature:
+                bm25_index = self._bm25_from(chunk_store)
         
-        # Load FAISS
-        self.vector_store = FAISS.load_local(
+        index_report = {"index_type": index_type_of(index), "compression": compression_of(index)}
+        index_version = 0
+        manifest_path = directory / MANIFEST_NAME
+        if manifest_path.exists():
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            index_report = manifest.get("index_report") or index_report
+            index_version = manifest.get("index_version", 0)
+        
+        return IndexState(
+            vector_store=vector_store,
+            chunk_store=chunk_store,
+            bm25_index=bm25_index,
+            metadata_store=metadata_store,
+            document_chunks=document_chunks,
+            next_chunk_id=chunk_store.max_id() + 1,
+            index_mmapped=True,
+            index_report=index_report,
+            index_version=index_version
+        )
+    
+    def _migrate_unversioned_index(self) -> IndexState:
+        """Load an index saved before snapshots (top-level chunk store or LangChain pickle) as the first snapshot"""
+        with self.snapshots.lock():
+            version = self.snapshots.current_version()
+            if version is not None:
+                # Another worker migrated it meanwhile
+                state = self._read_snapshot(self.snapshots.path(version))
+                state.snapshot_version = version
+                return state
+            if ChunkStore.exists(VECTORSTORE_PATH / "chunks"):
+                state = self._read_snapshot(VECTORSTORE_PATH)
+            else:
+                state = self._read_legacy_index()
+            return self._write_snapshot(state)
+    
+    def _read_legacy_index(self) -> IndexState:
+        """Load an index saved by LangChain (index.faiss + pickled docstore) into the chunk store layout"""
+        store = FAISS.load_local(
             str(VECTORSTORE_PATH),
             self.embeddings,
             allow_dangerous_deserialization=True
         )
+        if not is_id_addressable(store.index):
+            store = self._migrate_to_id_map(store)
         
-        # Load documents metadata
-        metadata_path = VECTORSTORE_PATH.parent / "documents.json"
-        if metadata_path.exists():
-            with open(metadata_path, "r", encoding="utf-8") as f:
-                docs_data = json.load(f)
-                self.documents = [
-                    Document(page_content=d["content"], metadata=d["metadata"])
-                    for d in docs_data
-                ]
+        ids, documents = self._store_documents(store)
+        chunk_store = ChunkStore()
+        chunk_store.put(ids, documents)
+        store.docstore = chunk_store
+        metadata_store, document_chunks = self._chunk_maps(ids, [doc.metadata for doc in documents])
+        return IndexState(
+            vector_store=store,
+            chunk_store=chunk_store,
+            bm25_index=self._bm25_from(chunk_store) if BM25_AVAILABLE and ids else None,
+            metadata_store=metadata_store,
+            document_chunks=document_chunks,
+            next_chunk_id=max(ids) + 1 if ids else 0,
+            index_mmapped=False,
+            index_report={"index_type": index_type_of(store.index), "compression": compression_of(store.index)}
+        )
+    
+    def _write_snapshot(self, state: IndexState) -> IndexState:
+        """
+        Write a generation as a new snapshot and promote it
         
-        # Build BM25 index
-        if BM25_AVAILABLE and self.documents:
-            corpus = [doc.page_content.lower().split() for doc in self.documents]
-            self.bm25_index = BM25Okapi(corpus)
+        Returns the same generation with its index and chunk store re-opened
+        (memory-mapped) on the snapshot's files, the delta index and
+        tombstones folded in; the given generation is left untouched for
+        its readers.
+        """
+        index = self._compacted_index(state)
+        staging = self.snapshots.stage()
+        try:
+            faiss.write_index(index, str(staging / "index.faiss"))
+            state.chunk_store.save(staging / "chunks", reopen=False)
+            if state.bm25_index is not None:
+                state.bm25_index.save(staging / "bm25")
+            version = self.snapshots.commit(staging, {
+                "documents": len(state.chunk_store),
+                "vectors": int(index.ntotal),
+                "next_chunk_id": state.next_chunk_id,
+                "index_version": state.index_version,
+                "embedding_model": self._embedding_model_name(),
+                "index_report": state.index_report
+            })
+        except Exception:
+            self.snapshots.discard(staging)
+            raise
         
-        # Initialize cross-encoder (optional)
-        if CROSS_ENCODER_AVAILABLE:
-            try:
-                self.cross_encoder = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
-            except Exception:
-                pass
+        directory = self.snapshots.path(version)
+        chunk_store = ChunkStore(directory / "chunks")
+        vector_store = FAISS(
+            state.vector_store.embedding_function,
+            faiss.read_index(str(directory / "index.faiss"), faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY),
+            chunk_store,
+            state.vector_store.index_to_docstore_id
+        )
+        return replace(
+            state,
+            vector_store=vector_store,
+            chunk_store=chunk_store,
+            index_mmapped=True,
+            snapshot_version=version,
+            delta_index=None,
+            tombstones=set()
+        )
+    
+    @staticmethod
+    def _compacted_index(state: IndexState) -> "faiss.Index":
+        """A generation's snapshot index with its delta added and tombstones removed (a copy if anything changed)"""
+        index = state.vector_store.index
+        delta = state.delta_index
+        removable = state.tombstones if supports_removal(index) else set()
+        if not removable and (delta is None or delta.ntotal == 0):
+            return index
+        
+        if state.index_mmapped:
+            # Cloning keeps a view of the mapped file, which cannot be added to
+            index = faiss.deserialize_index(faiss.serialize_index(index))
+        else:
+            index = faiss.clone_index(index)
+        if removable:
+            index.remove_ids(np.fromiter(removable, dtype=np.int64, count=len(removable)))
+        if delta is not None and delta.ntotal:
+            # The delta is an IndexIDMap2 over a flat index: stored vectors in id_map order
+            index.add_with_ids(
+                faiss.downcast_index(delta.index).reconstruct_n(0, delta.ntotal),
+                faiss.vector_to_array(delta.id_map)
+            )
+        return index
+    
+    def _save_main_index(self):
+        """Persist the live generation as a new snapshot (callers hold the write lock)"""
+        self._publish(self._write_snapshot(self._state))
+        # Logged mutations are part of the snapshot now; later ones go to its own log
+        self._open_wal(self.snapshot_version)
+    
+    def _open_wal(self, version: str):
+        """Switch the write-ahead log to the one of a snapshot version"""
+        if self.wal is not None:
+            self.wal.close()
+        self.wal = IndexWAL(self.snapshots.wal_path(version), fsync=settings.INDEX_WAL_FSYNC)
+    
+    def _replay_wal(self, state: IndexState) -> IndexState:
+        """Re-apply the mutations logged on top of a generation's snapshot (since the last replay)"""
+        records = list(self.wal.replay())
+        if not records:
+            return state
+        
+        state = self._next_generation(state)
+        departments = set()
+        for record in records:
+            ids = record["ids"]
+            if record["op"] == "add":
+                self._add_main_chunks(state, ids, record["vectors"], record["documents"])
+                state.next_chunk_id = max(state.next_chunk_id, max(ids, default=-1) + 1)
+                metadatas = [doc.metadata for doc in record["documents"]]
+            else:
+                if record.get("document_id") is not None:
+                    state.document_chunks.pop(record["document_id"], None)
+                metadatas = self._remove_main_chunks(state, ids)
+            state.index_version = record.get("version") or state.index_version + 1
+            departments.update(metadata.get("department") for metadata in metadatas)
+        
+        # Department indexes written by another process are re-read from disk on next use
+        self._drop_department_indexes(departments)
+        return state
+    
+    def _latest_index_version(self) -> int:
+        """Number of the last mutation on disk: the current snapshot's, or the last one in its log"""
+        version = self.snapshots.current_version()
+        if version is None:
+            return 0
+        latest = self.snapshots.manifest(version).get("index_version", 0)
+        for record in IndexWAL(self.snapshots.wal_path(version)).replay():
+            latest = record.get("version") or latest + 1
+        return latest
+    
+    def _snapshot_if_due(self):
+        """Write a snapshot once INDEX_SNAPSHOT_MAX_MUTATIONS mutations are logged"""
+        if len(self.wal) >= settings.INDEX_SNAPSHOT_MAX_MUTATIONS:
+            self._save_main_index()
+    
+    def _schedule_snapshot(self):
+        """Write a snapshot INDEX_SNAPSHOT_INTERVAL_SECONDS after the first unsaved mutation"""
+        if self.wal is None or not len(self.wal):
+            return
+        if self._snapshot_task is None or self._snapshot_task.done():
+            self._snapshot_task = asyncio.get_running_loop().create_task(self._snapshot_after_interval())
+    
+    async def _snapshot_after_interval(self):
+        await asyncio.sleep(settings.INDEX_SNAPSHOT_INTERVAL_SECONDS)
+        try:
+            await self.flush()
+        except Exception as e:
+            APILogger.log_error("/rag/snapshot", e, None, ErrorCategory.AI_ERROR)
+    
+    async def flush(self) -> Optional[str]:
+        """
+        Write logged index mutations as a snapshot now (e.g. on shutdown)
+        
+        Returns:
+            The live snapshot version
+        """
+        # The scheduled snapshot is no longer needed (unless this is it)
+        if self._snapshot_task is not None and self._snapshot_task is not asyncio.current_task():
+            self._snapshot_task.cancel()
+            self._snapshot_task = None
+        
+        if self.wal is not None and len(self.wal):
+            async with self._write_lock:
+                await self.executor.run("snapshot_write", self._flush_locked)
+        return self.snapshot_version
+    
+    def _flush_locked(self):
+        """Snapshot the logged mutations of all processes, unless another one already did"""
+        with self.snapshots.lock():
+            self._sync_locked()
+            if len(self.wal):
+                self._save_main_index()
+    
+    def _install(self, state: IndexState):
+        """Replay the logged mutations of a loaded or built generation and publish it (callers hold the write lock)"""
+        self._open_wal(state.snapshot_version)
+        self._publish(self._replay_wal(state))
+    
+    def _publish(self, state: IndexState):
+        """Make a generation live; searches that already pinned the previous one finish on it"""
+        state.generation = self._state.generation + 1 if self._state else 1
+        self._state = state
+    
+    def _next_generation(self, base: Optional[IndexState] = None) -> IndexState:
+        """
+        Private copy of a generation (default: the live one) for a writer to change
+        
+        The snapshot's FAISS index is shared, not copied (it stays
+        memory-mapped); only the delta index of vectors added since the
+        snapshot is cloned. The chunk store, BM25 and metadata copies share
+        their read-only arrays and copy only tombstones and in-memory
+        additions, so a mutation costs time proportional to what changed
+        since the last snapshot, not to the index size.
+        """
+        base = base or self._state
+        chunk_store = base.chunk_store.copy()
+        return replace(
+            base,
+            vector_store=FAISS(
+                base.vector_store.embedding_function,
+                base.vector_store.index,
+                chunk_store,
+                dict(base.vector_store.index_to_docstore_id)
+            ),
+            chunk_store=chunk_store,
+            bm25_index=base.bm25_index.copy() if base.bm25_index is not None else None,
+            metadata_store=base.metadata_store.copy(),
+            document_chunks=dict(base.document_chunks),
+            delta_index=faiss.clone_index(base.delta_index) if base.delta_index is not None else None,
+            tombstones=set(base.tombstones)
+        )
     
     async def _build_faiss_index(self):
-        """Build FAISS index from JSON data files"""
+        """
+        Build FAISS index from JSON data files
+        
+        The new index is built and promoted as a snapshot off to the side;
+        searches keep using the previous generation until it is published.
+        """
         if not LANGCHAIN_AVAILABLE:
             raise ImportError("LangChain not available")
         
-        # Load embeddings
-        if settings.OPENAI_API_KEY:
-            self.embeddings = OpenAIEmbeddings(openai_api_key=settings.OPENAI_API_KEY)
-        else:
-            self.embeddings = SentenceTransformerEmbeddings(
-                model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
-            )
+        # Load embeddings (shared instance)
+        self.embeddings = get_embeddings()
         
-        # Load documents from JSON files
-        data_dir = Path(__file__).parent.parent / "data"
-        self.documents = []
+        documents = self._load_data_documents()
+        if not documents:
+            raise ValueError("No documents found to index")
+        
+        await self.executor.run("annotate", self._annotate_chunks, documents)
+        vectors = await self.executor.run(
+            "embed_documents",
+            self._embed_documents,
+            [doc.page_content for doc in documents]
+        )
+        state = await self.executor.run("index_build", self._build_state, documents, vectors)
+        
+        async with self._write_lock:
+            await self.executor.run("snapshot_install", self._install, state)
+        await self.index_sync.notify(self.index_version)
+        
+        # Initialize cross-encoder (optional)
+        self._init_cross_encoder()
+    
+    def _load_data_documents(self, data_dir: Path = DATA_DIR) -> List[Document]:
+        """One chunk per record of the bundled company JSON files"""
+        documents = []
         
         for file_name in ["employees.json", "departments.json", "projects.json", "procedures.json"]:
             file_path = data_dir / file_name
@@ -184,40 +738,726 @@ class RAGService:
                         elif doc_type == "projects":
                             metadata["project_name"] = item.get("name", "")
                         
-                        self.documents.append(Document(page_content=text, metadata=metadata))
+                        documents.append(Document(page_content=text, metadata=metadata))
         
-        if not self.documents:
-            raise ValueError("No documents found to index")
+        return documents
+    
+    def _build_state(self, documents: List[Document], vectors: "np.ndarray") -> IndexState:
+        """
+        Build a fresh index and write it as the current snapshot
+        
+        Chunk ids continue after the highest one the replaced index used,
+        so no id means two different chunks; department indexes, which
+        hold uploads of the replaced index, are deleted.
+        """
+        with self.snapshots.lock():
+            # Build ID-mapped FAISS index (vector id = chunk id)
+            first_id = self._next_unused_chunk_id()
+            ids = list(range(first_id, first_id + len(documents)))
+            vector_store, index_report = self._build_main_vector_store(ids, vectors, documents)
+            
+            # The chunk store replaces the in-memory docstore used while building
+            chunk_store = ChunkStore()
+            chunk_store.put(ids, documents)
+            vector_store.docstore = chunk_store
+            
+            metadata_store, document_chunks = self._chunk_maps(ids, [doc.metadata for doc in documents])
+            state = IndexState(
+                vector_store=vector_store,
+                chunk_store=chunk_store,
+                bm25_index=self._bm25_from(chunk_store) if BM25_AVAILABLE else None,
+                metadata_store=metadata_store,
+                document_chunks=document_chunks,
+                next_chunk_id=first_id + len(ids),
+                index_mmapped=False,
+                index_report=index_report
+            )
+            # A rebuild is one more mutation, so other workers see a newer version and reload
+            state.index_version = self._latest_index_version() + 1
+            state = self._write_snapshot(state)
+            self._delete_department_indexes()
+            return state
+    
+    def _next_unused_chunk_id(self) -> int:
+        """First chunk id above every id of the current snapshot, its log and this process (callers hold the snapshot lock)"""
+        next_id = self._state.next_chunk_id if self._state else 0
+        version = self.snapshots.current_version()
+        if version is not None:
+            next_id = max(next_id, self.snapshots.manifest(version).get("next_chunk_id", 0))
+            for record in IndexWAL(self.snapshots.wal_path(version)).replay():
+                next_id = max(next_id, max(record["ids"], default=-1) + 1)
+        return next_id
+    
+    def _init_cross_encoder(self):
+        """Load the cross-encoder re-ranker if sentence-transformers is installed"""
+        if not CROSS_ENCODER_AVAILABLE or self.cross_encoder is not None:
+            return
+        try:
+            self.cross_encoder = CrossEncoderReranker(
+                CrossEncoder(settings.RERANK_MODEL, max_length=settings.RERANK_MAX_LENGTH),
+                max_candidates=settings.RERANK_MAX_CANDIDATES,
+                batch_size=settings.RERANK_BATCH_SIZE,
+                max_length=settings.RERANK_MAX_LENGTH,
+                cache_size=settings.RERANK_CACHE_SIZE
+            )
+        except Exception:
+            pass
+    
+    @staticmethod
+    def _allocate_chunk_ids(state: IndexState, count: int) -> List[int]:
+        """Reserve monotonically increasing chunk ids"""
+        ids = list(range(state.next_chunk_id, state.next_chunk_id + count))
+        state.next_chunk_id += count
+        return ids
+    
+    @staticmethod
+    def _chunk_maps(ids: List[int], metadatas: List[Dict]) -> Tuple[MetadataStore, Dict[int, List[int]]]:
+        """Metadata store and document_id -> chunk ids mapping of a set of chunks"""
+        metadata_store = MetadataStore()
+        document_chunks: Dict[int, List[int]] = {}
+        for chunk_id, metadata in zip(ids, metadatas):
+            document_id = metadata.get("document_id")
+            if document_id is not None:
+                document_chunks.setdefault(document_id, []).append(chunk_id)
+        metadata_store.add(ids, metadatas)
+        return metadata_store, document_chunks
+    
+    @staticmethod
+    def _register_chunks(state: IndexState, ids: List[int], metadatas: List[Dict]):
+        """Record chunk id mappings and filterable metadata"""
+        added: Dict[int, List[int]] = {}
+        for chunk_id, metadata in zip(ids, metadatas):
+            document_id = metadata.get("document_id")
+            if document_id is not None:
+                added.setdefault(document_id, []).append(chunk_id)
+        for document_id, chunk_ids in added.items():
+            # Lists are shared with earlier generations: replace, never extend
+            state.document_chunks[document_id] = state.document_chunks.get(document_id, []) + chunk_ids
+        state.metadata_store.add(ids, metadatas)
+    
+    @staticmethod
+    def _unregister_chunks(state: IndexState, ids: List[int]) -> List[Dict]:
+        """Drop chunks from the metadata store; returns their metadata"""
+        state.metadata_store.remove(ids)
+        metadatas = [state.chunk_store.metadata(chunk_id) for chunk_id in ids]
+        return [metadata for metadata in metadatas if metadata is not None]
+    
+    def _embedding_model_name(self) -> str:
+        """Identify the embedding model (part of the embedding cache key)"""
+        return (
+            getattr(self.embeddings, "model_name", None)
+            or getattr(self.embeddings, "model", None)
+            or type(self.embeddings).__name__
+        )
+    
+    def _get_embedding_cache(self) -> EmbeddingCache:
+        """Embedding cache of the current model"""
+        model_name = self._embedding_model_name()
+        if self.embedding_cache is None or self.embedding_cache.model_name != model_name:
+            self.embedding_cache = EmbeddingCache(
+                EMBEDDING_CACHE_DIR, model_name, max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES
+            )
+        return self.embedding_cache
+    
+    def _get_token_cache(self) -> TokenCache:
+        """Token stream cache of the current analyzer"""
+        if self.token_cache is None or self.token_cache.signature != self.analyzer.signature:
+            self.token_cache = TokenCache(TOKEN_CACHE_DIR, self.analyzer.signature)
+        return self.token_cache
+    
+    def _analyze_documents(self, texts: List[str]) -> List["np.ndarray"]:
+        """Term id streams of texts, analyzing only text not seen by this analyzer before"""
+        return self._get_token_cache().analyze(texts, self.analyzer.term_ids)
+    
+    def _embed_documents(self, texts: List[str]):
+        """Embed texts, reusing cached vectors for text already embedded by this model"""
+        if not EMBEDDING_CACHE_AVAILABLE:
+            return self.embeddings.embed_documents(texts)
+        
+        return self._get_embedding_cache().embed(texts, self.embeddings.embed_documents)
+    
+    def _embed_query_batch(self, _key, queries: List[str]) -> List[List[float]]:
+        """Embed a micro-batch of queries in one forward pass"""
+        return self.embeddings.embed_documents(queries)
+    
+    async def _embed_query_uncached(self, query: str) -> List[float]:
+        """Embed a query on the executor, micro-batched with concurrent queries"""
+        if settings.RETRIEVAL_BATCH_WINDOW_MS > 0:
+            return await self.query_batcher.submit(query)
+        return await self.executor.run("embed_query", self.embeddings.embed_query, query)
+    
+    def _get_query_cache(self) -> "QueryEmbeddingCache":
+        """Query embedding LRU of the current model"""
+        model_name = self._embedding_model_name()
+        if self.query_cache is None or self.query_cache.model_name != model_name:
+            self.query_cache = QueryEmbeddingCache(
+                model_name,
+                max_size=settings.QUERY_EMBEDDING_CACHE_SIZE,
+                redis_spill=settings.QUERY_EMBEDDING_REDIS_SPILL,
+                redis_ttl=settings.QUERY_EMBEDDING_REDIS_TTL
+            )
+        return self.query_cache
+    
+    async def _embed_query(self, query: str) -> List[float]:
+        """Embed a query, served from the query embedding LRU when repeated"""
+        if not EMBEDDING_CACHE_AVAILABLE:
+            return await self._embed_query_uncached(query)
+        
+        vector = await self._get_query_cache().get_or_embed(query, self._embed_query_uncached)
+        return vector.tolist()
+    
+    async def _embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed several queries in one forward pass (query LRU hits are not re-embedded)"""
+        cache = self._get_query_cache() if EMBEDDING_CACHE_AVAILABLE else None
+        vectors = [cache.get(query) if cache else None for query in queries]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            embedded = await self.executor.run(
+                "embed_query", self.embeddings.embed_documents, [queries[i] for i in missing]
+            )
+            for i, vector in zip(missing, embedded):
+                vectors[i] = np.asarray(vector, dtype=np.float32)
+                if cache:
+                    cache.put(queries[i], vectors[i])
+        return [np.asarray(vector, dtype=np.float32).tolist() for vector in vectors]
+    
+    def get_stats(self) -> Dict:
+        """Index and cache statistics"""
+        return {
+            "documents": len(self.chunk_store) if self.chunk_store else 0,
+            "vectors": self.vector_store.index.ntotal + self._delta_size() if self.vector_store else 0,
+            "since_snapshot": {
+                "added": self._delta_size(),
+                "tombstoned": len(self._state.tombstones)
+            } if self._state else None,
+            "departments": len(self.department_indexes),
+            "index": self.index_report,
+            "snapshot": self.snapshot_version,
+            "generation": self._state.generation if self._state else 0,
+            "index_version": self.index_version,
+            "wal": {
+                "records": len(self.wal),
+                "bytes": self.wal.size_bytes
+            } if self.wal is not None else None,
+            "executor": self.executor.stats(),
+            "batching": {
+                "embed_query": self.query_batcher.stats(),
+                "dense": self.search_batcher.stats()
+            },
+            "query_cache": self.query_cache.stats() if self.query_cache else None,
+            "rerank_cache": self.cross_encoder.stats() if self.cross_encoder else None,
+            "embedding_cache": {
+                "size": len(self.embedding_cache),
+                "hits": self.embedding_cache.hits,
+                "misses": self.embedding_cache.misses,
+                "compactions": self.embedding_cache.compactions
+            } if self.embedding_cache else None,
+            "analyzer": self.analyzer.signature,
+            "near_duplicates": self.dedupe_stats,
+            "token_cache": self.token_cache.stats() if self.token_cache else None
+        }
+    
+    def _delta_size(self) -> int:
+        """Vectors in the live generation's delta index (added since the snapshot)"""
+        delta = self._state.delta_index if self._state else None
+        return int(delta.ntotal) if delta is not None else 0
+    
+    def _dense_search(
+        self,
+        store: FAISS,
+        query_vector: List[float],
+        k: int,
+        allowed: Optional["np.ndarray"] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        live: Optional["np.ndarray"] = None,
+        delta: Optional["faiss.Index"] = None
+    ) -> Tuple["np.ndarray", "np.ndarray"]:
+        """Dense search for one query (see _dense_search_batch)"""
+        return self._dense_search_batch(store, [query_vector], k, allowed, nprobe, ef_search, live, delta)[0]
+    
+    def _dense_search_batch(
+        self,
+        store: FAISS,
+        query_vectors: List[List[float]],
+        k: int,
+        allowed: Optional["np.ndarray"] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        live: Optional["np.ndarray"] = None,
+        delta: Optional["faiss.Index"] = None
+    ) -> List[Tuple["np.ndarray", "np.ndarray"]]:
+        """
+        Dense search for several queries with one index.search call,
+        optionally restricted to an allowed chunk id mask
+        
+        Returns (chunk_ids, scores) per query, best first, with
+        score = -L2 distance. The mask is handed to FAISS as an ID selector
+        bitmap, so excluded vectors are skipped during the scan instead of
+        filtered afterwards. nprobe (IVF) and ef_search (HNSW) override the
+        configured defaults. Compressed indexes over-fetch and re-score
+        candidates with their full-precision vectors from the
+        (memory-mapped) embedding cache. live (the metadata store's mask of
+        the main index) keeps tombstones out of the k results; delta (the
+        main index's vectors added since the snapshot) is searched too.
+        """
+        index = store.index
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32))
+        delta_total = delta.ntotal if delta is not None else 0
+        if index.ntotal + delta_total == 0:
+            return [empty for _ in query_vectors]
         
-        # Build FAISS index
-        self.vector_store = FAISS.from_documents(self.documents, self.embeddings)
+        rescore_factor = settings.FAISS_RESCORE_FACTOR if EMBEDDING_CACHE_AVAILABLE and is_compressed(index) else 0
+        result_k = k
+        if rescore_factor:
+            k *= rescore_factor
         
-        # Save FAISS index
-        self.vector_store.save_local(str(VECTORSTORE_PATH))
+        # Removed chunks stay in the index as tombstones (until the next snapshot; in HNSW graphs until a rebuild)
+        if live is not None and index.ntotal + delta_total > len(store.index_to_docstore_id):
+            allowed = live if allowed is None else allowed & live[:allowed.size]
         
-        # Save documents metadata
-        docs_data = [
-            {
-                "content": doc.page_content,
-                "metadata": doc.metadata
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        index_type = index_type_of(index)
+        hit_rows = None
+        selector = None
+        
+        if allowed is not None:
+            allowed_ids = np.flatnonzero(allowed)
+            if allowed_ids.size == 0:
+                return [empty for _ in query_vectors]
+            if index_type != "flat" and allowed_ids.size <= EXACT_FILTERED_SEARCH_MAX:
+                hit_rows = [self._exact_search(store, query[None, :], allowed_ids, k, delta) for query in queries]
+            else:
+                bitmap = np.packbits(allowed, bitorder="little")
+                selector = faiss.IDSelectorBitmap(allowed.size, faiss.swig_ptr(bitmap))
+                k = min(k, int(allowed_ids.size))
+        
+        if hit_rows is None:
+            params = search_parameters(
+                index,
+                selector,
+                nprobe=nprobe or settings.FAISS_IVF_NPROBE,
+                ef_search=ef_search or settings.FAISS_HNSW_EF_SEARCH
+            )
+            distances, labels = index.search(queries, k, params=params)
+            hit_rows = list(zip(distances, labels))
+            # ANN traversal can come back short under a selective filter
+            if selector is not None and index_type != "flat":
+                hit_rows = [
+                    hits if (hits[1] >= 0).sum() >= k else self._exact_search(store, query[None, :], allowed_ids, k, delta)
+                    for query, hits in zip(queries, hit_rows)
+                ]
+            if delta_total:
+                # Vectors added since the snapshot: one flat scan of the (small) delta, merged by distance
+                delta_distances, delta_labels = delta.search(queries, k, params=search_parameters(delta, selector))
+                hit_rows = [
+                    self._merge_hits(hits, delta_hits, k)
+                    for hits, delta_hits in zip(hit_rows, zip(delta_distances, delta_labels))
+                ]
+        
+        results = []
+        for query, (distances, labels) in zip(queries, hit_rows):
+            present = np.fromiter(
+                (chunk_id in store.index_to_docstore_id for chunk_id in labels.tolist()),
+                dtype=bool,
+                count=labels.size
+            )
+            labels, distances = labels[present], distances[present]
+            
+            if rescore_factor and labels.size:
+                vectors = self._get_embedding_cache().embed(
+                    self._chunk_texts(store, labels.tolist()),
+                    self.embeddings.embed_documents
+                )
+                distances, positions = rescore(query, vectors, result_k)
+                labels = labels[positions]
+            results.append((labels.astype(np.int64), -np.asarray(distances, dtype=np.float32)))
+        return results
+    
+    def _dense_search_grouped(
+        self,
+        key: Tuple,
+        requests: List[Tuple[List[float], int]]
+    ) -> List[Tuple["np.ndarray", "np.ndarray"]]:
+        """Micro-batch of unfiltered searches on one index: (query_vector, k, live, delta) per request"""
+        store, nprobe, ef_search = key
+        max_k = max(request[1] for request in requests)
+        # Requests on one store come from one generation and share its live mask and delta index
+        live, delta = requests[0][2:]
+        results = self._dense_search_batch(
+            store, [request[0] for request in requests], max_k, None, nprobe, ef_search, live, delta
+        )
+        return [(ids[:request[1]], scores[:request[1]]) for (ids, scores), request in zip(results, requests)]
+    
+    async def _search(
+        self,
+        store: FAISS,
+        query_vector: List[float],
+        k: int,
+        allowed: Optional["np.ndarray"] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        live: Optional["np.ndarray"] = None,
+        delta: Optional["faiss.Index"] = None
+    ) -> Tuple["np.ndarray", "np.ndarray"]:
+        """Dense search on the executor; unfiltered searches are micro-batched across requests"""
+        if settings.RETRIEVAL_LANGCHAIN_PATH and allowed is None and self._langchain_searchable(store, delta):
+            return await self.executor.run("dense", self._langchain_search, store, query_vector, k)
+        if allowed is None and settings.RETRIEVAL_BATCH_WINDOW_MS > 0:
+            return await self.search_batcher.submit((query_vector, k, live, delta), key=(store, nprobe, ef_search))
+        return await self.executor.run(
+            "dense", self._dense_search, store, query_vector, k, allowed, nprobe, ef_search, live, delta
+        )
+    
+    @staticmethod
+    def _langchain_searchable(store: FAISS, delta: Optional["faiss.Index"] = None) -> bool:
+        """Whether LangChain's search wrapper returns the same hits (no tombstones, no delta, no re-scoring)"""
+        return (
+            isinstance(store.docstore, ChunkStore)
+            and (delta is None or delta.ntotal == 0)
+            and store.index.ntotal == len(store.index_to_docstore_id)
+            and not is_compressed(store.index)
+        )
+    
+    @staticmethod
+    def _langchain_search(store: FAISS, query_vector: List[float], k: int) -> Tuple["np.ndarray", "np.ndarray"]:
+        """
+        Dense search through LangChain's FAISS wrapper (RETRIEVAL_LANGCHAIN_PATH)
+        
+        Builds a Document per hit just to read its chunk id back; kept for
+        comparison with the direct path (scripts/benchmark_retrieval.py).
+        """
+        hits = store.similarity_search_with_score_by_vector(query_vector, k)
+        chunk_ids = np.asarray([int(doc.id) for doc, _ in hits], dtype=np.int64)
+        scores = -np.asarray([float(score) for _, score in hits], dtype=np.float32)
+        return chunk_ids, scores
+    
+    @classmethod
+    def _exact_search(
+        cls,
+        store: FAISS,
+        query: "np.ndarray",
+        ids: "np.ndarray",
+        k: int,
+        delta: Optional["faiss.Index"] = None
+    ) -> Tuple["np.ndarray", "np.ndarray"]:
+        """Exact search over the given chunk ids that are present in the store (or its delta); returns (distances, ids)"""
+        present = np.asarray([i for i in ids.tolist() if i in store.index_to_docstore_id], dtype=np.int64)
+        if present.size == 0:
+            return np.zeros(0, dtype=np.float32), present
+        if delta is None or delta.ntotal == 0:
+            distances, labels = exact_subset_search(store.index, query, present, k)
+            return distances[0], labels[0]
+        
+        in_delta = np.isin(present, faiss.vector_to_array(delta.id_map))
+        hits = (np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64))
+        for index, subset in ((store.index, present[~in_delta]), (delta, present[in_delta])):
+            if subset.size:
+                distances, labels = exact_subset_search(index, query, subset, k)
+                hits = cls._merge_hits(hits, (distances[0], labels[0]), k)
+        return hits
+    
+    @staticmethod
+    def _merge_hits(
+        hits: Tuple["np.ndarray", "np.ndarray"],
+        other: Tuple["np.ndarray", "np.ndarray"],
+        k: int
+    ) -> Tuple["np.ndarray", "np.ndarray"]:
+        """Merge two (distances, ids) hit lists by distance into the k nearest distinct ids"""
+        distances = np.concatenate([hits[0], other[0]])
+        labels = np.concatenate([hits[1], other[1]])
+        order = np.argsort(distances, kind="stable")
+        distances, labels = distances[order], labels[order]
+        _, first = np.unique(labels, return_index=True)
+        keep = np.sort(first)[:k]
+        return distances[keep], labels[keep]
+    
+    @staticmethod
+    def _chunk_texts(store: FAISS, chunk_ids: Sequence[int]) -> List[str]:
+        """Text of chunks in a store (read straight from the chunk store for the main index)"""
+        if isinstance(store.docstore, ChunkStore):
+            return [store.docstore.text(chunk_id) or "" for chunk_id in chunk_ids]
+        return [store.docstore.search(store.index_to_docstore_id[chunk_id]).page_content for chunk_id in chunk_ids]
+    
+    def _ranked_documents(
+        self,
+        store: FAISS,
+        chunk_ids: Sequence[int],
+        scores: Sequence[float]
+    ) -> List[Tuple[int, Document, float]]:
+        """Materialize ranked chunk ids as (chunk_id, document, score), skipping chunks no longer in the store"""
+        ranked = []
+        for chunk_id, score in zip(np.asarray(chunk_ids).tolist(), np.asarray(scores).tolist()):
+            docstore_id = store.index_to_docstore_id.get(chunk_id)
+            if docstore_id is None:
+                continue
+            doc = store.docstore.search(docstore_id)
+            if isinstance(doc, Document):
+                ranked.append((chunk_id, doc, float(score)))
+        return ranked
+    
+    def _create_vector_store(
+        self,
+        dimension: int,
+        index_type: str = "flat",
+        training_vectors: Optional["np.ndarray"] = None,
+        compression: str = "none",
+        pca_dim: int = 0
+    ) -> FAISS:
+        """Create an empty FAISS store addressed by chunk id (flat, IVF or HNSW, optionally compressed)"""
+        index = create_index(
+            dimension,
+            index_type,
+            training_vectors=training_vectors,
+            nlist=settings.FAISS_IVF_NLIST,
+            hnsw_m=settings.FAISS_HNSW_M,
+            ef_construction=settings.FAISS_HNSW_EF_CONSTRUCTION,
+            compression=compression,
+            pq_m=settings.FAISS_PQ_M,
+            pca_dim=pca_dim
+        )
+        return FAISS(self.embeddings, index, InMemoryDocstore(), {})
+    
+    def _build_main_vector_store(
+        self,
+        ids: List[int],
+        vectors: "np.ndarray",
+        documents: List[Document]
+    ) -> Tuple[FAISS, Dict]:
+        """
+        Build the main store with the configured index type and compression; returns (store, index report)
+        
+        An ANN (IVF/HNSW) or compressed (SQ8/PQ, PCA) index is only used if
+        its recall@10 against exact search over the full vectors (after
+        re-scoring, for compressed indexes) reaches FAISS_ANN_MIN_RECALL;
+        otherwise the build falls back to an uncompressed flat index.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        dimension = vectors.shape[1]
+        index_type = settings.FAISS_INDEX_TYPE
+        compression = settings.FAISS_COMPRESSION
+        pca_dim = settings.FAISS_PCA_DIM
+        uncompressed_bytes = int(vectors.nbytes)
+        
+        if index_type == "flat" and compression == "none" and not pca_dim:
+            store = self._create_vector_store(dimension)
+            self._add_vectors(store, ids, vectors, documents)
+            return store, {
+                "index_type": "flat",
+                "compression": "none",
+                "recall": 1.0,
+                "memory_bytes": memory_bytes(store.index),
+                "uncompressed_bytes": uncompressed_bytes
             }
-            for doc in self.documents
-        ]
-        metadata_path = VECTORSTORE_PATH.parent / "documents.json"
-        with open(metadata_path, "w", encoding="utf-8") as f:
-            json.dump(docs_data, f, ensure_ascii=False, indent=2)
         
-        # Build BM25 index
-        if BM25_AVAILABLE:
-            corpus = [doc.page_content.lower().split() for doc in self.documents]
-            self.bm25_index = BM25Okapi(corpus)
+        report = {
+            "requested_index_type": index_type,
+            "requested_compression": compression,
+            "pca_dim": pca_dim,
+            "min_recall": settings.FAISS_ANN_MIN_RECALL,
+            "uncompressed_bytes": uncompressed_bytes
+        }
+        try:
+            store = self._create_vector_store(dimension, index_type, vectors, compression, pca_dim)
+        except ValueError as e:
+            APILogger.log_error("/rag/init", e, None, ErrorCategory.AI_ERROR)
+            store = None
         
-        # Initialize cross-encoder (optional)
-        if CROSS_ENCODER_AVAILABLE:
-            try:
-                self.cross_encoder = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
-            except Exception:
-                pass
+        accepted = False
+        effective_recall = 0.0
+        if store is not None:
+            self._add_vectors(store, ids, vectors, documents)
+            recall_kwargs = {
+                "nprobe": settings.FAISS_IVF_NPROBE,
+                "ef_search": settings.FAISS_HNSW_EF_SEARCH
+            }
+            report.update(measure_recall(store.index, vectors, ids, **recall_kwargs))
+            report["memory_bytes"] = memory_bytes(store.index)
+            report["memory_ratio"] = report["memory_bytes"] / max(uncompressed_bytes, 1)
+            effective_recall = report["recall"]
+            if is_compressed(store.index) and settings.FAISS_RESCORE_FACTOR and EMBEDDING_CACHE_AVAILABLE:
+                report["rescored_recall"] = measure_recall(
+                    store.index, vectors, ids, rescore_factor=settings.FAISS_RESCORE_FACTOR, **recall_kwargs
+                )["recall"]
+                effective_recall = report["rescored_recall"]
+            accepted = effective_recall >= settings.FAISS_ANN_MIN_RECALL
+            APILogger.log_request(
+                "/rag/init",
+                "GET",
+                None,
+                None,
+                200,
+                log_message=(
+                    f"{index_type}/{compression} index recall@{report['k']}={effective_recall:.3f}, "
+                    f"{report['memory_bytes']} bytes ({report['memory_ratio']:.1%} of float32 vectors) "
+                    f"({'accepted' if accepted else 'below minimum, using flat index'})"
+                )
+            )
+        
+        if accepted:
+            report.update({"index_type": index_type, "compression": compression})
+        else:
+            if "recall" in report:
+                report["rejected_recall"] = effective_recall
+            store = self._create_vector_store(dimension)
+            self._add_vectors(store, ids, vectors, documents)
+            report.update({
+                "index_type": "flat",
+                "compression": "none",
+                "recall": 1.0,
+                "memory_bytes": memory_bytes(store.index)
+            })
+            report["memory_ratio"] = report["memory_bytes"] / max(uncompressed_bytes, 1)
+        return store, report
+    
+    def _migrate_to_id_map(self, store: FAISS) -> FAISS:
+        """Wrap a legacy sequential FAISS index into an ID map without re-embedding"""
+        ids = sorted(store.index_to_docstore_id)
+        vectors = store.index.reconstruct_n(0, store.index.ntotal)
+        migrated = self._create_vector_store(store.index.d)
+        documents = [store.docstore.search(store.index_to_docstore_id[i]) for i in ids]
+        self._add_vectors(migrated, ids, vectors[ids], documents)
+        return migrated
+    
+    @staticmethod
+    def _clone_store(store: FAISS) -> FAISS:
+        """Private copy of an in-memory FAISS store, changed and then swapped in for its readers"""
+        return FAISS(
+            store.embedding_function,
+            faiss.clone_index(store.index),
+            InMemoryDocstore(dict(store.docstore._dict)),
+            dict(store.index_to_docstore_id)
+        )
+    
+    @staticmethod
+    def _store_documents(store: FAISS) -> Tuple[List[int], List[Document]]:
+        """Chunk ids and documents held by a FAISS store, in id order"""
+        ids = []
+        documents = []
+        for chunk_id in sorted(store.index_to_docstore_id):
+            doc = store.docstore.search(store.index_to_docstore_id[chunk_id])
+            if isinstance(doc, Document):
+                ids.append(chunk_id)
+                documents.append(doc)
+        return ids, documents
+    
+    @staticmethod
+    def _department_path(department: str) -> Path:
+        """On-disk location of a department index"""
+        slug = re.sub(r"[^\w-]+", "_", department).strip("_") or "default"
+        return DEPARTMENT_INDEX_DIR / slug
+    
+    def _get_department_index(self, department: str) -> Optional[FAISS]:
+        """Get a department index, loading it from disk on first use"""
+        with self._department_lock:
+            now = time.monotonic()
+            self._evict_department_indexes(now)
+            
+            if department in self.department_indexes:
+                self.department_indexes.move_to_end(department)
+                self._department_last_used[department] = now
+                return self.department_indexes[department]
+            
+            path = self._department_path(department)
+            if not (path / "index.faiss").exists():
+                return None
+            
+            store = FAISS.load_local(str(path), self.embeddings, allow_dangerous_deserialization=True)
+            self.department_indexes[department] = store
+            self.department_documents[department] = self._store_documents(store)[1]
+            self._department_last_used[department] = now
+            self._evict_department_indexes(now)
+            return store
+    
+    def _evict_department_indexes(self, now: float):
+        """Unload idle or least recently used department indexes (they are persisted)"""
+        idle_after = settings.DEPARTMENT_INDEX_IDLE_SECONDS
+        for department in list(self.department_indexes):
+            over_capacity = len(self.department_indexes) > settings.DEPARTMENT_INDEX_MAX_LOADED
+            idle = now - self._department_last_used.get(department, now) > idle_after
+            if not (over_capacity or idle):
+                break
+            del self.department_indexes[department]
+            self.department_documents.pop(department, None)
+            self._department_last_used.pop(department, None)
+    
+    def _drop_department_indexes(self, departments: Optional[Set[str]] = None):
+        """Forget loaded department indexes (default: all) so they are re-read from disk"""
+        with self._department_lock:
+            for department in list(self.department_indexes) if departments is None else departments:
+                self.department_indexes.pop(department, None)
+                self.department_documents.pop(department, None)
+                self._department_last_used.pop(department, None)
+    
+    def _delete_department_indexes(self):
+        """Delete all department indexes, loaded and on disk (their chunks left with the replaced main index)"""
+        with self._department_lock:
+            self.department_indexes.clear()
+            self.department_documents.clear()
+            self._department_last_used.clear()
+            if DEPARTMENT_INDEX_DIR.exists():
+                for path in DEPARTMENT_INDEX_DIR.iterdir():
+                    if path.is_dir():
+                        shutil.rmtree(path, ignore_errors=True)
+    
+    def _save_department_index(self, department: str):
+        """Persist a department index"""
+        store = self.department_indexes.get(department)
+        if store is not None:
+            store.save_local(str(self._department_path(department)))
+    
+    @staticmethod
+    def _add_vectors(store: FAISS, ids: List[int], vectors, documents: List[Document], index: Optional["faiss.Index"] = None):
+        """Add precomputed vectors under explicit chunk ids (to index instead of the store's own, if given)"""
+        (store.index if index is None else index).add_with_ids(
+            np.asarray(vectors, dtype=np.float32),
+            np.asarray(ids, dtype=np.int64)
+        )
+        store.docstore.add({str(chunk_id): doc for chunk_id, doc in zip(ids, documents)})
+        store.index_to_docstore_id.update({chunk_id: str(chunk_id) for chunk_id in ids})
+    
+    @staticmethod
+    def _remove_vectors(store: FAISS, ids: List[int]) -> int:
+        """
+        Remove vectors by chunk id; returns the number removed
+        
+        HNSW graphs cannot delete vectors, so there only the id mapping is
+        dropped and the vector stays behind as a tombstone that dense search
+        masks out (until the next rebuild).
+        """
+        present = [chunk_id for chunk_id in ids if chunk_id in store.index_to_docstore_id]
+        if not present:
+            return 0
+        
+        if supports_removal(store.index):
+            removed = store.index.remove_ids(np.asarray(present, dtype=np.int64))
+        else:
+            removed = len(present)
+        store.docstore.delete([store.index_to_docstore_id.pop(chunk_id) for chunk_id in present])
+        return removed
+    
+    def _bm25_from(self, chunk_store: ChunkStore) -> BM25Index:
+        """BM25 index over all chunks of a chunk store"""
+        bm25_index = BM25Index(analyzer=self.analyzer.signature)
+        ids = chunk_store.ids()
+        bm25_index.add(self._analyze_documents([chunk_store.text(i) for i in ids]), ids)
+        return bm25_index
+    
+    def _add_to_bm25_index(self, bm25_index: BM25Index, ids: List[int], documents: List[Document]):
+        """Append documents to a BM25 index (cost proportional to the new documents only)"""
+        if not documents:
+            return
+        bm25_index.add(self._analyze_documents([doc.page_content for doc in documents]), ids)
+    
+    def _schedule_bm25_compaction(self):
+        """
+        Merge BM25 segments of the live generation in a background thread once enough updates piled up
+        
+        Compaction leaves search results unchanged, so it may run on a
+        published index; generations copied meanwhile compact later.
+        """
+        if self.bm25_index and self.bm25_index.needs_compaction():
+            asyncio.get_running_loop().run_in_executor(None, self.bm25_index.compact)
     
     def _format_document_text(self, item: Dict, doc_type: str) -> str:
         """Format document item as text"""
@@ -232,17 +1472,94 @@ class RAGService:
         else:
             return json.dumps(item, ensure_ascii=False)
     
+    async def retrieve_ids(
+        self,
+        query: str,
+        k: int = 50,
+        top_k: int = 5,
+        use_hybrid: bool = True,
+        use_rerank: bool = True,
+        metadata_filter: Optional[MetadataFilter] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ) -> Tuple["np.ndarray", "np.ndarray"]:
+        """
+        Lean retrieval: ranked chunk ids and scores, without Document objects
+        
+        FAISS is searched directly on the query vector and candidates stay
+        integer chunk ids through fusion and re-ranking (which reads chunk
+        text from the memory-mapped chunk store). Callers materialize only
+        the ids they use. Arguments as for retrieve.
+        
+        Returns:
+            (chunk_ids, scores), best first, at most top_k
+        """
+        if not self._initialized:
+            await self.initialize()
+        
+        state = self._state
+        if state is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        return await self._retrieve_ids(
+            state, query, k, top_k, use_hybrid, use_rerank, metadata_filter, nprobe, ef_search
+        )
+    
+    async def _retrieve_ids(
+        self,
+        state: IndexState,
+        query: str,
+        k: int,
+        top_k: int,
+        use_hybrid: bool,
+        use_rerank: bool,
+        metadata_filter: Optional[MetadataFilter],
+        nprobe: Optional[int],
+        ef_search: Optional[int]
+    ) -> Tuple["np.ndarray", "np.ndarray"]:
+        """retrieve_ids on one pinned generation (nothing here waits for index updates)"""
+        # Evaluate the filter once into a chunk id mask
+        allowed = None
+        if metadata_filter is not None and not metadata_filter.is_empty:
+            allowed = state.metadata_store.mask(metadata_filter)
+            if not allowed.any():
+                return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        
+        # First stage: chunk ids ranked by FAISS, fused with BM25 in hybrid mode
+        if use_hybrid and BM25_AVAILABLE and state.bm25_index:
+            chunk_ids, scores = await self._hybrid_retrieval(state, query, k, allowed, nprobe, ef_search)
+        else:
+            # Dense only
+            query_vector = await self._embed_query(query)
+            chunk_ids, scores = await self._search(
+                state.vector_store, query_vector, k, allowed, nprobe, ef_search,
+                state.metadata_store.live, state.delta_index
+            )
+        
+        # Re-ranking
+        if use_rerank:
+            return await self._rerank_candidates(state, query, chunk_ids, scores, top_k)
+        return chunk_ids[:top_k], scores[:top_k]
+    
     async def retrieve(
         self,
         query: str,
         k: int = 50,
         top_k: int = 5,
         use_hybrid: bool = True,
-        use_rerank: bool = True
+        use_rerank: bool = True,
+        metadata_filter: Optional[MetadataFilter] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
     ) -> Tuple[List[Document], List[Dict]]:
         """
         Retrieve relevant documents with hybrid search and re-ranking
         
+        Args:
+            metadata_filter: Optional doc_type/department/uploader filter, applied
+                inside FAISS and BM25 before scoring
+            nprobe: IVF lists to probe (default FAISS_IVF_NPROBE)
+            ef_search: HNSW search depth (default FAISS_HNSW_EF_SEARCH)
+        
         Returns:
             (documents, used_documents_metadata)
             used_documents_metadata: List of dicts with doc_id, title, chunk_id, score
@@ -250,165 +1567,318 @@ class RAGService:
         if not self._initialized:
             await self.initialize()
         
-        if not self.vector_store:
+        # Ranking and materialization read the same generation
+        state = self._state
+        if state is None:
             return [], []
         
-        # Hybrid retrieval: FAISS dense + BM25 sparse
-        if use_hybrid and BM25_AVAILABLE and self.bm25_index:
-            dense_docs, sparse_docs = await self._hybrid_retrieval(query, k)
-            # Merge and deduplicate
-            all_docs = self._merge_documents(dense_docs, sparse_docs)
-        else:
-            # Dense only
-            all_docs = self.vector_store.similarity_search(query, k=k)
+        chunk_ids, scores = await self._retrieve_ids(
+            state, query, k, top_k, use_hybrid, use_rerank, metadata_filter, nprobe, ef_search
+        )
+        return self._used_documents(state, chunk_ids, scores)
+    
+    def _used_documents(
+        self,
+        state: IndexState,
+        chunk_ids: "np.ndarray",
+        scores: "np.ndarray"
+    ) -> Tuple[List[Document], List[Dict]]:
+        """
+        Materialize ranked main-index chunks as (documents, used_documents_metadata)
         
-        # Re-ranking
-        if use_rerank and len(all_docs) > top_k:
-            if CROSS_ENCODER_AVAILABLE and self.cross_encoder:
-                all_docs = self._rerank_with_cross_encoder(query, all_docs, top_k)
-            else:
-                all_docs = self._rerank_simple(query, all_docs, top_k)
-        else:
-            all_docs = all_docs[:top_k]
+        Only these final chunks become Documents; scores are returned
+        alongside and never written into their metadata.
+        """
+        ranked = self._ranked_documents(state.vector_store, chunk_ids, scores)
         
         # Build used_documents metadata
+        all_docs = [doc for _, doc, _ in ranked]
         used_documents = []
-        for idx, doc in enumerate(all_docs):
+        for idx, (_, doc, score) in enumerate(ranked):
             metadata = doc.metadata
             used_documents.append({
                 "doc_id": metadata.get("doc_id", f"doc_{idx}"),
                 "title": metadata.get("name") or metadata.get("project_name") or metadata.get("title", f"Document {idx+1}"),
                 "chunk_id": idx,
-                "score": metadata.get("score", 1.0 - (idx * 0.1)),
+                "score": score,
                 "doc_type": metadata.get("doc_type", "unknown"),
                 "source": metadata.get("source", "unknown")
             })
         
         return all_docs, used_documents
     
-    async def _hybrid_retrieval(self, query: str, k: int) -> Tuple[List[Document], List[Document]]:
-        """Hybrid retrieval: FAISS dense + BM25 sparse"""
-        # Dense retrieval (FAISS)
-        dense_docs = self.vector_store.similarity_search(query, k=k)
-        
-        # Sparse retrieval (BM25)
-        query_tokens = query.lower().split()
-        if self.bm25_index:
-            bm25_scores = self.bm25_index.get_scores(query_tokens)
-            # Get top k BM25 results
-            top_indices = sorted(
-                range(len(bm25_scores)),
-                key=lambda i: bm25_scores[i],
-                reverse=True
-            )[:k]
-            sparse_docs = [self.documents[i] for i in top_indices if i < len(self.documents)]
-        else:
-            sparse_docs = []
-        
-        return dense_docs, sparse_docs
-    
-    def _merge_documents(self, dense_docs: List[Document], sparse_docs: List[Document]) -> List[Document]:
-        """Merge and deduplicate documents from dense and sparse retrieval"""
-        seen_content = set()
-        merged = []
-        
-        # Weighted merge: dense (0.7) + sparse (0.3)
-        for doc in dense_docs:
-            content_hash = hash(doc.page_content)
-            if content_hash not in seen_content:
-                seen_content.add(content_hash)
-                doc.metadata["score"] = 0.7  # Dense score weight
-                merged.append(doc)
-        
-        for doc in sparse_docs:
-            content_hash = hash(doc.page_content)
-            if content_hash not in seen_content:
-                seen_content.add(content_hash)
-                doc.metadata["score"] = 0.3  # Sparse score weight
-                merged.append(doc)
-            else:
-                # Update score if already exists
-                for existing in merged:
-                    if hash(existing.page_content) == content_hash:
-                        existing.metadata["score"] = max(existing.metadata.get("score", 0), 0.3)
+    async def _hybrid_retrieval(
+        self,
+        state: IndexState,
+        query: str,
+        k: int,
+        allowed: Optional["np.ndarray"] = None,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ) -> Tuple["np.ndarray", "np.ndarray"]:
+        """Hybrid retrieval: FAISS dense + BM25 sparse (both restricted to allowed chunk ids), fused by chunk id"""
+        async def dense_retrieval() -> Tuple["np.ndarray", "np.ndarray"]:
+            query_vector = await self._embed_query(query)
+            return await self._search(
+                state.vector_store, query_vector, k, allowed, nprobe, ef_search,
+                state.metadata_store.live, state.delta_index
+            )
         
-        return merged
+        # BM25 scoring runs concurrently with query embedding and the FAISS search
+        dense, sparse = await asyncio.gather(
+            dense_retrieval(),
+            self.executor.run("sparse", self._sparse_search, state.bm25_index, query, k, allowed)
+        )
+        return self.fusion.fuse([dense, sparse])
     
-    def _rerank_with_cross_encoder(self, query: str, documents: List[Document], top_k: int) -> List[Document]:
-        """Re-rank using cross-encoder"""
-        if not self.cross_encoder:
-            return self._rerank_simple(query, documents, top_k)
-        
-        # Prepare pairs for cross-encoder
-        pairs = [[query, doc.page_content] for doc in documents]
-        
-        # Get scores
-        scores = self.cross_encoder.predict(pairs)
-        
-        # Sort by score
-        scored_docs = list(zip(documents, scores))
-        scored_docs.sort(key=lambda x: x[1], reverse=True)
-        
-        # Update document scores
-        reranked = []
-        for doc, score in scored_docs[:top_k]:
-            doc.metadata["score"] = float(score)
-            reranked.append(doc)
+    def _sparse_search(
+        self,
+        bm25_index: Optional[BM25Index],
+        query: str,
+        k: int,
+        allowed: Optional["np.ndarray"] = None
+    ) -> Tuple["np.ndarray", "np.ndarray"]:
+        """BM25 retrieval: only documents containing query terms are scored; returns (chunk_ids, scores)"""
+        if not bm25_index:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        return bm25_index.search(self.analyzer.term_ids(query).tolist(), k, allowed)
+    
+    def _rerank(
+        self,
+        store: FAISS,
+        query: str,
+        chunk_ids: Sequence[int],
+        scores: Sequence[float],
+        top_k: int,
+        use_cross_encoder: bool = True,
+        bm25_index: Optional[BM25Index] = None
+    ) -> Tuple["np.ndarray", "np.ndarray"]:
+        """Re-rank first-stage candidates (best first) with the cross-encoder, or by keyword overlap"""
+        chunk_ids = np.asarray(chunk_ids, dtype=np.int64)
+        scores = np.asarray(scores, dtype=np.float32)
+        if use_cross_encoder and CROSS_ENCODER_AVAILABLE and self.cross_encoder:
+            # Candidates are ordered by first-stage score, so the cap is a prefix
+            limit = self.cross_encoder.max_candidates or len(chunk_ids)
+            chunk_ids, scores = chunk_ids[:limit], scores[:limit]
+            ranked = self.cross_encoder.rerank(query, self._chunk_texts(store, chunk_ids.tolist()), top_k, scores)
+        else:
+            ranked = self._rerank_simple(query, self._chunk_texts(store, chunk_ids.tolist()), top_k, chunk_ids, bm25_index)
         
-        return reranked
+        positions = np.asarray([position for position, _ in ranked], dtype=np.int64)
+        return chunk_ids[positions], np.asarray([score for _, score in ranked], dtype=np.float32)
     
-    def _rerank_simple(self, query: str, documents: List[Document], top_k: int) -> List[Document]:
-        """Simple re-ranking based on keyword matching"""
+    def _rerank_simple(
+        self,
+        query: str,
+        texts: List[str],
+        top_k: int,
+        chunk_ids: Sequence[int],
+        bm25_index: Optional[BM25Index] = None
+    ) -> List[Tuple[int, float]]:
+        """Simple re-ranking based on keyword matching; returns (position, score) of the top_k texts"""
         query_lower = query.lower()
-        query_words = set(query_lower.split())
+        query_terms = set(self.analyzer.term_ids(query).tolist())
         
-        scored_docs = []
-        for doc in documents:
-            content_lower = doc.page_content.lower()
-            content_words = set(content_lower.split())
+        # Term overlap from precomputed BM25 postings (-1 = not indexed or built by another analyzer)
+        overlaps = [-1] * len(texts)
+        if bm25_index and query_terms and bm25_index.analyzer == self.analyzer.signature:
+            overlaps = bm25_index.term_overlap(list(query_terms), chunk_ids).tolist()
+        
+        scored = []
+        for position, (text, overlap) in enumerate(zip(texts, overlaps)):
+            content_lower = text.lower()
             
             # Calculate overlap score
-            overlap = len(query_words & content_words)
-            score = overlap / len(query_words) if query_words else 0
+            if overlap < 0:
+                overlap = len(query_terms & set(self.analyzer.term_ids(text).tolist()))
+            score = overlap / len(query_terms) if query_terms else 0
             
             # Boost score if query appears in content
             if query_lower in content_lower:
                 score += 0.5
             
-            scored_docs.append((doc, score))
+            scored.append((position, score))
         
         # Sort by score
-        scored_docs.sort(key=lambda x: x[1], reverse=True)
+        scored.sort(key=lambda x: x[1], reverse=True)
+        
+        return scored[:top_k]
+    
+    @staticmethod
+    def _context_entry(doc: Document) -> str:
+        """How a chunk appears in the context"""
+        return f"[{doc.metadata.get('doc_type', 'document')}] {doc.page_content}"
+    
+    def _annotate_chunks(self, documents: List[Document]):
+        """Precompute per-chunk metadata derived from the text (context token count, MinHash signature)"""
+        self._count_context_tokens(documents)
+        if BM25_AVAILABLE:
+            self._fingerprint_documents(documents)
+    
+    def _fingerprint_documents(self, documents: List[Document]):
+        """Store each chunk's MinHash signature in its metadata (term ids come from the token cache BM25 reuses)"""
+        pending = [doc for doc in documents if "minhash" not in doc.metadata]
+        if not pending:
+            return
+        streams = self._analyze_documents([doc.page_content for doc in pending])
+        for doc, stream in zip(pending, streams):
+            # Chunks too short to sign get None and are only matched by exact text
+            doc.metadata["minhash"] = minhash(stream)
+    
+    async def filter_near_duplicates(
+        self,
+        documents: List[Document],
+        department: Optional[str] = None,
+        uploaded_by: Optional[int] = None
+    ) -> Tuple[List[Document], Dict]:
+        """
+        Drop chunks that nearly duplicate an earlier chunk of the same upload
+        or an indexed chunk of any document with the same visibility
         
-        # Update document scores
-        reranked = []
-        for doc, score in scored_docs[:top_k]:
-            doc.metadata["score"] = score
-            reranked.append(doc)
+        Only indexed chunks with the same doc_type, department and uploader
+        are compared, so a skipped chunk stays readable by everyone allowed
+        to see it. Matches report the document they fall back on; deleting
+        that document should re-index this one.
         
-        return reranked
+        Returns:
+            (chunks to index, deduplication report of this upload)
+        """
+        if not self._initialized:
+            await self.initialize()
+        
+        report = {"chunks": len(documents), "indexed": len(documents), "skipped": 0, "duplicates": []}
+        if settings.NEAR_DUPLICATE_MODE == "off" or not BM25_AVAILABLE or not documents:
+            return documents, report
+        
+        scope = {"doc_type": "file", "department": department, "uploaded_by": uploaded_by}
+        duplicates = await self.executor.run(
+            "dedupe", self._find_near_duplicates, self._state, documents, scope
+        )
+        kept = [doc for position, doc in enumerate(documents) if position not in duplicates]
+        report.update(
+            indexed=len(kept),
+            skipped=len(duplicates),
+            duplicates=[{"position": position, **match} for position, match in sorted(duplicates.items())]
+        )
+        self.dedupe_stats["uploads"] += 1
+        self.dedupe_stats["chunks"] += len(documents)
+        self.dedupe_stats["skipped"] += len(duplicates)
+        return kept, report
+    
+    def _find_near_duplicates(
+        self,
+        state: Optional[IndexState],
+        documents: List[Document],
+        scope: Dict
+    ) -> Dict[int, Dict]:
+        """Positions of near-duplicate chunks -> what they duplicate (chunk id and document, or earlier position) and the estimated similarity"""
+        self._fingerprint_documents(documents)
+        threshold = settings.NEAR_DUPLICATE_THRESHOLD
+        indexed = self._signature_index(state) if state is not None else None
+        
+        def visible_alike(chunk_id: int) -> bool:
+            return state.metadata_store.same_scope(chunk_id, scope)
+        
+        def indexed_match(chunk_id: int, similarity: float) -> Dict:
+            metadata = state.chunk_store.metadata(chunk_id) or {}
+            return {"duplicate_of": chunk_id, "document_id": metadata.get("document_id"), "similarity": similarity}
+        
+        duplicates: Dict[int, Dict] = {}
+        upload = MinHashLSH()
+        kept_texts: Dict[str, int] = {}
+        for position, doc in enumerate(documents):
+            # Exact repeats are caught even when a chunk is too short to sign
+            chunk_id = state.chunk_store.chunk_id_of(doc.page_content) if state is not None else -1
+            if chunk_id >= 0 and visible_alike(chunk_id):
+                duplicates[position] = indexed_match(chunk_id, 1.0)
+                continue
+            if doc.page_content in kept_texts:
+                duplicates[position] = {"duplicate_of_position": kept_texts[doc.page_content], "similarity": 1.0}
+                continue
+            
+            kept_texts[doc.page_content] = position
+            signature = doc.metadata.get("minhash")
+            if not signature:
+                continue
+            match = indexed.most_similar(signature, threshold, visible_alike) if indexed is not None else None
+            if match is not None:
+                duplicates[position] = indexed_match(*match)
+                continue
+            match = upload.most_similar(signature, threshold)
+            if match is not None:
+                duplicates[position] = {"duplicate_of_position": match[0], "similarity": match[1]}
+                continue
+            upload.add([position], [signature])
+        
+        return duplicates
+    
+    def _signature_index(self, state: IndexState) -> MinHashLSH:
+        """
+        LSH buckets covering every chunk of a generation
+        
+        Chunks indexed by this process (or replayed from the log) enter the
+        buckets as they are added; a loaded or rebuilt snapshot is scanned
+        once for chunks not seen yet. Removed chunks stay in the buckets
+        and are rejected by the caller's liveness check.
+        """
+        with self._signature_lock:
+            if self._signature_snapshot != state.snapshot_version:
+                ids = np.asarray(state.chunk_store.ids(), dtype=np.int64)
+                missing, signatures = [], []
+                for chunk_id in ids[~np.isin(ids, self.signature_index.keys())].tolist():
+                    signature = (state.chunk_store.metadata(chunk_id) or {}).get("minhash")
+                    if signature:
+                        missing.append(chunk_id)
+                        signatures.append(signature)
+                self.signature_index.add(missing, signatures)
+                self._signature_snapshot = state.snapshot_version
+        return self.signature_index
+    
+    def _count_context_tokens(self, documents: List[Document], model: str = CONTEXT_TOKEN_MODEL):
+        """Store each chunk's context token count in its metadata (once, at index time)"""
+        if self._tokenizer_failed_at is not None and time.monotonic() - self._tokenizer_failed_at < TOKENIZER_RETRY_SECONDS:
+            return
+        try:
+            encoding = get_encoding(model)
+        except Exception as e:
+            # Tokenizer unavailable (e.g. BPE file not downloadable): format_context counts on demand
+            self._tokenizer_failed_at = time.monotonic()
+            APILogger.log_error("/rag/token_count", e, None, ErrorCategory.AI_ERROR)
+            return
+        
+        key = token_count_key(encoding.name)
+        pending = [doc for doc in documents if key not in doc.metadata]
+        encoded = encoding.encode_ordinary_batch([self._context_entry(doc) for doc in pending])
+        for doc, tokens in zip(pending, encoded):
+            doc.metadata[key] = len(tokens)
     
     def format_context(
         self,
         documents: List[Document],
         max_tokens: int = 2000,
-        model: str = "gpt-3.5-turbo"
+        model: str = CONTEXT_TOKEN_MODEL
     ) -> str:
-        """Format documents as context with token limit"""
-        try:
-            encoding = tiktoken.encoding_for_model(model)
-        except KeyError:
-            encoding = tiktoken.get_encoding("cl100k_base")
+        """
+        Format documents as context with token limit
+        
+        Greedy fill in rank order: a chunk that does not fit is skipped and
+        later (smaller) ones may still be packed. Token counts come from the
+        chunk metadata; only chunks indexed without one are encoded here.
+        """
+        encoding = get_encoding(model)
+        key = token_count_key(encoding.name)
         
         context_parts = []
         current_tokens = 0
         
         for doc in documents:
-            doc_text = f"[{doc.metadata.get('doc_type', 'document')}] {doc.page_content}"
-            doc_tokens = len(encoding.encode(doc_text))
+            doc_text = self._context_entry(doc)
+            doc_tokens = doc.metadata.get(key)
+            if doc_tokens is None:
+                doc_tokens = len(encoding.encode_ordinary(doc_text))
             
             if current_tokens + doc_tokens > max_tokens:
-                break
+                continue
             
             context_parts.append(doc_text)
             current_tokens += doc_tokens
@@ -419,7 +1889,8 @@ class RAGService:
         self,
         documents: List[Document],
         document_id: Optional[int] = None,
-        department: Optional[str] = None
+        department: Optional[str] = None,
+        uploaded_by: Optional[int] = None
     ) -> bool:
         """
         Add documents to FAISS index dynamically
@@ -428,6 +1899,7 @@ class RAGService:
             documents: List of LangChain Document objects
             document_id: Optional document ID from database
             department: Optional department name for per-dept index
+            uploaded_by: Optional uploader user ID (used for ACL filtering)
         """
         if not self._initialized:
             await self.initialize()
@@ -442,36 +1914,28 @@ class RAGService:
                     doc.metadata["document_id"] = document_id
                 if department:
                     doc.metadata["department"] = department
+                if uploaded_by is not None:
+                    doc.metadata["uploaded_by"] = uploaded_by
                 doc.metadata["doc_type"] = "file"
             
-            # Add to main index
-            self.vector_store.add_documents(documents)
-            self.documents.extend(documents)
-            
-            # Update BM25 index
-            if BM25_AVAILABLE:
-                new_corpus = [doc.page_content.lower().split() for doc in documents]
-                if self.bm25_index:
-                    # Rebuild BM25 index with new documents
-                    corpus = [doc.page_content.lower().split() for doc in self.documents]
-                    self.bm25_index = BM25Okapi(corpus)
-                else:
-                    self.bm25_index = BM25Okapi(new_corpus)
+            # Token counts and fingerprints travel with the chunk metadata (log, chunk store, snapshots)
+            await self.executor.run("annotate", self._annotate_chunks, documents)
             
-            # Add to department-specific index if provided
-            if department:
-                if department not in self.department_indexes:
-                    # Create new department index
-                    dept_index = FAISS.from_documents(documents, self.embeddings)
-                    self.department_indexes[department] = dept_index
-                    self.department_documents[department] = documents.copy()
-                else:
-                    # Add to existing department index
-                    self.department_indexes[department].add_documents(documents)
-                    self.department_documents[department].extend(documents)
+            # Embed once; main and department indexes share vectors and chunk ids
+            vectors = await self.executor.run(
+                "embed_documents",
+                self._embed_documents,
+                [doc.page_content for doc in documents]
+            )
             
-            # Save updated index
-            self.vector_store.save_local(str(VECTORSTORE_PATH))
+            # Writers take turns; searches keep reading the published generation meanwhile
+            async with self._write_lock:
+                version = await self.executor.run(
+                    "index_update", self._apply_added_documents, vectors, documents, department
+                )
+            await self.index_sync.notify(version)
+            self._schedule_bm25_compaction()
+            self._schedule_snapshot()
             
             return True
         
@@ -486,44 +1950,84 @@ class RAGService:
             )
             return False
     
+    def _apply_added_documents(self, vectors, documents: List[Document], department: Optional[str]) -> int:
+        """Add embedded chunks to the main, BM25 and department indexes and persist them; returns the index version"""
+        with self.snapshots.lock():
+            # Chunk ids and versions continue from what other processes wrote
+            self._sync_locked()
+            # Build the next generation off to the side and publish it in one step
+            state = self._next_generation()
+            ids = self._allocate_chunk_ids(state, len(documents))
+            state.index_version += 1
+            # Main index changes are logged (I/O proportional to the upload) and snapshotted later
+            self.wal.append_add(ids, vectors, documents, state.index_version)
+            self._add_main_chunks(state, ids, vectors, documents)
+            self._publish(state)
+            self._add_department_chunks(department, ids, vectors, documents)
+            self._snapshot_if_due()
+        return state.index_version
+    
+    def _add_department_chunks(self, department: Optional[str], ids: List[int], vectors, documents: List[Document]):
+        """Add embedded chunks to a department index (replaced, not changed) and persist it"""
+        
+        if not department:
+            return
+        with self._department_lock:
+            dept_index = self._get_department_index(department)
+            if dept_index is None:
+                # Create new department index
+                dept_index = self._create_vector_store(len(vectors[0]))
+                before = []
+            else:
+                dept_index = self._clone_store(dept_index)
+                before = self.department_documents.get(department, [])
+            self._add_vectors(dept_index, ids, vectors, documents)
+            self.department_indexes[department] = dept_index
+            self.department_documents[department] = before + documents
+            self._department_last_used[department] = time.monotonic()
+            self._save_department_index(department)
+            self._evict_department_indexes(time.monotonic())
+    
+    def _add_main_chunks(self, state: IndexState, ids: List[int], vectors, documents: List[Document]):
+        """Add embedded chunks to the main and BM25 indexes of an unpublished generation"""
+        # Add to the delta of the main index (the chunk store is its docstore); the snapshot index is shared
+        if state.delta_index is None:
+            state.delta_index = create_index(state.vector_store.index.d)
+        self._add_vectors(state.vector_store, ids, vectors, documents, index=state.delta_index)
+        self._register_chunks(state, ids, [doc.metadata for doc in documents])
+        if self.signature_index is not None:
+            signed = [(chunk_id, doc.metadata["minhash"]) for chunk_id, doc in zip(ids, documents) if doc.metadata.get("minhash")]
+            self.signature_index.add([chunk_id for chunk_id, _ in signed], [signature for _, signature in signed])
+        
+        # Update BM25 index incrementally (append a segment, no corpus rebuild)
+        if BM25_AVAILABLE:
+            if state.bm25_index is None:
+                state.bm25_index = BM25Index(analyzer=self.analyzer.signature)
+            self._add_to_bm25_index(state.bm25_index, ids, documents)
+    
     async def remove_document(self, document_id: int) -> bool:
         """
         Remove document from FAISS index
         
-        Note: FAISS doesn't support deletion directly, so we rebuild the index
+        Vectors are deleted by chunk id (tombstoned in the main index until
+        the next snapshot), nothing is re-embedded. The BM25 index and
+        per-department indexes are updated with the same ids.
         """
         if not self._initialized:
             return False
         
         try:
-            # Filter out documents with matching document_id
-            original_count = len(self.documents)
-            self.documents = [
-                doc for doc in self.documents
-                if doc.metadata.get("document_id") != document_id
-            ]
-            
-            if len(self.documents) == original_count:
+            if self._state is None or document_id not in self._state.document_chunks:
                 # No documents removed
                 return False
             
-            # Rebuild FAISS index
-            if self.documents:
-                self.vector_store = FAISS.from_documents(self.documents, self.embeddings)
-            else:
-                # Empty index
-                self.vector_store = None
-            
-            # Rebuild BM25 index
-            if BM25_AVAILABLE and self.documents:
-                corpus = [doc.page_content.lower().split() for doc in self.documents]
-                self.bm25_index = BM25Okapi(corpus)
-            else:
-                self.bm25_index = None
-            
-            # Save updated index
-            if self.vector_store:
-                self.vector_store.save_local(str(VECTORSTORE_PATH))
+            async with self._write_lock:
+                version = await self.executor.run("index_update", self._apply_removed_document, document_id)
+            if version is None:
+                return False
+            await self.index_sync.notify(version)
+            self._schedule_bm25_compaction()
+            self._schedule_snapshot()
             
             return True
         
@@ -537,64 +2041,190 @@ class RAGService:
             )
             return False
     
+    def _apply_removed_document(self, document_id: int) -> Optional[int]:
+        """Delete a document's chunks from the main, BM25 and department indexes and persist them; returns the index version"""
+        with self.snapshots.lock():
+            self._sync_locked()
+            if document_id not in self._state.document_chunks:
+                # Removed by a concurrent request or another process
+                return None
+            
+            state = self._next_generation()
+            ids = state.document_chunks.pop(document_id)
+            state.index_version += 1
+            self.wal.append_remove(ids, document_id, state.index_version)
+            removed_metadata = self._remove_main_chunks(state, ids)
+            self._publish(state)
+            self._remove_department_chunks({metadata.get("department") for metadata in removed_metadata}, ids)
+            self._snapshot_if_due()
+        return state.index_version
+    
+    def _remove_department_chunks(self, departments: Set[str], ids: List[int]):
+        """Delete chunks from department indexes (replaced, not changed) and persist them"""
+        for department in departments:
+            if not department:
+                continue
+            with self._department_lock:
+                dept_index = self._get_department_index(department)
+                if dept_index is None or not any(chunk_id in dept_index.index_to_docstore_id for chunk_id in ids):
+                    continue
+                dept_index = self._clone_store(dept_index)
+                self._remove_vectors(dept_index, ids)
+                self.department_indexes[department] = dept_index
+                self.department_documents[department] = self._store_documents(dept_index)[1]
+                self._save_department_index(department)
+    
+    def _remove_main_chunks(self, state: IndexState, ids: List[int]) -> List[Dict]:
+        """Delete chunks from the main and BM25 indexes of an unpublished generation; returns their metadata"""
+        removed_metadata = self._unregister_chunks(state, ids)
+        
+        # Vectors added since the snapshot leave the delta; snapshot vectors are
+        # tombstoned (dropped from the id mapping and chunk store) until the next snapshot
+        store = state.vector_store
+        present = [chunk_id for chunk_id in ids if chunk_id in store.index_to_docstore_id]
+        delta_ids = set(faiss.vector_to_array(state.delta_index.id_map).tolist()) if state.delta_index is not None else set()
+        added = [chunk_id for chunk_id in present if chunk_id in delta_ids]
+        if added:
+            state.delta_index.remove_ids(np.asarray(added, dtype=np.int64))
+        state.tombstones.update(chunk_id for chunk_id in present if chunk_id not in delta_ids)
+        store.docstore.delete([store.index_to_docstore_id.pop(chunk_id) for chunk_id in present])
+        
+        # Tombstone in BM25 index (IDF statistics are updated incrementally)
+        if state.bm25_index:
+            state.bm25_index.remove(ids)
+        return removed_metadata
+    
     async def retrieve_with_self_rag(
         self,
         query: str,
         k: int = 50,
         top_k: int = 5,
         confidence_threshold: float = 0.5,
-        department: Optional[str] = None
+        department: Optional[str] = None,
+        metadata_filter: Optional[MetadataFilter] = None,
+        deadline: Optional[float] = None
     ) -> Tuple[List[Document], List[Dict], bool]:
         """
-        Self-RAG: If no confident documents found, expand query and retry
+        Self-RAG: If no confident documents found, retry with expanded query variants
+        
+        The variants are embedded and searched in the same batch as the
+        original query (one embedding forward pass, one index.search), so a
+        retry costs one fusion and one re-rank of the pooled candidates
+        (cross-encoder scores of candidates already ranked come from its
+        cache), not a second retrieval. The deadline bounds the whole retry:
+        variants are not searched once it has passed, and a re-rank still
+        running when it passes (or failing) is abandoned for the original
+        query's results.
+        
+        Args:
+            deadline: Seconds after which the retry is skipped
+                (default SELF_RAG_DEADLINE_MS, 0 = no deadline)
         
         Returns:
             (documents, used_documents_metadata, expanded)
         """
-        # Initial retrieval
-        docs, used_docs = await self.retrieve(
-            query,
-            k=k,
-            top_k=top_k,
-            use_hybrid=True,
-            use_rerank=True
-        )
+        started = time.perf_counter()
+        if deadline is None and settings.SELF_RAG_DEADLINE_MS > 0:
+            deadline = settings.SELF_RAG_DEADLINE_MS / 1000.0
+        
+        if not self._initialized:
+            await self.initialize()
+        
+        state = self._state
+        if state is None:
+            return [], [], False
+        
+        expanded = False
+        allowed = None
+        if metadata_filter is not None and not metadata_filter.is_empty:
+            allowed = state.metadata_store.mask(metadata_filter)
+            if not allowed.any():
+                return [], [], False
+        
+        def remaining() -> Optional[float]:
+            return None if deadline is None else deadline - (time.perf_counter() - started)
+        
+        # The variants share the original query's first stage, only while there is budget left
+        queries = [query]
+        if remaining() is None or remaining() > 0:
+            queries += self._expand_query_variants(query)
+        pools = await self._first_stage_many(state, queries, k, allowed)
+        
+        # Initial ranking from the original query's candidates
+        pool = pools[0]
+        chunk_ids, scores = await self._rerank_candidates(state, query, *self.fusion.fuse(pool), top_k)
         
         # Check confidence (based on top score)
-        if used_docs and used_docs[0].get("score", 0) >= confidence_threshold:
-            return docs, used_docs, False
-        
-        # Low confidence - expand query
-        expanded_query = self._expand_query_for_retry(query)
-        
-        # Retry with expanded query
-        expanded_docs, expanded_used_docs = await self.retrieve(
-            expanded_query,
-            k=k * 2,  # Get more candidates
-            top_k=top_k,
-            use_hybrid=True,
-            use_rerank=True
-        )
+        confident = len(scores) > 0 and scores[0] >= confidence_threshold
+        budget = remaining()
         
-        # Use expanded results if better
-        if expanded_used_docs and expanded_used_docs[0].get("score", 0) > used_docs[0].get("score", 0):
-            return expanded_docs, expanded_used_docs, True
+        if not confident and len(pools) > 1 and (budget is None or budget > 0):
+            # Low confidence - fuse all candidate pools and re-rank them once against the query
+            expanded_scores = []
+            try:
+                pooled = self.fusion.fuse([ranking for rankings in pools for ranking in rankings])
+                expanded_ids, expanded_scores = await asyncio.wait_for(
+                    self._rerank_candidates(state, query, *pooled, top_k), budget
+                )
+            except asyncio.TimeoutError:
+                # Out of budget: keep the original query's results
+                pass
+            except Exception as e:
+                APILogger.log_error("/rag/self_rag", e, None, ErrorCategory.AI_ERROR)
+            
+            # Use expanded results if better
+            if len(expanded_scores) > 0 and (len(scores) == 0 or expanded_scores[0] > scores[0]):
+                chunk_ids, scores, expanded = expanded_ids, expanded_scores, True
         
-        return docs, used_docs, False
+        docs, used_docs = self._used_documents(state, chunk_ids, scores)
+        return docs, used_docs, expanded
     
-    def _expand_query_for_retry(self, query: str) -> str:
-        """Expand query for Self-RAG retry"""
+    def _expand_query_variants(self, query: str) -> List[str]:
+        """Expanded query variants for the Self-RAG retry"""
         # Add synonyms and related terms
-        expansions = [
-            query,
+        return [
             f"{query} detaylı bilgi",
-            f"{query} açıklama",
-            f"{query} örnek",
-            f"{query} nasıl"
+            f"{query} açıklama"
         ]
+    
+    async def _first_stage_many(
+        self,
+        state: IndexState,
+        queries: List[str],
+        k: int,
+        allowed: Optional["np.ndarray"] = None
+    ) -> List[List[Tuple["np.ndarray", "np.ndarray"]]]:
+        """(dense, sparse) rankings per query: one embedding batch, one index.search, BM25 alongside"""
+        async def dense_retrieval() -> List[Tuple["np.ndarray", "np.ndarray"]]:
+            query_vectors = await self._embed_queries(queries)
+            return await self.executor.run(
+                "dense", self._dense_search_batch, state.vector_store, query_vectors, k, allowed,
+                None, None, state.metadata_store.live, state.delta_index
+            )
+        
+        if not (BM25_AVAILABLE and state.bm25_index):
+            return [[ranking] for ranking in await dense_retrieval()]
         
-        # Combine expansions
-        return " ".join(expansions[:3])  # Use first 3 expansions
+        dense, sparse = await asyncio.gather(
+            dense_retrieval(),
+            self.executor.run("sparse", lambda: [self._sparse_search(state.bm25_index, q, k, allowed) for q in queries])
+        )
+        return [[dense_ranking, sparse_ranking] for dense_ranking, sparse_ranking in zip(dense, sparse)]
+    
+    async def _rerank_candidates(
+        self,
+        state: IndexState,
+        query: str,
+        chunk_ids: "np.ndarray",
+        scores: "np.ndarray",
+        top_k: int
+    ) -> Tuple["np.ndarray", "np.ndarray"]:
+        """Re-rank fused candidates of the main index on the executor (top_k prefix if there are few)"""
+        if len(chunk_ids) > top_k:
+            return await self.executor.run(
+                "rerank", self._rerank, state.vector_store, query, chunk_ids, scores, top_k, True, state.bm25_index
+            )
+        return chunk_ids[:top_k], scores[:top_k]
     
     async def retrieve_by_department(
         self,
@@ -609,31 +2239,39 @@ class RAGService:
         Returns:
             (documents, used_documents_metadata)
         """
-        if department not in self.department_indexes:
+        if not self._initialized:
+            await self.initialize()
+        
+        # A department index that is not loaded yet is read from disk: keep that off the event loop
+        dept_index = await self.executor.run("department_load", self._get_department_index, department)
+        if dept_index is None:
             # Fallback to main index
             return await self.retrieve(query, k=k, top_k=top_k)
         
-        dept_index = self.department_indexes[department]
-        dept_docs = self.department_documents.get(department, [])
-        
         # Retrieve from department index
-        docs = dept_index.similarity_search(query, k=k)
+        # Updates replace the department store rather than change it, so this one stays consistent
+        query_vector = await self._embed_query(query)
+        chunk_ids, scores = await self._search(dept_index, query_vector, k)
         
         # Re-rank
-        if len(docs) > top_k:
-            docs = self._rerank_simple(query, docs, top_k)
+        if len(chunk_ids) > top_k:
+            chunk_ids, scores = await self.executor.run(
+                "rerank", self._rerank, dept_index, query, chunk_ids, scores, top_k, False, self.bm25_index
+            )
         else:
-            docs = docs[:top_k]
+            chunk_ids, scores = chunk_ids[:top_k], scores[:top_k]
+        ranked = self._ranked_documents(dept_index, chunk_ids, scores)
         
         # Build used_documents metadata
+        docs = [doc for _, doc, _ in ranked]
         used_documents = []
-        for idx, doc in enumerate(docs):
+        for idx, (_, doc, score) in enumerate(ranked):
             metadata = doc.metadata
             used_documents.append({
                 "doc_id": metadata.get("document_id", f"doc_{idx}"),
                 "title": metadata.get("title", f"Document {idx+1}"),
                 "chunk_id": idx,
-                "score": metadata.get("score", 1.0 - (idx * 0.1)),
+                "score": score,
                 "doc_type": metadata.get("doc_type", "file"),
                 "department": department,
                 "source": "department_index"
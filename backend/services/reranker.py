@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Reranker
+Description: Cross-encoder re-ranking with a candidate cap, explicit batching/truncation and a score LRU.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def _digest(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+
+
+class CrossEncoderReranker:
+    """
+    Bounded cross-encoder scoring of first-stage candidates.
+
+    Only the ``max_candidates`` best candidates by first-stage (fused)
+    score are sent to the model, in batches of ``batch_size``. Pairs are
+    truncated to ``max_length`` tokens by the model's tokenizer; passage
+    text is also cut to a character budget first so very long chunks are
+    not tokenized in full only to be truncated. Scores are cached in an
+    LRU keyed by (query hash, chunk hash), so repeated and overlapping
+    queries only score new pairs.
+
+    Thread-safe: called from the retrieval executor threads.
+    """
+
+    # Generous upper bound on characters per token, so the cut never drops text the tokenizer would keep
+    CHARS_PER_TOKEN = 8
+
+    def __init__(
+        self,
+        model,
+        max_candidates: int = 30,
+        batch_size: int = 32,
+        max_length: int = 256,
+        cache_size: int = 20000
+    ):
+        self.model = model
+        self.max_candidates = max_candidates
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.cache_size = cache_size
+        self._scores: "OrderedDict[bytes, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    def score(self, query: str, texts: Sequence[str]) -> np.ndarray:
+        """Cross-encoder scores of (query, chunk text) pairs, served from the LRU where cached"""
+        query_digest = _digest(self.normalize(query))
+        keys = [query_digest + _digest(text) for text in texts]
+        scores = np.zeros(len(texts), dtype=np.float32)
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                cached = self._scores.get(key)
+                if cached is None:
+                    missing.append(i)
+                else:
+                    self._scores.move_to_end(key)
+                    scores[i] = cached
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            max_chars = self.max_length * self.CHARS_PER_TOKEN
+            pairs = [[query, texts[i][:max_chars]] for i in missing]
+            predicted = np.asarray(
+                self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False),
+                dtype=np.float32
+            ).reshape(-1)
+            scores[missing] = predicted
+            with self._lock:
+                for i, value in zip(missing, predicted.tolist()):
+                    self._scores[keys[i]] = value
+                    self._scores.move_to_end(keys[i])
+                while len(self._scores) > self.cache_size:
+                    self._scores.popitem(last=False)
+        return scores
+
+    def rerank(
+        self,
+        query: str,
+        texts: Sequence[str],
+        top_k: int,
+        first_stage_scores: Optional[Sequence[float]] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Top-k (position in texts, score) by cross-encoder score
+
+        Candidates beyond ``max_candidates`` are dropped by
+        ``first_stage_scores`` (highest first), or by input order if none.
+        """
+        positions = np.arange(len(texts))
+        if self.max_candidates and len(texts) > self.max_candidates:
+            if first_stage_scores is None:
+                positions = positions[:self.max_candidates]
+            else:
+                order = np.argsort(-np.asarray(first_stage_scores, dtype=np.float64), kind="stable")
+                positions = order[:self.max_candidates]
+        if positions.size == 0:
+            return []
+
+        scores = self.score(query, [texts[i] for i in positions.tolist()])
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        return [(int(positions[i]), float(scores[i])) for i in order.tolist()]
+
+    def stats(self) -> Dict[str, float]:
+        """Score cache counters"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._scores),
+            "max_size": self.cache_size,
+            "max_candidates": self.max_candidates,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
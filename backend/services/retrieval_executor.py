@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Retrieval Executor
+Description: Bounded thread pool for CPU-bound retrieval stages (embedding, FAISS, BM25, re-ranking).
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from core.config import get_settings
+
+settings = get_settings()
+
+
+class RetrievalExecutor:
+    """
+    Runs blocking retrieval work off the event loop.
+
+    FAISS, NumPy/SciPy and PyTorch release the GIL in their kernels, so a
+    thread pool gives real parallelism without pickling indexes into
+    worker processes. ``max_concurrency`` bounds how many stages may be
+    queued or running at once; further callers wait on a semaphore (in the
+    event loop, without blocking it), which keeps latency bounded under
+    bursts instead of growing an unbounded executor queue.
+
+    Metrics: calls waiting for a slot (``waiting``), submitted but not yet
+    started (``queued``), running (``active``), and per-stage call counts,
+    total run time and total wait time.
+    """
+
+    def __init__(self, max_workers: int = 4, max_concurrency: int = 16):
+        self.max_workers = max_workers
+        self.max_concurrency = max_concurrency
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.queued = 0
+        self.active = 0
+        self._stages: Dict[str, Dict[str, float]] = {}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="retrieval")
+        return self._executor
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _record(self, stage: str, run_seconds: float, wait_seconds: float):
+        with self._lock:
+            stats = self._stages.setdefault(stage, {"calls": 0, "run_seconds": 0.0, "wait_seconds": 0.0})
+            stats["calls"] += 1
+            stats["run_seconds"] += run_seconds
+            stats["wait_seconds"] += wait_seconds
+
+    async def run(self, stage: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run ``fn(*args, **kwargs)`` on the pool and await its result"""
+        submitted = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._get_semaphore().acquire()
+        finally:
+            self.waiting -= 1
+
+        try:
+            with self._lock:
+                self.queued += 1
+            # Thread start time; False once the caller gave up before a thread picked the call up
+            state: Dict[str, Any] = {"started": None}
+
+            def call():
+                with self._lock:
+                    if state["started"] is False:
+                        return None
+                    state["started"] = time.perf_counter()
+                    self.queued -= 1
+                    self.active += 1
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    with self._lock:
+                        self.active -= 1
+
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(self._get_executor(), call)
+            finally:
+                with self._lock:
+                    started = state["started"]
+                    if started is None:
+                        state["started"] = False
+                        self.queued -= 1
+                if started:
+                    self._record(stage, time.perf_counter() - started, started - submitted)
+        finally:
+            self._get_semaphore().release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and per-stage timing"""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_concurrency": self.max_concurrency,
+                "waiting": self.waiting,
+                "queued": self.queued,
+                "active": self.active,
+                "stages": {stage: dict(values) for stage, values in self._stages.items()}
+            }
+
+    def shutdown(self):
+        """Stop the worker threads (application shutdown)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-item calls into one batched executor call.
+
+    The first item for a key opens a window of ``window_ms``; items for
+    the same key arriving within it (up to ``max_batch_size``, which
+    flushes immediately) are passed together to
+    ``batch_fn(key, items) -> results`` on the retrieval executor, and
+    each caller awaits its own result. Used for query embedding (one
+    forward pass per batch) and unfiltered FAISS search (one
+    ``index.search`` per batch); the key separates calls that cannot share
+    a batch, e.g. different indexes or search parameters.
+    """
+
+    def __init__(
+        self,
+        stage: str,
+        batch_fn: Callable[[Hashable, List[Any]], List[Any]],
+        executor: RetrievalExecutor,
+        window_ms: float = 2.0,
+        max_batch_size: int = 32
+    ):
+        self.stage = stage
+        self.batch_fn = batch_fn
+        self.executor = executor
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self._pending: Dict[Hashable, List[Tuple[Any, asyncio.Future]]] = {}
+        self._timers: Dict[Hashable, asyncio.TimerHandle] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item: Any, key: Hashable = None) -> Any:
+        """Queue one item and await its result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(key, [])
+        pending.append((item, future))
+        if len(pending) >= self.max_batch_size:
+            self._flush(key)
+        elif len(pending) == 1:
+            self._timers[key] = loop.call_later(self.window, self._flush, key)
+        return await future
+
+    def _flush(self, key: Hashable):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = [entry for entry in self._pending.pop(key, []) if not entry[1].done()]
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._run(key, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key: Hashable, batch: List[Tuple[Any, asyncio.Future]]):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await self.executor.run(self.stage, self.batch_fn, key, [item for item, _ in batch])
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        """Batch count and mean batch size"""
+        return {
+            "window_ms": self.window * 1000.0,
+            "max_batch_size": self.max_batch_size,
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0
+        }
+
+
+# Global instance
+retrieval_executor = RetrievalExecutor(
+    max_workers=settings.RETRIEVAL_EXECUTOR_WORKERS,
+    max_concurrency=settings.RETRIEVAL_MAX_CONCURRENCY
+)
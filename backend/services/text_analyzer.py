@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Text Analyzer
+Description: Pluggable analyzer pipelines (Turkish casefolding, punctuation, stopwords, light stemming) producing term ids for sparse retrieval.
+"""
+import hashlib
+import re
+import unicodedata
+from typing import Callable, List, Sequence
+
+import numpy as np
+
+# Bump when a step changes its output, so persisted term ids are rebuilt
+ANALYZER_VERSION = 1
+
+# A char filter rewrites the text, a tokenizer splits it, a token filter rewrites the token list
+CharFilter = Callable[[str], str]
+Tokenizer = Callable[[str], List[str]]
+TokenFilter = Callable[[List[str]], List[str]]
+
+_TURKISH_CASE = str.maketrans({"I": "ı", "İ": "i", "Â": "a", "â": "a", "Î": "i", "î": "i", "Û": "u", "û": "u"})
+# Suffix after an apostrophe (Ankara'da, İstanbul'un) is inflection of a proper noun
+_APOSTROPHE_SUFFIX = re.compile(r"(\w)['’`]\w+")
+_WORD = re.compile(r"\w+")
+
+TURKISH_STOPWORDS = frozenset("""
+acaba ama ancak artık aslında az bazı belki ben beni benim bile bir biraz birçok biri birkaç birşey
+biz bize bizi bizim bu buna bunda bundan bunlar bunları bunu bunun burada çok çünkü da daha de defa
+değil diye diğer dolayı en gibi hem hep hepsi her hiç için ile ise işte ki kim kime kimi mı mi mu mü
+nasıl ne neden nerde nerede nereye niye niçin o olan olarak oldu olduğu olduğunu olmak olur ona ondan
+onlar onları onu onun orada öyle pek sadece sanki şey siz şu şuna şunda şundan şunu tüm ve veya ya yani
+""".split())
+
+# Inflectional suffixes stripped by the light stemmer (longest match first)
+_TURKISH_SUFFIXES = sorted([
+    "larından", "lerinden", "larının", "lerinin", "ları", "leri", "lar", "ler",
+    "ndan", "nden", "dan", "den", "tan", "ten",
+    "nın", "nin", "nun", "nün",
+    "nda", "nde", "da", "de", "ta", "te",
+    "yla", "yle",
+    "ya", "ye", "yı", "yi", "yu", "yü",
+    "sı", "si", "su", "sü"
+], key=len, reverse=True)
+_MIN_STEM_LENGTH = 3
+
+
+def turkish_casefold(text: str) -> str:
+    """Lowercase with Turkish dotted/dotless i (I -> ı, İ -> i) and circumflexes folded"""
+    return unicodedata.normalize("NFC", text).translate(_TURKISH_CASE).lower()
+
+
+def strip_apostrophe_suffixes(text: str) -> str:
+    return _APOSTROPHE_SUFFIX.sub(r"\1", text)
+
+
+def word_tokenizer(text: str) -> List[str]:
+    """Runs of letters and digits; punctuation never sticks to a token"""
+    return _WORD.findall(text)
+
+
+def whitespace_tokenizer(text: str) -> List[str]:
+    return text.split()
+
+
+def remove_turkish_stopwords(tokens: List[str]) -> List[str]:
+    return [token for token in tokens if token not in TURKISH_STOPWORDS]
+
+
+def turkish_light_stem(tokens: List[str]) -> List[str]:
+    """Strip up to two inflectional suffixes, keeping at least three letters"""
+    stemmed = []
+    for token in tokens:
+        for _ in range(2):
+            for suffix in _TURKISH_SUFFIXES:
+                if token.endswith(suffix) and len(token) - len(suffix) >= _MIN_STEM_LENGTH:
+                    token = token[:-len(suffix)]
+                    break
+            else:
+                break
+        stemmed.append(token)
+    return stemmed
+
+
+def term_id(term: str) -> int:
+    """Stable 64-bit id of a term (the same in every process, no shared vocabulary needed)"""
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class Analyzer:
+    """
+    Text -> terms: char filters, a tokenizer, then token filters.
+
+    Every step is a plain function, so pipelines are assembled from
+    pluggable parts. ``signature`` names the pipeline; indexes and caches
+    of term ids record it and are rebuilt when it changes.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        tokenizer: Tokenizer,
+        char_filters: Sequence[CharFilter] = (),
+        token_filters: Sequence[TokenFilter] = ()
+    ):
+        self.name = name
+        self.tokenizer = tokenizer
+        self.char_filters = list(char_filters)
+        self.token_filters = list(token_filters)
+
+    @property
+    def signature(self) -> str:
+        steps = [step.__name__ for step in self.char_filters + [self.tokenizer] + self.token_filters]
+        return f"{self.name}-v{ANALYZER_VERSION}-" + "+".join(steps)
+
+    def analyze(self, text: str) -> List[str]:
+        for char_filter in self.char_filters:
+            text = char_filter(text)
+        tokens = self.tokenizer(text)
+        for token_filter in self.token_filters:
+            tokens = token_filter(tokens)
+        return tokens
+
+    def term_ids(self, text: str) -> np.ndarray:
+        """Analyzed terms of a text as uint64 term ids, in text order"""
+        return np.fromiter((term_id(term) for term in self.analyze(text)), dtype=np.uint64)
+
+
+def create_analyzer(name: str, stemming: bool = False) -> Analyzer:
+    """Analyzer pipeline by name"""
+    if name == "turkish":
+        token_filters = [remove_turkish_stopwords] + ([turkish_light_stem] if stemming else [])
+        return Analyzer(
+            name,
+            word_tokenizer,
+            char_filters=[turkish_casefold, strip_apostrophe_suffixes],
+            token_filters=token_filters
+        )
+    if name == "whitespace":
+        # Former behaviour: lower() and split on whitespace
+        return Analyzer(name, whitespace_tokenizer, char_filters=[str.lower])
+    raise ValueError(f"Unknown analyzer: {name}")
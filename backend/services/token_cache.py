@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Token Cache
+Description: Persistent content-addressed cache of analyzed token streams (uint64 term ids) for sparse retrieval.
+"""
+import hashlib
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+# Record header: 32-byte text digest + term count, 8-byte aligned like the term ids after it
+_HEADER = np.dtype([("key", "S32"), ("count", "<u8")])
+
+
+class TokenCache:
+    """
+    On-disk token stream cache keyed by (analyzer signature, SHA-256 of text).
+
+    Each analyzer signature gets its own directory holding an append-only
+    ``tokens.bin`` of variable-length records (digest, term count, uint64
+    term ids). The file is memory-mapped, so cached streams are read
+    without copying until BM25 consumes them. As with the embedding cache,
+    a batch is appended in one write under an exclusive ``flock`` on the
+    file, a partial trailing record left by a crash is dropped by the next
+    writer, and several processes can share the cache and pick up each
+    other's appends. Changing the analyzer changes the signature, so stale
+    streams are never reused.
+    """
+
+    def __init__(self, cache_dir: Path, signature: str):
+        self.signature = signature
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", signature).strip("_") or "default"
+        self.directory = Path(cache_dir) / slug
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.data_path = self.directory / "tokens.bin"
+
+        self._data: Optional[np.memmap] = None
+        self._records: Dict[bytes, Tuple[int, int]] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+        self._refresh()
+
+    @staticmethod
+    def key(text: str) -> bytes:
+        """Content address of a text"""
+        return hashlib.sha256(text.encode("utf-8")).digest()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def _refresh(self):
+        """Index records appended since the last refresh (also by other processes)"""
+        if not self.data_path.exists():
+            return
+        size = os.path.getsize(self.data_path)
+        if size <= self._size:
+            return
+
+        data = np.memmap(self.data_path, dtype=np.uint8, mode="r", shape=(size,))
+        offset = self._size
+        while offset + _HEADER.itemsize <= size:
+            header = np.frombuffer(data, dtype=_HEADER, count=1, offset=offset)[0]
+            count = int(header["count"])
+            end = offset + _HEADER.itemsize + 8 * count
+            if end > size:
+                # Partial record still being written (or left by a crash)
+                break
+            self._records[bytes(header["key"])] = (offset + _HEADER.itemsize, count)
+            offset = end
+        self._data = data
+        self._size = offset
+
+    def _stream(self, position: Tuple[int, int]) -> np.ndarray:
+        start, count = position
+        return np.frombuffer(self._data, dtype="<u8", count=count, offset=start)
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Look up cached term id streams; None for texts that are not cached"""
+        with self._lock:
+            keys = [self.key(text) for text in texts]
+            if any(key not in self._records for key in keys):
+                self._refresh()
+            return [
+                None if key not in self._records else self._stream(self._records[key])
+                for key in keys
+            ]
+
+    def put_many(self, texts: Sequence[str], streams: Sequence[np.ndarray]):
+        """Append term id streams for texts"""
+        if not texts:
+            return
+
+        chunks = []
+        for text, stream in zip(texts, streams):
+            stream = np.asarray(stream, dtype="<u8")
+            header = np.zeros(1, dtype=_HEADER)
+            header["key"] = self.key(text)
+            header["count"] = stream.size
+            chunks.append(header.tobytes())
+            chunks.append(stream.tobytes())
+
+        with self._lock, open(self.data_path, "ab") as f:
+            if FCNTL_AVAILABLE:
+                # Other processes append to the same file: one writer (or truncate) at a time
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+            # With the lock held no writer is mid-append, so a partial trailing record was left by a crash
+            self._refresh()
+            if os.fstat(f.fileno()).st_size > self._size:
+                f.truncate(self._size)
+
+            f.write(b"".join(chunks))
+            f.flush()
+            self._refresh()
+
+    def analyze(self, texts: Sequence[str], analyze_fn: Callable[[str], np.ndarray]) -> List[np.ndarray]:
+        """
+        Return term id streams for texts, analyzing only the ones not cached yet
+
+        Args:
+            texts: Texts to analyze
+            analyze_fn: Text -> uint64 term ids (e.g. Analyzer.term_ids)
+        """
+        streams = self.get_many(texts)
+        missing: Dict[str, List[int]] = {}
+        for i, (text, stream) in enumerate(zip(texts, streams)):
+            if stream is None:
+                missing.setdefault(text, []).append(i)
+
+        self.hits += len(texts) - sum(len(rows) for rows in missing.values())
+        self.misses += len(missing)
+
+        if missing:
+            missing_texts = list(missing)
+            new_streams = [analyze_fn(text) for text in missing_texts]
+            self.put_many(missing_texts, new_streams)
+            for text, stream in zip(missing_texts, new_streams):
+                for i in missing[text]:
+                    streams[i] = stream
+
+        return streams
+
+    def stats(self) -> Dict[str, int]:
+        """Cache counters"""
+        return {"size": len(self), "hits": self.hits, "misses": self.misses}
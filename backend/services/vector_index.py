@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Vector Index
+Description: FAISS index construction (flat, IVF, HNSW, SQ8/PQ compression), search parameters, and recall checks.
+"""
+from typing import Dict, Optional, Tuple
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "ivf", "hnsw")
+COMPRESSIONS = ("none", "sq8", "pq")
+
+
+def _inner_index(index: "faiss.Index") -> "faiss.Index":
+    """Unwrap IndexIDMap / IndexPreTransform (PCA) to the index that does the actual search"""
+    while isinstance(index, (faiss.IndexIDMap, faiss.IndexPreTransform)):
+        index = faiss.downcast_index(index.index)
+    return index
+
+
+def index_type_of(index: "faiss.Index") -> str:
+    """Index type name ("flat", "ivf" or "hnsw")"""
+    inner = _inner_index(index)
+    if isinstance(inner, faiss.IndexIVF):
+        return "ivf"
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    return "flat"
+
+
+def compression_of(index: "faiss.Index") -> str:
+    """Vector encoding ("none", "sq8" or "pq")"""
+    inner = _inner_index(index)
+    if isinstance(inner, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer, faiss.IndexHNSWSQ)):
+        return "sq8"
+    if isinstance(inner, (faiss.IndexPQ, faiss.IndexIVFPQ, faiss.IndexHNSWPQ)):
+        return "pq"
+    return "none"
+
+
+def is_compressed(index: "faiss.Index") -> bool:
+    """Whether search distances are approximate (quantized codes or reduced dimension)"""
+    return compression_of(index) != "none" or index.d != _inner_index(index).d
+
+
+def is_id_addressable(index: "faiss.Index") -> bool:
+    """Whether vectors are stored under external ids (chunk ids) rather than positions"""
+    return isinstance(index, faiss.IndexIDMap) or isinstance(_inner_index(index), faiss.IndexIVF)
+
+
+def supports_removal(index: "faiss.Index") -> bool:
+    """HNSW graphs cannot delete vectors; callers tombstone them instead"""
+    return index_type_of(index) != "hnsw"
+
+
+def default_nlist(n_vectors: int) -> int:
+    """IVF list count: ~4*sqrt(n), with at least 39 training points per list"""
+    return max(1, min(int(4 * np.sqrt(n_vectors)), n_vectors // 39))
+
+
+def _codec(compression: str, dimension: int, n_vectors: int, pq_m: int) -> str:
+    """index_factory code description for a compression mode"""
+    if compression == "sq8":
+        return "SQ8"
+    if compression == "pq":
+        if dimension % pq_m:
+            raise ValueError(f"PQ sub-quantizer count {pq_m} must divide dimension {dimension}")
+        # Each sub-quantizer trains 2**nbits centroids, which needs at least as many vectors
+        nbits = min(8, int(np.log2(max(n_vectors, 2))))
+        if nbits < 4:
+            raise ValueError(f"PQ needs at least 16 training vectors, got {n_vectors}")
+        return f"PQ{pq_m}x{nbits}"
+    return "Flat"
+
+
+def create_index(
+    dimension: int,
+    index_type: str = "flat",
+    training_vectors: Optional[np.ndarray] = None,
+    nlist: int = 0,
+    hnsw_m: int = 32,
+    ef_construction: int = 200,
+    compression: str = "none",
+    pq_m: int = 8,
+    pca_dim: int = 0
+) -> "faiss.Index":
+    """
+    Create an empty index that accepts add_with_ids / remove_ids by chunk id
+
+    IVF stores external ids natively (a hashtable direct map allows
+    reconstruct after removals); flat and HNSW indexes are wrapped in an
+    IndexIDMap2. ``compression`` stores SQ8 or PQ codes instead of float32
+    vectors and ``pca_dim`` reduces dimension first; a compressed flat
+    index is a single-list IVF (exhaustive scan that supports id selectors,
+    which IndexPQ does not). Indexes that need training are trained on
+    ``training_vectors``.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS index type: {index_type}")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown FAISS compression: {compression}")
+    if pca_dim and not 0 < pca_dim < dimension:
+        raise ValueError(f"PCA dimension {pca_dim} must be below the embedding dimension {dimension}")
+
+    if index_type == "flat" and compression == "none" and not pca_dim:
+        return faiss.IndexIDMap2(faiss.IndexFlatL2(dimension))
+
+    n_training = 0 if training_vectors is None else len(training_vectors)
+    codec = _codec(compression, pca_dim or dimension, n_training, pq_m)
+    prefix = f"PCA{pca_dim}," if pca_dim else ""
+    if index_type == "ivf":
+        description = f"{prefix}IVF{nlist or default_nlist(n_training)},{codec}"
+    elif index_type == "hnsw":
+        description = f"{prefix}HNSW{hnsw_m}" + ("" if codec == "Flat" else f"_{codec}")
+    elif codec != "Flat":
+        description = f"{prefix}IVF1,{codec}"
+    else:
+        description = f"{prefix}Flat"
+
+    index = faiss.index_factory(dimension, description)
+    inner = _inner_index(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efConstruction = ef_construction
+
+    if not index.is_trained:
+        if n_training == 0:
+            raise ValueError(f"FAISS index {description} requires training vectors")
+        index.train(np.ascontiguousarray(training_vectors, dtype=np.float32))
+
+    if isinstance(inner, faiss.IndexIVF):
+        inner.set_direct_map_type(faiss.DirectMap.Hashtable)
+        return index
+    return faiss.IndexIDMap2(index)
+
+
+def memory_bytes(index: "faiss.Index") -> int:
+    """Serialized index size, a close proxy for its resident memory"""
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def search_parameters(
+    index: "faiss.Index",
+    selector: Optional["faiss.IDSelector"] = None,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None
+) -> "faiss.SearchParameters":
+    """Per-query search parameters matching the index type"""
+    index_type = index_type_of(index)
+    if index_type == "ivf":
+        params = faiss.SearchParametersIVF()
+        if nprobe:
+            params.nprobe = nprobe
+    elif index_type == "hnsw":
+        params = faiss.SearchParametersHNSW()
+        if ef_search:
+            params.efSearch = ef_search
+    else:
+        params = faiss.SearchParameters()
+    if selector is not None:
+        params.sel = selector
+    return params
+
+
+def exact_subset_search(
+    index: "faiss.Index",
+    query: np.ndarray,
+    ids: np.ndarray,
+    k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Exact k-NN over a small set of ids (reconstructed vectors); returns (distances, ids)
+
+    ANN structures can return too few hits for very selective filters
+    (HNSW graph traversal dead-ends, IVF probes miss the lists), so small
+    filtered candidate sets are scanned exactly instead.
+    """
+    vectors = index.reconstruct_batch(np.asarray(ids, dtype=np.int64))
+    distances, positions = faiss.knn(np.asarray(query, dtype=np.float32), vectors, min(k, len(ids)))
+    return distances, np.where(positions >= 0, np.asarray(ids)[positions], -1)
+
+
+def rescore(query: np.ndarray, vectors: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(distances, positions) of the k candidates nearest to query by exact L2 over full-precision vectors"""
+    distances = ((np.asarray(vectors, dtype=np.float32) - np.asarray(query, dtype=np.float32).ravel()) ** 2).sum(axis=1)
+    positions = np.argsort(distances, kind="stable")[:k]
+    return distances[positions], positions
+
+
+def measure_recall(
+    candidate: "faiss.Index",
+    vectors: np.ndarray,
+    ids: Optional[np.ndarray] = None,
+    k: int = 10,
+    sample_size: int = 256,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    rescore_factor: int = 0
+) -> Dict[str, float]:
+    """
+    Recall@k of an ANN or compressed index against exact search over the same vectors
+
+    Sampled corpus vectors are used as queries; the exact neighbours come
+    from a temporary flat index over ``vectors``. ``ids`` are the ids the
+    vectors were added to ``candidate`` under (default: positions). With
+    ``rescore_factor``, k * rescore_factor candidates are fetched and
+    re-ranked exactly, as compressed-index searches do.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n = len(vectors)
+    k = min(k, n)
+    if k == 0:
+        return {"recall": 1.0, "k": k, "queries": 0}
+
+    rng = np.random.default_rng(0)
+    sample = rng.choice(n, size=min(sample_size, n), replace=False)
+    queries = vectors[sample]
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+    if ids is not None:
+        truth = np.asarray(ids, dtype=np.int64)[truth]
+
+    params = search_parameters(candidate, nprobe=nprobe, ef_search=ef_search)
+    _, found = candidate.search(queries, k * rescore_factor if rescore_factor else k, params=params)
+
+    if rescore_factor:
+        id_array = np.arange(n) if ids is None else np.asarray(ids, dtype=np.int64)
+        rows = {int(chunk_id): row for row, chunk_id in enumerate(id_array.tolist())}
+        reranked = []
+        for query, labels in zip(queries, found):
+            labels = labels[labels >= 0]
+            _, order = rescore(query, vectors[[rows[int(label)] for label in labels]], k)
+            reranked.append(np.pad(labels[order], (0, k - len(order)), constant_values=-1))
+        found = np.vstack(reranked)
+
+    hits = sum(len(set(t.tolist()) & set(f.tolist())) for t, f in zip(truth, found))
+    return {"recall": hits / float(truth.size), "k": k, "queries": int(len(sample))}
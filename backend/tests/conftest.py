@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Test Configuration
+Description: Shared fixtures: a RAG service on a temporary index directory with offline embeddings and tokenizer
+"""
+import pytest
+import tiktoken
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from services import rag_service
+
+# One token per UTF-8 byte: a real tiktoken encoding that needs no BPE download
+BYTE_ENCODING = tiktoken.Encoding(
+    name="test_bytes",
+    pat_str=r"[\s\S]",
+    mergeable_ranks={bytes([value]): value for value in range(256)},
+    special_tokens={}
+)
+
+
+@pytest.fixture
+def rag(tmp_path, monkeypatch):
+    """rag_service module with its index, caches, embeddings and tokenizer isolated per test"""
+    vectorstore = tmp_path / "vectorstore"
+    monkeypatch.setattr(rag_service, "VECTORSTORE_DIR", vectorstore)
+    monkeypatch.setattr(rag_service, "VECTORSTORE_PATH", vectorstore / "faiss_index")
+    monkeypatch.setattr(rag_service, "EMBEDDING_CACHE_DIR", vectorstore / "embedding_cache")
+    monkeypatch.setattr(rag_service, "TOKEN_CACHE_DIR", vectorstore / "token_cache")
+    monkeypatch.setattr(rag_service, "DEPARTMENT_INDEX_DIR", vectorstore / "departments")
+    monkeypatch.setattr(rag_service, "_embeddings", DeterministicFakeEmbedding(size=64))
+    monkeypatch.setattr(rag_service, "CROSS_ENCODER_AVAILABLE", False)
+    monkeypatch.setitem(rag_service._encodings, rag_service.CONTEXT_TOKEN_MODEL, BYTE_ENCODING)
+    # Snapshots only when a test asks for one
+    monkeypatch.setattr(rag_service.settings, "INDEX_SNAPSHOT_MAX_MUTATIONS", 1000)
+    monkeypatch.setattr(rag_service.settings, "INDEX_SNAPSHOT_INTERVAL_SECONDS", 3600)
+    monkeypatch.setattr(rag_service.settings, "RETRIEVAL_BATCH_WINDOW_MS", 0)
+    return rag_service
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Module: BM25 Index Tests
+Description: Incremental add / tombstoned remove / compaction round-trips against a freshly built index
+"""
+import numpy as np
+import pytest
+
+from services.bm25_index import BM25Index
+
+pytestmark = pytest.mark.unit
+
+CORPUS = [
+    "yıllık izin prosedürü onay".split(),
+    "izin başvurusu yönetici onayı".split(),
+    "bütçe raporu finans departmanı".split(),
+    "proje bütçe onay süreci".split(),
+    "insan kaynakları izin politikası".split(),
+    "finans raporu çeyrek sonu".split(),
+]
+QUERIES = [["izin"], ["bütçe", "onay"], ["finans", "raporu"], ["izin", "politikası", "onay"]]
+
+
+def assert_same_results(index: BM25Index, expected: BM25Index):
+    for query in QUERIES:
+        ids, scores = index.search(query, k=10)
+        expected_ids, expected_scores = expected.search(query, k=10)
+        assert dict(zip(ids.tolist(), scores.tolist())) == pytest.approx(
+            dict(zip(expected_ids.tolist(), expected_scores.tolist()))
+        )
+
+
+def test_segments_match_single_build():
+    index = BM25Index()
+    index.add(CORPUS[:2], [0, 1])
+    index.add(CORPUS[2:4], [2, 3])
+    index.add(CORPUS[4:], [4, 5])
+
+    assert index.segment_count == 3
+    assert len(index) == len(CORPUS)
+    assert_same_results(index, BM25Index.from_corpus(CORPUS))
+
+
+def test_remove_tombstones_documents_and_statistics():
+    index = BM25Index.from_corpus(CORPUS)
+
+    assert index.remove([0, 4]) == 2
+    # Removing again (or an unknown id) changes nothing
+    assert index.remove([0, 99]) == 0
+
+    assert len(index) == 4
+    for query in QUERIES:
+        assert not {0, 4} & set(index.search(query, k=10)[0].tolist())
+    # IDF and average length are those of the live documents only
+    live = [1, 2, 3, 5]
+    assert_same_results(index, BM25Index.from_corpus([CORPUS[i] for i in live], live))
+
+
+def test_compact_keeps_results():
+    index = BM25Index()
+    for doc_id, tokens in enumerate(CORPUS):
+        index.add([tokens], [doc_id])
+    index.remove([1, 3])
+    before = {tuple(query): index.search(query, k=10) for query in QUERIES}
+
+    index.compact()
+
+    assert index.segment_count == 1
+    assert not index.needs_compaction()
+    for query in QUERIES:
+        ids, scores = index.search(query, k=10)
+        np.testing.assert_array_equal(ids, before[tuple(query)][0])
+        np.testing.assert_allclose(scores, before[tuple(query)][1], rtol=1e-6)
+
+    # Adding after compaction continues with new ids
+    index.add([["izin", "yeni"]], [6])
+    assert 6 in index.search(["yeni"], k=10)[0].tolist()
+
+
+def test_copy_is_isolated():
+    index = BM25Index.from_corpus(CORPUS)
+    copy = index.copy()
+
+    copy.remove([0])
+    copy.add([["izin", "ek"]], [6])
+
+    assert len(index) == len(CORPUS)
+    assert 0 in index.search(["izin"], k=10)[0].tolist()
+    assert 6 not in index.search(["ek"], k=10)[0].tolist()
+    assert 0 not in copy.search(["izin"], k=10)[0].tolist()
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = BM25Index(analyzer="test")
+    index.add(CORPUS[:3], [0, 1, 2])
+    index.add(CORPUS[3:], [3, 4, 5])
+    index.remove([2])
+
+    index.save(tmp_path / "bm25")
+    loaded = BM25Index.load(tmp_path / "bm25")
+
+    assert loaded.analyzer == "test"
+    assert len(loaded) == len(index)
+    assert_same_results(loaded, index)
+
+
+def test_search_respects_allowed_mask():
+    index = BM25Index.from_corpus(CORPUS)
+    allowed = np.zeros(len(CORPUS), dtype=bool)
+    allowed[[1, 4]] = True
+
+    ids, _ = index.search(["izin"], k=10, allowed=allowed)
+
+    assert set(ids.tolist()) == {1, 4}
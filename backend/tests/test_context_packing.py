@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Context Packing Tests
+Description: Greedy token-budgeted context packing with token counts stored at index time
+"""
+import pytest
+from langchain_core.documents import Document
+
+TOKENS = "tokens_test_bytes"
+
+
+def chunk(text: str, tokens=None) -> Document:
+    metadata = {"doc_type": "document"}
+    if tokens is not None:
+        metadata[TOKENS] = tokens
+    return Document(page_content=text, metadata=metadata)
+
+
+@pytest.mark.unit
+def test_chunks_that_do_not_fit_are_skipped_and_later_ones_packed(rag):
+    service = rag.RAGService()
+    documents = [chunk("a", 600), chunk("b", 1500), chunk("c", 300), chunk("d", 1200), chunk("e", 100)]
+
+    context = service.format_context(documents, max_tokens=2000)
+
+    # Stored counts decide (the texts themselves are a few bytes); rank order is kept
+    assert context == "[document] a\n\n[document] c\n\n[document] e"
+
+
+@pytest.mark.unit
+def test_chunks_without_a_stored_count_are_encoded(rag):
+    service = rag.RAGService()
+    # One token per byte: "[document] " + text
+    documents = [chunk("x" * 19), chunk("y" * 10), chunk("z" * 5, 1)]
+
+    assert service.format_context(documents, max_tokens=30) == "[document] " + "x" * 19
+    assert service.format_context(documents, max_tokens=33) == "[document] " + "x" * 19 + "\n\n[document] zzzzz"
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_token_counts_are_stored_at_index_time(rag):
+    service = rag.RAGService()
+    await service.initialize(force_rebuild=True)
+    texts = ["izin prosedürü", "bütçe raporu çeyrek sonu"]
+
+    await service.add_documents([Document(page_content=text) for text in texts], document_id=5)
+
+    chunk_ids = service._state.document_chunks[5]
+    stored = [service.chunk_store.metadata(chunk_id)[TOKENS] for chunk_id in chunk_ids]
+    assert stored == [len(f"[file] {text}".encode("utf-8")) for text in texts]
+
+    docs, _ = await service.retrieve("izin prosedürü", k=10, top_k=10, use_hybrid=False, use_rerank=False)
+    budget = stored[0]
+    context = service.format_context([doc for doc in docs if doc.metadata.get("document_id") == 5], max_tokens=budget)
+    assert context == "[file] izin prosedürü"
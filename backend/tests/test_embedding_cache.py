@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Embedding Cache Tests
+Description: Persistent embedding cache: shared appends, crash safety and size-limited compaction
+"""
+import json
+
+import numpy as np
+import pytest
+
+from services.embedding_cache import EmbeddingCache
+
+pytestmark = pytest.mark.unit
+
+MODEL = "test-model"
+
+
+def vectors_for(texts, dimension: int = 4) -> np.ndarray:
+    return np.asarray([[len(text), i, 0.5, -1.0][:dimension] for i, text in enumerate(texts)], dtype=np.float32)
+
+
+def texts(prefix: str, count: int):
+    return [f"{prefix} {i}" for i in range(count)]
+
+
+def test_vectors_are_shared_with_other_instances(tmp_path):
+    writer = EmbeddingCache(tmp_path, MODEL)
+    reader = EmbeddingCache(tmp_path, MODEL)
+    batch = texts("izin", 3)
+
+    writer.put_many(batch, vectors_for(batch))
+
+    np.testing.assert_array_equal(np.vstack(reader.get_many(batch)), vectors_for(batch))
+    assert reader.get_many(["unknown"]) == [None]
+    assert len(EmbeddingCache(tmp_path, MODEL)) == 3
+
+
+def test_embed_only_computes_missing_texts(tmp_path):
+    cache = EmbeddingCache(tmp_path, MODEL)
+    calls = []
+
+    def embed(batch):
+        calls.append(list(batch))
+        return vectors_for(batch).tolist()
+
+    cache.embed(["a", "b"], embed)
+    cache.embed(["b", "c", "c"], embed)
+
+    assert calls == [["a", "b"], ["c"]]
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_partial_trailing_record_is_ignored_then_dropped(tmp_path):
+    cache = EmbeddingCache(tmp_path, MODEL)
+    cache.put_many(["a"], vectors_for(["a"]))
+    with open(cache.data_path, "ab") as f:
+        f.write(b"\x01" * 10)
+
+    reopened = EmbeddingCache(tmp_path, MODEL)
+    assert len(reopened) == 1
+    reopened.put_many(["b"], vectors_for(["b"]))
+
+    assert len(EmbeddingCache(tmp_path, MODEL)) == 2
+    assert EmbeddingCache(tmp_path, MODEL).get_many(["b"])[0] is not None
+
+
+def test_meta_is_replaced_atomically_and_a_truncated_one_is_rewritten(tmp_path):
+    cache = EmbeddingCache(tmp_path, MODEL)
+    cache.put_many(["a"], vectors_for(["a"]))
+    assert json.loads(cache.meta_path.read_text())["dimension"] == 4
+    assert [path.name for path in cache.directory.iterdir() if path.suffix == ".tmp"] == []
+
+    # Left by a crash of an in-place write
+    cache.meta_path.write_text('{"model": "test-model", "dimen')
+    recovered = EmbeddingCache(tmp_path, MODEL)
+    assert recovered.dimension is None
+
+    recovered.put_many(["b"], vectors_for(["b"]))
+    assert json.loads(cache.meta_path.read_text())["dimension"] == 4
+    assert EmbeddingCache(tmp_path, MODEL).get_many(["a", "b"])[1] is not None
+
+
+def test_compaction_keeps_the_most_recently_added_keys(tmp_path):
+    cache = EmbeddingCache(tmp_path, MODEL, max_entries=10)
+    reader = EmbeddingCache(tmp_path, MODEL)
+    first, second = texts("eski", 8), texts("yeni", 5)
+    cache.put_many(first, vectors_for(first))
+    reader.get_many(first)
+    # Appended again by another process: one record survives
+    cache.put_many(first[-1:], vectors_for(first[-1:]))
+
+    cache.put_many(second, vectors_for(second))
+
+    assert cache.compactions == 1
+    assert len(cache) == 10
+    assert cache.get_many(first[:3]) == [None] * 3
+    kept = first[3:] + second
+    np.testing.assert_array_equal(np.vstack(cache.get_many(kept[-5:])), vectors_for(second))
+    assert all(vector is not None for vector in cache.get_many(kept))
+
+    # A reader mapped before the compaction re-maps the new file on its next miss
+    assert all(vector is not None for vector in reader.get_many(second))
+    assert len(reader) == 10
+    assert len(EmbeddingCache(tmp_path, MODEL)) == 10
+
+
+def test_unlimited_cache_is_never_compacted(tmp_path):
+    cache = EmbeddingCache(tmp_path, MODEL)
+    batch = texts("belge", 50)
+
+    cache.put_many(batch, vectors_for(batch))
+
+    assert cache.compactions == 0
+    assert len(cache) == 50
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Fusion Tests
+Description: Reciprocal rank and min-max weighted fusion of dense and sparse rankings
+"""
+import numpy as np
+import pytest
+
+from services.fusion import ReciprocalRankFusion, WeightedScoreFusion, create_fusion
+
+pytestmark = pytest.mark.unit
+
+
+def ranking(ids, scores):
+    return np.asarray(ids, dtype=np.int64), np.asarray(scores, dtype=np.float64)
+
+
+DENSE = ranking([1, 2, 3], [0.9, 0.5, 0.1])
+SPARSE = ranking([3, 4], [12.0, 2.0])
+
+
+def as_dict(fused):
+    ids, scores = fused
+    return dict(zip(ids.tolist(), scores.tolist()))
+
+
+def test_rrf_sums_weighted_reciprocal_ranks():
+    fused = as_dict(ReciprocalRankFusion(k=60, weights=(0.7, 0.3)).fuse([DENSE, SPARSE]))
+
+    assert fused == pytest.approx({
+        1: 0.7 / 61,
+        2: 0.7 / 62,
+        3: 0.7 / 63 + 0.3 / 61,
+        4: 0.3 / 62
+    })
+
+
+def test_weighted_fusion_normalizes_each_ranking():
+    ids, scores = WeightedScoreFusion(weights=(0.5, 0.5)).fuse([DENSE, SPARSE])
+
+    # Chunk 3 is last in dense (0) but first in sparse (1); chunk 1 is first in dense only
+    assert as_dict((ids, scores)) == pytest.approx({1: 0.5, 2: 0.5 * 0.5, 3: 0.5, 4: 0.0})
+    # Equal scores keep the order the chunks were first seen in
+    assert ids.tolist() == [1, 3, 2, 4]
+
+
+def test_weighted_fusion_uses_scores_not_only_ranks():
+    # Dense barely prefers 1 over 2, sparse strongly prefers 2 over 1
+    close = ranking([1, 2, 3], [0.90, 0.89, 0.10])
+    far = ranking([2, 1, 3], [10.0, 1.0, 0.9])
+
+    rrf_ids, _ = ReciprocalRankFusion().fuse([close, far])
+    weighted_ids, _ = WeightedScoreFusion(weights=(0.5, 0.5)).fuse([close, far])
+
+    assert rrf_ids.tolist() == [1, 2, 3]
+    assert weighted_ids.tolist() == [2, 1, 3]
+
+
+def test_weights_repeat_over_several_query_pairs():
+    fusion = ReciprocalRankFusion(k=0, weights=(1.0, 0.0))
+
+    fused = as_dict(fusion.fuse([DENSE, SPARSE, ranking([4], [1.0]), ranking([1], [1.0])]))
+
+    # Every sparse ranking has weight 0
+    assert fused == pytest.approx({1: 1.0, 2: 0.5, 3: 1 / 3, 4: 1.0})
+
+
+def test_empty_rankings_are_ignored():
+    empty = ranking([], [])
+
+    for fusion in (ReciprocalRankFusion(), WeightedScoreFusion()):
+        assert as_dict(fusion.fuse([empty, SPARSE])) == pytest.approx(as_dict(fusion.fuse([SPARSE])))
+        assert len(fusion.fuse([empty, empty])[0]) == 0
+
+
+def test_create_fusion_by_name():
+    assert isinstance(create_fusion("rrf", rrf_k=10), ReciprocalRankFusion)
+    assert create_fusion("rrf", rrf_k=10).k == 10
+    assert create_fusion("weighted", dense_weight=0.8).weights == pytest.approx((0.8, 0.2))
+    with pytest.raises(ValueError):
+        create_fusion("borda")
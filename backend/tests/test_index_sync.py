@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Index Sync Tests
+Description: Redis version counter and pub/sub notifications between workers, and the polling staleness bound
+"""
+import asyncio
+import json
+import time
+
+import pytest
+from langchain_core.documents import Document
+
+from services import index_sync
+from services.index_sync import IndexSync
+
+pytestmark = pytest.mark.asyncio
+
+
+class InProcessRedis:
+    """The Redis commands IndexSync uses, shared by every "worker" of a test"""
+
+    def __init__(self):
+        self.values = {}
+        self.subscribers = []
+
+    async def eval(self, script, numkeys, key, version):
+        self.values[key] = max(int(self.values.get(key, 0)), int(version))
+        return self.values[key]
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def publish(self, channel, message):
+        for subscriber in self.subscribers:
+            if channel in subscriber.channels:
+                subscriber.messages.put_nowait({"type": "message", "data": message})
+
+    def pubsub(self):
+        return InProcessPubSub(self)
+
+
+class InProcessPubSub:
+    def __init__(self, redis):
+        self.redis = redis
+        self.channels = set()
+        self.messages = asyncio.Queue()
+
+    async def subscribe(self, channel):
+        self.channels.add(channel)
+        self.redis.subscribers.append(self)
+
+    async def listen(self):
+        while True:
+            yield await self.messages.get()
+
+    async def close(self):
+        self.redis.subscribers.remove(self)
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    shared = InProcessRedis()
+
+    async def get_redis():
+        return shared
+
+    monkeypatch.setattr(index_sync, "get_redis", get_redis)
+    return shared
+
+
+@pytest.fixture
+def no_redis(monkeypatch):
+    async def get_redis():
+        raise RuntimeError("Redis not initialized")
+
+    monkeypatch.setattr(index_sync, "get_redis", get_redis)
+
+
+class Worker:
+    """An IndexSync with a local version, counting its sync calls"""
+
+    def __init__(self, max_staleness: float):
+        self.version = 0
+        self.changes = 0
+        self.sync = IndexSync(self.on_change, lambda: self.version, max_staleness=max_staleness)
+
+    async def on_change(self) -> bool:
+        self.changes += 1
+        return True
+
+
+async def eventually(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached in time"
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.unit
+async def test_cluster_version_only_moves_forward(redis):
+    worker = Worker(max_staleness=60)
+
+    await worker.sync.notify(5)
+    await worker.sync.notify(3)
+
+    assert worker.sync.cluster_version == 5
+    assert await Worker(max_staleness=60).sync.fetch_cluster_version() == 5
+
+
+@pytest.mark.unit
+async def test_newer_versions_of_other_workers_wake_the_sync_loop(redis):
+    worker = Worker(max_staleness=60)
+    worker.version = 4
+    worker.sync.start()
+    try:
+        await eventually(lambda: worker.sync.subscribed)
+
+        # Versions the worker already has are not changes
+        await redis.publish(worker.sync.channel, json.dumps({"version": 4, "origin": "other"}))
+        await redis.publish(worker.sync.channel, json.dumps({"version": 6, "origin": "other"}))
+        await eventually(lambda: worker.changes == 1)
+
+        assert worker.sync.notifications == 1
+        assert worker.sync.cluster_version == 6
+        assert worker.sync.stats()["syncs"] == 1
+    finally:
+        await worker.sync.stop()
+
+
+@pytest.mark.unit
+async def test_without_redis_changes_are_polled_within_the_staleness_bound(no_redis):
+    worker = Worker(max_staleness=0.05)
+    await worker.sync.notify(1)
+    worker.sync.start()
+    try:
+        await eventually(lambda: worker.changes >= 3)
+        assert not worker.sync.subscribed
+        assert worker.sync.stats()["seconds_since_check"] < 1.0
+    finally:
+        await worker.sync.stop()
+
+
+@pytest.mark.integration
+async def test_workers_see_each_others_documents_after_a_notification(rag, redis, monkeypatch):
+    monkeypatch.setattr(rag.settings, "INDEX_SYNC_MAX_STALENESS_SECONDS", 60.0)
+    writer = rag.RAGService()
+    await writer.initialize(force_rebuild=True)
+    reader = rag.RAGService()
+    await reader.initialize()
+    reader.index_sync.start()
+    try:
+        await eventually(lambda: reader.index_sync.subscribed)
+
+        await writer.add_documents([Document(page_content="fazla mesai onayı")], document_id=1)
+        await eventually(lambda: 1 in reader._state.document_chunks)
+
+        docs, _ = await reader.retrieve("fazla mesai onayı", k=10, top_k=1, use_hybrid=False, use_rerank=False)
+        assert docs[0].page_content == "fazla mesai onayı"
+        assert reader.index_version == writer.index_version
+
+        await writer.remove_document(1)
+        await eventually(lambda: 1 not in reader._state.document_chunks)
+    finally:
+        await reader.index_sync.stop()
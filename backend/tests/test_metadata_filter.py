@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Metadata Filter Tests
+Description: Columnar doc_type/department/uploader masks and ACL pre-filtering of retrieval
+"""
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from services.metadata_store import MetadataFilter, MetadataStore
+
+CHUNKS = [
+    {"doc_type": "file", "department": "HR", "uploaded_by": 1},
+    {"doc_type": "file", "department": "IT", "uploaded_by": 2},
+    {"doc_type": "project", "department": "HR"},
+    {"doc_type": "file", "department": "HR", "uploaded_by": 2},
+    {"doc_type": "file"},
+]
+
+
+def store() -> MetadataStore:
+    metadata_store = MetadataStore()
+    metadata_store.add(list(range(len(CHUNKS))), CHUNKS)
+    return metadata_store
+
+
+def selected(mask: np.ndarray) -> set:
+    return set(np.flatnonzero(mask).tolist())
+
+
+@pytest.mark.unit
+def test_filters_combine_columns():
+    metadata_store = store()
+
+    assert selected(metadata_store.mask(MetadataFilter())) == {0, 1, 2, 3, 4}
+    assert selected(metadata_store.mask(MetadataFilter(doc_types={"file"}))) == {0, 1, 3, 4}
+    assert selected(metadata_store.mask(MetadataFilter(departments={"HR"}))) == {0, 2, 3}
+    assert selected(metadata_store.mask(MetadataFilter(doc_types={"file"}, departments={"HR", "Finance"}))) == {0, 3}
+    assert not metadata_store.mask(MetadataFilter(departments={"Finance"})).any()
+
+
+@pytest.mark.unit
+def test_acl_allows_own_and_optionally_unowned_chunks():
+    metadata_store = store()
+
+    assert selected(metadata_store.mask(MetadataFilter(uploaded_by={2}))) == {1, 2, 3, 4}
+    assert selected(metadata_store.mask(MetadataFilter(uploaded_by={2}, include_unowned=False))) == {1, 3}
+    assert selected(metadata_store.mask(MetadataFilter(uploaded_by={1, 2}, include_unowned=False))) == {0, 1, 3}
+
+
+@pytest.mark.unit
+def test_removed_chunks_never_match_and_copies_are_isolated():
+    metadata_store = store()
+    copy = metadata_store.copy()
+
+    copy.remove([0, 3])
+    copy.add([5], [{"doc_type": "file", "department": "HR", "uploaded_by": 1}])
+
+    assert selected(copy.mask(MetadataFilter(departments={"HR"}))) == {2, 5}
+    assert selected(metadata_store.mask(MetadataFilter(departments={"HR"}))) == {0, 2, 3}
+    assert len(copy) == 4
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+@pytest.mark.parametrize("use_hybrid", [True, False])
+async def test_retrieval_only_returns_allowed_chunks(rag, use_hybrid):
+    service = rag.RAGService()
+    await service.initialize(force_rebuild=True)
+    for document_id, department, uploader in [(1, "HR", 1), (2, "HR", 2), (3, "IT", 1)]:
+        await service.add_documents(
+            [Document(page_content=f"izin prosedürü belge {document_id} madde {i}") for i in range(4)],
+            document_id=document_id, department=department, uploaded_by=uploader
+        )
+
+    async def documents_of(metadata_filter: MetadataFilter) -> set:
+        docs, _ = await service.retrieve(
+            "izin prosedürü madde 1", k=50, top_k=20, use_hybrid=use_hybrid, use_rerank=False,
+            metadata_filter=metadata_filter
+        )
+        return {doc.metadata.get("document_id") for doc in docs}
+
+    assert await documents_of(MetadataFilter(doc_types={"file"}, uploaded_by={1})) == {1, 3}
+    assert await documents_of(MetadataFilter(doc_types={"file"}, departments={"HR"}, uploaded_by={2})) == {2}
+    assert await documents_of(MetadataFilter(departments={"Finance"})) == set()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Micro-Batching Tests
+Description: Concurrent query embeddings and FAISS searches coalesced into batched executor calls
+"""
+import asyncio
+
+import pytest
+from langchain_core.documents import Document
+
+from services.retrieval_executor import MicroBatcher, RetrievalExecutor
+
+pytestmark = pytest.mark.asyncio
+
+
+def recording_batcher(window_ms: float = 20.0, max_batch_size: int = 32):
+    calls = []
+
+    def batch_fn(key, items):
+        calls.append((key, list(items)))
+        return [f"{key}:{item}" for item in items]
+
+    executor = RetrievalExecutor(max_workers=2)
+    return MicroBatcher("test", batch_fn, executor, window_ms, max_batch_size), calls, executor
+
+
+@pytest.mark.unit
+async def test_concurrent_items_share_one_call_per_key():
+    batcher, calls, executor = recording_batcher()
+    try:
+        results = await asyncio.gather(
+            *(batcher.submit(item, key="a") for item in range(5)),
+            *(batcher.submit(item, key="b") for item in range(3))
+        )
+    finally:
+        executor.shutdown()
+
+    assert results == [f"a:{item}" for item in range(5)] + [f"b:{item}" for item in range(3)]
+    assert sorted(calls) == [("a", [0, 1, 2, 3, 4]), ("b", [0, 1, 2])]
+    assert batcher.stats()["mean_batch_size"] == 4.0
+
+
+@pytest.mark.unit
+async def test_full_batches_flush_without_waiting_for_the_window():
+    batcher, calls, executor = recording_batcher(window_ms=60_000, max_batch_size=4)
+    try:
+        results = await asyncio.wait_for(asyncio.gather(*(batcher.submit(item) for item in range(8))), 5)
+    finally:
+        executor.shutdown()
+
+    assert results == [f"None:{item}" for item in range(8)]
+    assert [items for _, items in calls] == [[0, 1, 2, 3], [4, 5, 6, 7]]
+
+
+@pytest.mark.unit
+async def test_a_failed_batch_fails_each_of_its_callers():
+    def failing(key, items):
+        raise RuntimeError("index unavailable")
+
+    executor = RetrievalExecutor(max_workers=1)
+    batcher = MicroBatcher("test", failing, executor, window_ms=20.0)
+    try:
+        results = await asyncio.gather(*(batcher.submit(item) for item in range(3)), return_exceptions=True)
+    finally:
+        executor.shutdown()
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert batcher.batches == 1
+
+
+@pytest.mark.integration
+async def test_concurrent_retrievals_are_batched_with_unchanged_results(rag, monkeypatch):
+    monkeypatch.setattr(rag.settings, "RETRIEVAL_BATCH_WINDOW_MS", 20.0)
+    service = rag.RAGService()
+    await service.initialize(force_rebuild=True)
+    await service.add_documents([Document(page_content=f"seyahat yönergesi {i}") for i in range(6)], document_id=1)
+    queries = [f"seyahat yönergesi {i}" for i in range(6)]
+
+    async def retrieve(query):
+        docs, _ = await service.retrieve(query, k=10, top_k=3, use_hybrid=False, use_rerank=False)
+        return [doc.page_content for doc in docs]
+
+    sequential = [await retrieve(query) for query in queries]
+    # Embed the queries again rather than hitting the query LRU
+    service.query_cache = None
+    embed_batches, search_batches = service.query_batcher.batches, service.search_batcher.batches
+    concurrent = await asyncio.gather(*(retrieve(query) for query in queries))
+
+    assert concurrent == sequential
+    assert 0 < service.query_batcher.batches - embed_batches < len(queries)
+    assert 0 < service.search_batcher.batches - search_batches < len(queries)
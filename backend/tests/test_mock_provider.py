@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Mock Provider Tests
+Description: Simulated LLM latency, output length and injected errors of the MOCK provider used for load tests
+"""
+import statistics
+import time
+
+import pytest
+
+from services import ai_service
+from services.ai_service import AIService, _mock_first_token_ms
+
+
+@pytest.fixture
+def mock_llm(monkeypatch):
+    """Instant mock provider; tests set the knobs they exercise"""
+    for name, value in {
+        "MOCK_LLM_LATENCY_DISTRIBUTION": "constant",
+        "MOCK_LLM_FIRST_TOKEN_MS": 0.0,
+        "MOCK_LLM_TOKENS_PER_SECOND": 0.0,
+        "MOCK_LLM_OUTPUT_TOKENS": 40,
+        "MOCK_LLM_ERROR_RATE": 0.0
+    }.items():
+        monkeypatch.setattr(ai_service.settings, name, value)
+    return ai_service.settings
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("distribution", ["constant", "uniform", "exponential", "lognormal"])
+def test_first_token_latency_centers_on_the_configured_median(mock_llm, monkeypatch, distribution):
+    monkeypatch.setattr(mock_llm, "MOCK_LLM_LATENCY_DISTRIBUTION", distribution)
+    monkeypatch.setattr(mock_llm, "MOCK_LLM_FIRST_TOKEN_MS", 400.0)
+    monkeypatch.setattr(mock_llm, "MOCK_LLM_LATENCY_SPREAD", 0.5)
+    ai_service.random.seed(0)
+
+    samples = [_mock_first_token_ms() for _ in range(4000)]
+
+    assert min(samples) >= 0.0
+    assert statistics.median(samples) == pytest.approx(400.0, rel=0.1)
+    if distribution == "constant":
+        assert set(samples) == {400.0}
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_mock_response_echoes_the_context_and_reports_tokens(mock_llm):
+    text, metadata = await AIService()._generate_mock("izin kaç gün", None, context="yıllık izin on dört gündür")
+
+    words = text.split()
+    assert set(words) <= {"yıllık", "izin", "on", "dört", "gündür"}
+    assert metadata["model"] == "mock"
+    assert metadata["token_count"] > len(words)
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_mock_latency_is_first_token_plus_generation_time(mock_llm, monkeypatch):
+    monkeypatch.setattr(mock_llm, "MOCK_LLM_FIRST_TOKEN_MS", 50.0)
+    monkeypatch.setattr(mock_llm, "MOCK_LLM_TOKENS_PER_SECOND", 1000.0)
+
+    started = time.perf_counter()
+    text, metadata = await AIService()._generate_mock("soru", None, context="bağlam")
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    assert metadata["first_token_ms"] == 50.0
+    assert metadata["generation_ms"] == pytest.approx(len(text.split()), rel=0.01)
+    assert elapsed_ms >= metadata["first_token_ms"] + metadata["generation_ms"]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_injected_errors_fail_like_the_upstream_provider(mock_llm, monkeypatch):
+    monkeypatch.setattr(mock_llm, "MOCK_LLM_ERROR_RATE", 1.0)
+    monkeypatch.setattr(mock_llm, "MOCK_LLM_ERROR_STATUS", 429)
+
+    with pytest.raises(ValueError, match="429"):
+        await AIService()._generate_mock("soru")
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Near Duplicate Tests
+Description: MinHash similarity estimates, LSH candidate lookup and ingestion-time deduplication across documents with the same visibility
+"""
+import random
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from services.near_duplicates import MIN_SHINGLES, MinHashLSH, decode, minhash, most_similar, similarities
+
+WORDS = (
+    "izin yıllık çalışan gün prosedür onay yönetici belge rapor bütçe proje süre "
+    "başvuru form insan kaynakları politika kural madde hak"
+).split()
+
+
+def passage(seed: int, words: int = 150) -> str:
+    rng = random.Random(seed)
+    return " ".join(f"{rng.choice(WORDS)}{rng.randint(0, 50)}" for _ in range(words))
+
+
+def revise(text: str) -> str:
+    """Change two words of a passage"""
+    words = text.split()
+    words[10] = "değişti"
+    words[80] = "yeni"
+    return " ".join(words)
+
+
+@pytest.mark.unit
+def test_minhash_estimates_jaccard():
+    rng = np.random.default_rng(0)
+    stream = rng.integers(0, 2 ** 40, size=300, dtype=np.uint64)
+    revised = stream.copy()
+    revised[[20, 150]] = [1, 2]
+    unrelated = rng.integers(0, 2 ** 40, size=300, dtype=np.uint64)
+
+    signatures = decode([minhash(stream), minhash(revised), minhash(unrelated)])
+    estimates = similarities(signatures, signatures[0])
+
+    assert estimates[0] == 1.0
+    assert estimates[1] > 0.9
+    assert estimates[2] < 0.2
+    assert most_similar(signatures[1:], signatures[0], threshold=0.8)[0] == 0
+    assert most_similar(signatures[2:], signatures[0], threshold=0.8) is None
+
+
+@pytest.mark.unit
+def test_short_chunks_get_no_signature():
+    assert minhash(np.arange(MIN_SHINGLES, dtype=np.uint64)) is None
+    assert minhash(np.arange(MIN_SHINGLES + 5, dtype=np.uint64)) is not None
+
+
+@pytest.mark.unit
+def test_lsh_finds_revised_passages_among_many():
+    rng = np.random.default_rng(1)
+    streams = [rng.integers(0, 2 ** 40, size=200, dtype=np.uint64) for _ in range(3000)]
+    index = MinHashLSH()
+    # Sorted part and tail are both searched
+    index.add(list(range(2500)), [minhash(stream) for stream in streams[:2500]])
+    index.add(list(range(2500, 3000)), [minhash(stream) for stream in streams[2500:]])
+
+    for key in (7, 2990):
+        revised = streams[key].copy()
+        revised[[5, 100]] = [1, 2]
+        assert index.most_similar(minhash(revised), threshold=0.8)[0] == key
+        assert index.most_similar(minhash(revised), threshold=0.8, accept=lambda candidate: candidate != key) is None
+    assert len(index._candidate_rows(decode([minhash(streams[3])])[0])) < 10
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_duplicates_within_an_upload_are_skipped(rag):
+    service = rag.RAGService()
+    await service.initialize(force_rebuild=True)
+    text = passage(1)
+    chunks = [Document(page_content=text), Document(page_content=passage(2)), Document(page_content=revise(text))]
+
+    kept, report = await service.filter_near_duplicates(chunks)
+
+    assert [doc.page_content for doc in kept] == [text, chunks[1].page_content]
+    assert report["skipped"] == 1
+    assert report["duplicates"][0]["position"] == 2
+    assert report["duplicates"][0]["duplicate_of_position"] == 0
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_revised_documents_with_the_same_visibility_are_deduplicated(rag):
+    service = rag.RAGService()
+    await service.initialize(force_rebuild=True)
+    texts = [passage(seed) for seed in range(3)]
+    await service.add_documents([Document(page_content=text) for text in texts], document_id=7, department="HR", uploaded_by=1)
+
+    # A revised version uploaded as a new document by the same user, to the same department
+    revised = [Document(page_content=revise(texts[0])), Document(page_content=texts[1]), Document(page_content=passage(9))]
+    kept, report = await service.filter_near_duplicates(revised, department="HR", uploaded_by=1)
+    assert [doc.page_content for doc in kept] == [revised[2].page_content]
+    assert {match["document_id"] for match in report["duplicates"]} == {7}
+    assert {match["duplicate_of"] for match in report["duplicates"]} <= set(service._state.document_chunks[7])
+
+    # Chunks visible to other users are never fallen back on
+    for scope in ({"department": "IT", "uploaded_by": 1}, {"department": "HR", "uploaded_by": 2}):
+        kept, report = await service.filter_near_duplicates(revised, **scope)
+        assert len(kept) == len(revised)
+
+    # A process that loads the snapshot finds them too
+    await service.flush()
+    reloaded = rag.RAGService()
+    await reloaded.initialize()
+    kept, _ = await reloaded.filter_near_duplicates(revised, department="HR", uploaded_by=1)
+    assert [doc.page_content for doc in kept] == [revised[2].page_content]
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_removed_chunks_are_not_duplicates(rag):
+    service = rag.RAGService()
+    await service.initialize(force_rebuild=True)
+    texts = [passage(seed) for seed in range(3)]
+    await service.add_documents([Document(page_content=text) for text in texts], document_id=7, department="HR")
+
+    # Re-index replaces the document: its old chunks are removed before the new ones are compared
+    assert await service.remove_document(7)
+    again = [Document(page_content=revise(texts[0])), Document(page_content=texts[1])]
+    kept, report = await service.filter_near_duplicates(again, department="HR")
+
+    assert len(kept) == 2
+    assert report["skipped"] == 0
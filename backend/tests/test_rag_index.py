@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Module: RAG Index Tests
+Description: Tombstoned deletes, snapshots and write-ahead log recovery of the main index
+"""
+import pytest
+from langchain_core.documents import Document
+
+pytestmark = [pytest.mark.integration, pytest.mark.asyncio]
+
+
+def chunks(prefix: str, count: int):
+    return [Document(page_content=f"{prefix} parça {i}") for i in range(count)]
+
+
+async def dense_top(service, query: str):
+    docs, _ = await service.retrieve(query, k=10, top_k=1, use_hybrid=False, use_rerank=False)
+    return docs[0].page_content if docs else None
+
+
+async def started(rag):
+    service = rag.RAGService()
+    await service.initialize(force_rebuild=True)
+    return service
+
+
+async def test_removed_chunks_are_tombstoned_until_the_snapshot(rag):
+    service = await started(rag)
+    await service.add_documents(chunks("izin prosedürü", 3), document_id=1, department="HR")
+    await service.flush()
+    snapshot_index = service.vector_store.index
+    vectors = service.get_stats()["vectors"]
+
+    assert await service.remove_document(1)
+
+    # The snapshot's FAISS index is shared, not rewritten: the chunks are only tombstoned
+    assert service.vector_store.index is snapshot_index
+    assert service.get_stats()["since_snapshot"] == {"added": 0, "tombstoned": 3}
+    assert 1 not in service._state.document_chunks
+    for i in range(3):
+        assert await dense_top(service, f"izin prosedürü parça {i}") != f"izin prosedürü parça {i}"
+    department_docs, _ = await service.retrieve_by_department("izin prosedürü parça 0", "HR", k=10, top_k=3)
+    assert not department_docs
+
+    await service.flush()
+
+    stats = service.get_stats()
+    assert stats["since_snapshot"] == {"added": 0, "tombstoned": 0}
+    assert stats["vectors"] == vectors - 3
+    assert service._state.index_mmapped
+    assert not await service.remove_document(1)
+
+
+async def test_chunks_added_after_the_snapshot_are_searchable_and_removable(rag):
+    service = await started(rag)
+    snapshot_index = service.vector_store.index
+
+    await service.add_documents(chunks("bütçe raporu", 2), document_id=2)
+    await service.add_documents(chunks("proje planı", 2), document_id=3)
+
+    assert service.vector_store.index is snapshot_index
+    assert service.get_stats()["since_snapshot"]["added"] == 4
+    assert await dense_top(service, "bütçe raporu parça 1") == "bütçe raporu parça 1"
+
+    assert await service.remove_document(2)
+
+    assert service.get_stats()["since_snapshot"] == {"added": 2, "tombstoned": 0}
+    assert await dense_top(service, "bütçe raporu parça 1") != "bütçe raporu parça 1"
+    assert await dense_top(service, "proje planı parça 0") == "proje planı parça 0"
+
+
+async def test_unsnapshotted_mutations_are_replayed_from_the_log(rag):
+    service = await started(rag)
+    snapshot = service.snapshot_version
+    for document_id in range(10, 14):
+        await service.add_documents(chunks(f"belge {document_id}", 2), document_id=document_id)
+    await service.remove_document(11)
+
+    # A new process (e.g. after a crash) loads the snapshot and replays the log on top
+    recovered = rag.RAGService()
+    await recovered.initialize()
+
+    assert recovered.snapshot_version == snapshot
+    assert len(recovered.wal) == 5
+    assert recovered.index_version == service.index_version
+    assert recovered._state.document_chunks == service._state.document_chunks
+    assert recovered._state.next_chunk_id == service._state.next_chunk_id
+    assert await dense_top(recovered, "belge 12 parça 1") == "belge 12 parça 1"
+    assert await dense_top(recovered, "belge 11 parça 0") != "belge 11 parça 0"
+
+
+async def test_torn_log_tail_is_ignored_and_overwritten(rag):
+    service = await started(rag)
+    await service.add_documents(chunks("kalite belgesi", 2), document_id=20)
+    with open(service.wal.path, "ab") as f:
+        # A record whose write was cut short
+        f.write(b"CWAL\x10\x00\x00\x00partial")
+
+    recovered = rag.RAGService()
+    await recovered.initialize()
+    assert 20 in recovered._state.document_chunks
+    assert len(recovered.wal) == 1
+
+    await recovered.add_documents(chunks("denetim raporu", 1), document_id=21)
+    again = rag.RAGService()
+    await again.initialize()
+    assert {20, 21} <= set(again._state.document_chunks)
+    assert await dense_top(again, "denetim raporu parça 0") == "denetim raporu parça 0"
+
+
+async def test_flush_writes_a_snapshot_and_starts_an_empty_log(rag):
+    service = await started(rag)
+    first = service.snapshot_version
+    await service.add_documents(chunks("eğitim planı", 3), document_id=30)
+
+    version = await service.flush()
+
+    assert version != first
+    assert version in service.snapshots.versions()
+    assert len(service.wal) == 0
+
+    reloaded = rag.RAGService()
+    await reloaded.initialize()
+    assert reloaded.snapshot_version == version
+    assert len(reloaded.wal) == 0
+    assert reloaded._state.index_mmapped
+    assert reloaded._state.document_chunks[30] == service._state.document_chunks[30]
+    assert await dense_top(reloaded, "eğitim planı parça 2") == "eğitim planı parça 2"
+
+
+async def test_rebuild_keeps_chunk_ids_unique_and_drops_department_indexes(rag):
+    service = await started(rag)
+    await service.add_documents(chunks("eski izin", 3), document_id=40, department="HR")
+    old_ids = service._state.document_chunks[40]
+
+    # Another process rebuilds the index from the data files
+    rebuilt = rag.RAGService()
+    assert await rebuilt.initialize(force_rebuild=True)
+    assert min(rebuilt._state.chunk_store.ids()) > max(old_ids)
+    assert not (rag.DEPARTMENT_INDEX_DIR / "HR").exists()
+
+    assert await rebuilt.add_documents(chunks("yeni izin", 3), document_id=41, department="HR")
+
+    docs, _ = await rebuilt.retrieve_by_department("eski izin parça 0", "HR", k=10, top_k=10)
+    assert {doc.metadata.get("document_id") for doc in docs} == {41}
+    assert await service.sync()
+    docs, _ = await service.retrieve_by_department("eski izin parça 0", "HR", k=10, top_k=10)
+    assert {doc.metadata.get("document_id") for doc in docs} == {41}
+
+
+async def test_records_of_other_writers_are_snapshotted_by_sync(rag, monkeypatch):
+    service = await started(rag)
+    snapshot = service.snapshot_version
+    # A Celery task logs its mutations and returns without writing a snapshot
+    worker = rag.RAGService()
+    await worker.initialize()
+    for document_id in range(50, 53):
+        await worker.add_documents(chunks(f"görev {document_id}", 1), document_id=document_id)
+    worker._snapshot_task.cancel()
+    assert worker.snapshot_version == snapshot
+
+    monkeypatch.setattr(rag.settings, "INDEX_SNAPSHOT_MAX_MUTATIONS", 3)
+    assert await service.sync()
+
+    assert service.snapshot_version != snapshot
+    assert len(service.wal) == 0
+    assert set(range(50, 53)) <= set(service._state.document_chunks)
+    assert await worker.sync()
+    assert worker.snapshot_version == service.snapshot_version
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Self-RAG Tests
+Description: Query variants searched in the original query's batch, and the deadline of the retry
+"""
+import asyncio
+
+import pytest
+from langchain_core.documents import Document
+
+pytestmark = [pytest.mark.integration, pytest.mark.asyncio]
+
+NEVER_CONFIDENT = float("inf")
+
+
+async def started(rag, monkeypatch):
+    """Service with some chunks whose first stages are recorded"""
+    service = rag.RAGService()
+    await service.initialize(force_rebuild=True)
+    await service.add_documents(
+        [Document(page_content=f"yıllık izin prosedürü madde {i}") for i in range(12)], document_id=1
+    )
+    batches = []
+    first_stage_many = service._first_stage_many
+
+    async def recorded(state, queries, k, allowed=None):
+        batches.append(list(queries))
+        return await first_stage_many(state, queries, k, allowed)
+
+    monkeypatch.setattr(service, "_first_stage_many", recorded)
+    return service, batches
+
+
+async def test_variants_are_searched_in_the_original_querys_batch(rag, monkeypatch):
+    service, batches = await started(rag, monkeypatch)
+
+    docs, _, expanded = await service.retrieve_with_self_rag("izin prosedürü", k=20, top_k=3)
+
+    assert batches == [["izin prosedürü"] + service._expand_query_variants("izin prosedürü")]
+    assert len(docs) == 3
+    assert not expanded
+
+
+async def test_variants_are_not_searched_after_the_deadline(rag, monkeypatch):
+    service, batches = await started(rag, monkeypatch)
+
+    docs, _, expanded = await service.retrieve_with_self_rag(
+        "izin prosedürü", k=20, top_k=3, confidence_threshold=NEVER_CONFIDENT, deadline=-1.0
+    )
+
+    assert batches == [["izin prosedürü"]]
+    assert len(docs) == 3
+    assert not expanded
+
+
+@pytest.mark.parametrize("failure", ["timeout", "error"])
+async def test_failed_retry_keeps_the_original_results(rag, monkeypatch, failure):
+    service, _ = await started(rag, monkeypatch)
+    original, _, _ = await service.retrieve_with_self_rag("izin prosedürü", k=20, top_k=3)
+    rerank_candidates = service._rerank_candidates
+    calls = []
+
+    async def slow_or_failing_retry(*args):
+        calls.append(args)
+        if len(calls) > 1:
+            if failure == "timeout":
+                await asyncio.sleep(5)
+            raise RuntimeError("cross-encoder unavailable")
+        return await rerank_candidates(*args)
+
+    monkeypatch.setattr(service, "_rerank_candidates", slow_or_failing_retry)
+    docs, _, expanded = await service.retrieve_with_self_rag(
+        "izin prosedürü", k=20, top_k=3, confidence_threshold=NEVER_CONFIDENT, deadline=0.5
+    )
+
+    assert len(calls) == 2
+    assert [doc.page_content for doc in docs] == [doc.page_content for doc in original]
+    assert not expanded
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Vector Index Tests
+Description: IVF/HNSW index construction, SQ8/PQ/PCA compression, search parameters and the recall gate of the main index build
+"""
+import faiss
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from services.vector_index import (
+    compression_of, create_index, index_type_of, is_compressed, measure_recall, memory_bytes,
+    search_parameters, supports_removal
+)
+
+
+def clustered_vectors(n: int = 2000, dimension: int = 32) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(20, dimension))
+    return (centers[rng.integers(0, 20, size=n)] + 0.1 * rng.normal(size=(n, dimension))).astype(np.float32)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("index_type", ["flat", "ivf", "hnsw"])
+def test_indexes_store_vectors_under_chunk_ids(index_type):
+    vectors = clustered_vectors()
+    ids = np.arange(1000, 1000 + len(vectors), dtype=np.int64)
+    index = create_index(vectors.shape[1], index_type, training_vectors=vectors)
+    index.add_with_ids(vectors, ids)
+
+    assert index_type_of(index) == index_type
+    recall = measure_recall(index, vectors, ids, nprobe=8, ef_search=64)["recall"]
+    assert recall > (0.999 if index_type == "flat" else 0.9)
+
+
+@pytest.mark.unit
+def test_probing_more_lists_raises_ivf_recall():
+    vectors = clustered_vectors()
+    index = create_index(vectors.shape[1], "ivf", training_vectors=vectors, nlist=64)
+    index.add_with_ids(vectors, np.arange(len(vectors), dtype=np.int64))
+
+    low = measure_recall(index, vectors, nprobe=1)["recall"]
+    high = measure_recall(index, vectors, nprobe=64)["recall"]
+
+    assert low < high
+    assert high > 0.999
+
+
+@pytest.mark.unit
+def test_search_parameters_match_the_index_type():
+    vectors = clustered_vectors(200)
+    ivf = create_index(vectors.shape[1], "ivf", training_vectors=vectors)
+    hnsw = create_index(vectors.shape[1], "hnsw")
+
+    assert search_parameters(ivf, nprobe=5).nprobe == 5
+    assert search_parameters(hnsw, ef_search=99).efSearch == 99
+    assert type(search_parameters(create_index(vectors.shape[1]))) is faiss.SearchParameters
+
+
+@pytest.mark.unit
+def test_only_hnsw_cannot_remove_vectors():
+    vectors = clustered_vectors(200)
+    ivf = create_index(vectors.shape[1], "ivf", training_vectors=vectors)
+    ivf.add_with_ids(vectors, np.arange(len(vectors), dtype=np.int64))
+
+    assert ivf.remove_ids(np.array([3, 4], dtype=np.int64)) == 2
+    assert supports_removal(ivf)
+    assert not supports_removal(create_index(vectors.shape[1], "hnsw"))
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+@pytest.mark.parametrize("index_type", ["ivf", "hnsw"])
+async def test_main_index_uses_the_configured_ann_type(rag, monkeypatch, index_type):
+    monkeypatch.setattr(rag.settings, "FAISS_INDEX_TYPE", index_type)
+    monkeypatch.setattr(rag.settings, "FAISS_ANN_MIN_RECALL", 0.0)
+    service = rag.RAGService()
+    await service.initialize(force_rebuild=True)
+    await service.add_documents([Document(page_content=f"vardiya planı {i}") for i in range(3)], document_id=1)
+
+    assert service.index_report["index_type"] == index_type
+    assert index_type_of(service.vector_store.index) == index_type
+    docs, _ = await service.retrieve("vardiya planı 2", k=10, top_k=1, use_hybrid=False, use_rerank=False)
+    assert docs[0].page_content == "vardiya planı 2"
+
+    assert await service.remove_document(1)
+    docs, _ = await service.retrieve("vardiya planı 2", k=10, top_k=1, use_hybrid=False, use_rerank=False)
+    assert docs[0].page_content != "vardiya planı 2"
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+async def test_ann_index_below_the_minimum_recall_falls_back_to_flat(rag, monkeypatch):
+    monkeypatch.setattr(rag.settings, "FAISS_INDEX_TYPE", "hnsw")
+    monkeypatch.setattr(rag.settings, "FAISS_ANN_MIN_RECALL", 1.01)
+    service = rag.RAGService()
+    await service.initialize(force_rebuild=True)
+
+    report = service.index_report
+    assert report["requested_index_type"] == "hnsw"
+    assert report["index_type"] == "flat"
+    assert "rejected_recall" in report
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("index_type,compression", [("flat", "sq8"), ("ivf", "sq8"), ("hnsw", "sq8"), ("ivf", "pq")])
+def test_compressed_indexes_are_smaller_and_rescoring_restores_recall(index_type, compression):
+    vectors = clustered_vectors()
+    ids = np.arange(len(vectors), dtype=np.int64)
+    uncompressed = create_index(vectors.shape[1], index_type, training_vectors=vectors)
+    uncompressed.add_with_ids(vectors, ids)
+    index = create_index(vectors.shape[1], index_type, training_vectors=vectors, compression=compression, pq_m=4)
+    index.add_with_ids(vectors, ids)
+
+    assert compression_of(index) == compression
+    assert is_compressed(index)
+    assert memory_bytes(index) < memory_bytes(uncompressed)
+    plain = measure_recall(index, vectors, ids, nprobe=8, ef_search=64)["recall"]
+    rescored = measure_recall(index, vectors, ids, nprobe=8, ef_search=64, rescore_factor=4)["recall"]
+    assert rescored >= plain
+    assert rescored > 0.85
+
+
+@pytest.mark.unit
+def test_pca_reduces_the_indexed_dimension():
+    vectors = clustered_vectors()
+    index = create_index(vectors.shape[1], "flat", training_vectors=vectors, pca_dim=8)
+    index.add_with_ids(vectors, np.arange(len(vectors), dtype=np.int64))
+
+    assert index.d == vectors.shape[1]
+    assert is_compressed(index)
+    assert compression_of(index) == "none"
+
+
+@pytest.mark.unit
+def test_invalid_compression_settings_are_rejected():
+    vectors = clustered_vectors(200)
+    with pytest.raises(ValueError):
+        create_index(vectors.shape[1], "flat", training_vectors=vectors, compression="pq", pq_m=5)
+    with pytest.raises(ValueError):
+        create_index(vectors.shape[1], "flat", training_vectors=vectors[:8], compression="pq")
+    with pytest.raises(ValueError):
+        create_index(vectors.shape[1], "flat", training_vectors=vectors, pca_dim=vectors.shape[1])
+
+
+@pytest.mark.integration
+@pytest.mark.asyncio
+@pytest.mark.parametrize("compression", ["sq8", "pq"])
+async def test_main_index_uses_the_configured_compression(rag, monkeypatch, compression):
+    monkeypatch.setattr(rag.settings, "FAISS_COMPRESSION", compression)
+    monkeypatch.setattr(rag.settings, "FAISS_ANN_MIN_RECALL", 0.0)
+    service = rag.RAGService()
+    await service.initialize(force_rebuild=True)
+    await service.add_documents([Document(page_content=f"mesai çizelgesi {i}") for i in range(3)], document_id=1)
+
+    report = service.index_report
+    assert report["compression"] == compression
+    assert "rescored_recall" in report
+    assert compression_of(service.vector_store.index) == compression
+    # Candidates are re-scored with the cached full-precision vectors
+    docs, _ = await service.retrieve("mesai çizelgesi 1", k=10, top_k=1, use_hybrid=False, use_rerank=False)
+    assert docs[0].page_content == "mesai çizelgesi 1"
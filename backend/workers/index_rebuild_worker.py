@@ -28,6 +28,13 @@ def rebuild_faiss_index(department: str = None):
     """
     Rebuild FAISS index (can be called asynchronously)
     
+    Chunks whose text was embedded before are served from the persistent
+    embedding cache, so only new or changed chunks are embedded. The new
+    index is written as a versioned snapshot and promoted only once it is
+    complete; API workers keep serving the previous snapshot until then
+    and hot-reload the new one when notified (or within
+    INDEX_SYNC_MAX_STALENESS_SECONDS).
+    
     Args:
         department: Optional department name for per-dept index
     
@@ -68,6 +75,10 @@ def index_document(document_id: int, department: str = None):
     """
     Index a single document in FAISS
     
+    The chunks are appended to the shared index log; API workers apply
+    them when notified via Redis (or within INDEX_SYNC_MAX_STALENESS_SECONDS)
+    and write the snapshot, so a task never rewrites the whole index.
+    
     Args:
         document_id: Document ID from database
         department: Optional department name
@@ -111,14 +122,33 @@ def index_document(document_id: int, department: str = None):
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
         
-        result = loop.run_until_complete(
-            rag_service.add_documents(chunks, document_id=document_id, department=department)
+        # Replace the document's chunks; near-duplicates of chunks with the same visibility are skipped
+        loop.run_until_complete(rag_service.remove_document(document_id))
+        chunks, dedupe_report = loop.run_until_complete(
+            rag_service.filter_near_duplicates(chunks, department=department, uploaded_by=doc.uploaded_by)
         )
+        result = True
+        if chunks:
+            result = loop.run_until_complete(
+                rag_service.add_documents(
+                    chunks,
+                    document_id=document_id,
+                    department=department,
+                    uploaded_by=doc.uploaded_by
+                )
+            )
+        
+        # Deleting a document these chunks fall back on re-indexes this one
+        duplicate_of = {match.get("document_id") for match in dedupe_report["duplicates"]} - {None, document_id}
+        doc.body = {**doc.body, "duplicate_of_documents": sorted(duplicate_of)}
+        session.add(doc)
+        session.commit()
         
         return {
             "success": result,
             "document_id": document_id,
-            "chunks": len(chunks)
+            "chunks": len(chunks),
+            "deduplication": dedupe_report
         }
     
     except Exception as e: